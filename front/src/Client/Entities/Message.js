@@ -16,14 +16,15 @@ export class Message {
         return Date.now().toString(36) + Math.random().toString(36).substr(2);
     }
 
-    static async create(messageData) {
+    static async create(messageData, { onToken } = {}) {
         const message = new Message(messageData);
 
         if (message.sender === 'user') {
             try {
                 const response = await sendMessageToChatbot(
                     message.content,
-                    message.conversation_id
+                    message.conversation_id,
+                    { onToken }
                 );
 
                 let success = false;
@@ -85,6 +86,7 @@ export class Message {
                         assistantMessage.metadata = {
                             ...assistantMessage.metadata,
                             title: response.title,
+                            title_pending: response.title_pending === true,
                             chat_id: backendChatId || message.conversation_id,
                         };
                     }
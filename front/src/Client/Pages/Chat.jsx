@@ -6,6 +6,9 @@ import ChatInput from '../Components/chat/ChatInput.jsx';
 import WelcomeScreen from '../Components/chat/WelcomeScreen.jsx';
 import { getUserChats, updateTripCard } from '../../api/chatApi';
 
+const STREAMING_ENABLED = import.meta.env.VITE_CHAT_STREAMING === 'true';
+const TITLE_REFRESH_DELAY_MS = 4000;
+
 export default function ChatPage() {
     const [messages, setMessages] = useState([]);
     const [conversations, setConversations] = useState([]);
@@ -103,14 +106,46 @@ export default function ChatPage() {
             });
             setMessages((prev) => [...prev, userMessage]);
 
-            const result = await Message.create({
+            // Opt-in token streaming: grow a placeholder assistant bubble as text arrives
+            const streamingMessage = new Message({
                 conversation_id: conversationId,
-                content: content.trim(),
-                sender: 'user',
+                content: '',
+                sender: 'assistant',
             });
+            const onToken = STREAMING_ENABLED
+                ? (text) =>
+                      setMessages((prev) => {
+                          // Pure updater (React may run it twice): build on the bubble in prev
+                          const placeholder = prev.find(
+                              (m) => m.id === streamingMessage.id
+                          );
+                          const updated = new Message({
+                              ...streamingMessage.toJSON(),
+                              content:
+                                  (placeholder?.content ?? '') + text,
+                          });
+                          return placeholder
+                              ? prev.map((m) =>
+                                    m.id === streamingMessage.id ? updated : m
+                                )
+                              : [...prev, updated];
+                      })
+                : undefined;
+
+            const result = await Message.create(
+                {
+                    conversation_id: conversationId,
+                    content: content.trim(),
+                    sender: 'user',
+                },
+                { onToken }
+            );
             const assistantReplies = Array.isArray(result)
                 ? result.filter((m) => m?.sender === 'assistant')
                 : [];
+            setMessages((prev) =>
+                prev.filter((m) => m.id !== streamingMessage.id)
+            );
             if (assistantReplies.length > 0) {
                 setMessages((prev) => [...prev, ...assistantReplies]);
                 const hasTitle = assistantReplies.some(
@@ -125,6 +160,21 @@ export default function ChatPage() {
                     );
                     setConversations(updatedConversations);
                 }
+                // Titles are generated in the background; pick the new one up shortly after
+                const titlePending = assistantReplies.some(
+                    (m) => m?.metadata?.title_pending === true
+                );
+                if (titlePending) {
+                    setTimeout(async () => {
+                        try {
+                            const updatedConversations =
+                                await Conversation.list('-updated_date');
+                            setConversations(updatedConversations);
+                        } catch (error) {
+                            console.error('Error refreshing chat titles:', error);
+                        }
+                    }, TITLE_REFRESH_DELAY_MS);
+                }
             }
 
             try {
@@ -34,7 +34,81 @@ function getUserLocationData() {
     }
 }
 
-export async function sendMessageToChatbot(message, activeChatId) {
+function parseServerSentEvent(rawEvent) {
+    let eventName = 'message';
+    const dataLines = [];
+    for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event:')) {
+            eventName = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            dataLines.push(line.slice(5).trim());
+        }
+    }
+    if (dataLines.length === 0) return null;
+    return { event: eventName, data: JSON.parse(dataLines.join('\n')) };
+}
+
+// Streaming mode: handle_chat answers with server-sent events
+// (token* then done, or error). onToken receives each text delta as it
+// arrives; the resolved value has the same shape as the non-streaming reply.
+async function streamMessageToChatbot(requestData, onToken) {
+    const response = await fetch(import.meta.env.VITE_HANDLE_CHAT_LAMBDA_URL, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ ...requestData, stream: true }),
+    });
+    if (!response.ok) {
+        throw new Error(`Chat request failed with status ${response.status}`);
+    }
+
+    const contentType = response.headers.get('content-type') || '';
+    if (!contentType.includes('text/event-stream') || !response.body) {
+        return response.json();
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let finalPayload = null;
+
+    const handleEvent = (rawEvent) => {
+        const parsed = parseServerSentEvent(rawEvent);
+        if (!parsed) return;
+        if (parsed.event === 'token') {
+            onToken(parsed.data.text || '');
+        } else if (parsed.event === 'done') {
+            finalPayload = parsed.data;
+        } else if (parsed.event === 'error') {
+            throw new Error(parsed.data.error || 'Chat stream failed');
+        }
+    };
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary = buffer.indexOf('\n\n');
+        while (boundary !== -1) {
+            handleEvent(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+            boundary = buffer.indexOf('\n\n');
+        }
+    }
+    if (buffer.trim()) {
+        handleEvent(buffer);
+    }
+
+    if (!finalPayload) {
+        throw new Error('Chat stream ended before completion');
+    }
+    return finalPayload;
+}
+
+export async function sendMessageToChatbot(
+    message,
+    activeChatId,
+    { onToken } = {}
+) {
     const userId = getUserId();
     const locationData = getUserLocationData();
 
@@ -50,6 +124,9 @@ export async function sendMessageToChatbot(message, activeChatId) {
     }
 
     try {
+        if (onToken) {
+            return await streamMessageToChatbot(requestData, onToken);
+        }
         const response = await axios.post(
             import.meta.env.VITE_HANDLE_CHAT_LAMBDA_URL,
             requestData
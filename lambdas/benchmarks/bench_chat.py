@@ -0,0 +1,321 @@
+"""
+End-to-end latency benchmark for handle_chat and update_trip_card.
+
+Runs the real lambda handlers against the in-memory fakes in fakes.py
+(DynamoDB, OpenAI, search Function URLs) with configurable latencies, and
+reports p50 / p95 / p99 per stage plus DynamoDB / LLM / HTTP calls per turn.
+Nothing leaves the machine.
+
+    python lambdas/benchmarks/bench_chat.py --turns 40
+    python lambdas/benchmarks/bench_chat.py --stream --llm-base-ms 200 --json baseline.json
+    python lambdas/benchmarks/bench_chat.py --trip-card-stream 3   # trip cards analyzed from the chat stream
+
+Stages are the handler's own helper functions, timed by wrapping them
+(handle_chat: build_conversation, agent_loop, tool.<name>, save_turn,
+schedule_title, fold_summary; update_trip_card: read_history, fetch_offers,
+analyze, upsert_trip / update_items), plus "total" per handler call and "llm"
+per completion.
+"""
+import argparse
+import functools
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LAMBDAS = os.path.dirname(HERE)
+
+# Lambda code and the shared layer first; the vendored layer packages only
+# back up whatever boto3 / requests the local environment lacks.
+sys.path[:0] = [HERE, os.path.join(LAMBDAS, "shared", "layers", "python"), os.path.join(LAMBDAS, "chat")]
+sys.path += [os.path.join(LAMBDAS, "chat", "layers", "python", "python"),
+             os.path.join(LAMBDAS, "chat_management", "layers", "python")]
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ["TOOL_DISPATCH_MODE"] = "http"
+os.environ["TASK_DISPATCH_MODE"] = "local"
+os.environ.pop("AWS_LAMBDA_FUNCTION_NAME", None)
+
+CONVERSATION = [
+    "Hi! I'm thinking about a winter trip to Paris with my partner.",
+    "Can you find flights from TLV to CDG, Dec 7-10, for 2 adults?",
+    "Nice. Any nonstop flights that are a bit cheaper?",
+    "Also look for hotels in Paris for those dates, ideally with breakfast.",
+    "What are some must-see places near the Marais?",
+    "Let's check flights and hotels again for next long weekend instead.",
+    "I don't like the expensive hotel, remove it please.",
+    "How cold is Paris in mid-December?",
+]
+
+SEARCH_ARGS = {
+    "search_flights": {"originLocationCode": "TLV", "destinationLocationCode": "CDG",
+                       "departureDate": "2026-12-07", "returnDate": "2026-12-10", "adults": 2},
+    "search_hotels": {"cityCode": "PAR", "checkInDate": "2026-12-07", "checkOutDate": "2026-12-10", "adults": 2},
+}
+
+REPLY = ("Great choice! Paris in December is magical. " * 8).strip()
+
+
+def chat_script(kwargs):
+    """Scripted model behaviour for every completion the lambdas make."""
+    messages = kwargs.get("messages") or []
+    system = messages[0].get("content", "") if messages else ""
+    if system.startswith("You generate concise"):
+        return {"content": "Paris Winter Getaway"}
+    if system.startswith("You maintain a running summary"):
+        return {"content": "The traveler plans a December trip from Tel Aviv to Paris for two. " * 3}
+    if system.startswith("You are a helpful assistant for trip planning"):
+        payload = json.loads(messages[-1]["content"])
+        existing = payload.get("existing_items", {})
+        return {"content": json.dumps({
+            "destinations": ["Paris"], "dates": "Dec 7, 2026 - Dec 10, 2026",
+            "summary": "You are planning a winter trip to Paris for two.",
+            "flight_decisions": [{"id": f["id"], "decision": "keep"} for f in existing.get("flights", [])],
+            "hotel_decisions": [{"id": h["id"], "decision": "keep"} for h in existing.get("hotels", [])],
+        })}
+
+    last = messages[-1] if messages else {}
+    if last.get("role") == "tool":
+        return {"content": REPLY}
+    prompt = (last.get("content") or "").lower()
+    calls = [(name, SEARCH_ARGS[name]) for name, word in (("search_flights", "flight"), ("search_hotels", "hotel"))
+             if word in prompt and "remove" not in prompt]
+    if calls and kwargs.get("tools"):
+        return {"tool_calls": calls}
+    return {"content": REPLY}
+
+
+# ===== Timing =====
+class StageTimer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples[stage].append(seconds * 1000.0)
+
+    def wrap(self, module, attribute, stage):
+        original = getattr(module, attribute)
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+
+        setattr(module, attribute, timed)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile."""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(timer, calls_per_turn):
+    stages = {}
+    for stage, samples in sorted(timer.samples.items()):
+        stages[stage] = {
+            "n": len(samples),
+            "p50": percentile(samples, 50),
+            "p95": percentile(samples, 95),
+            "p99": percentile(samples, 99),
+            "mean": statistics.fmean(samples),
+        }
+    calls = {}
+    for handler, turns in calls_per_turn.items():
+        names = sorted({name for turn in turns for name in turn})
+        calls[handler] = {name: {"mean": statistics.fmean(t.get(name, 0) for t in turns),
+                                 "max": max(t.get(name, 0) for t in turns)} for name in names}
+    return {"stages": stages, "calls_per_turn": calls}
+
+
+def print_report(report, args):
+    print(f"\n{args.turns} chat turns, llm base {args.llm_base_ms:g}ms + {args.llm_ms_per_token:g}ms/token, "
+          f"dynamodb {args.ddb_read_ms:g}/{args.ddb_write_ms:g}ms, search {args.search_ms:g}ms"
+          f"{', streaming' if args.stream else ''}\n")
+    print(f"{'stage':<36}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, row in report["stages"].items():
+        print(f"{stage:<36}{row['n']:>6}{row['p50']:>10.1f}{row['p95']:>10.1f}{row['p99']:>10.1f}")
+    for handler, calls in report["calls_per_turn"].items():
+        print(f"\ncalls per {handler} call{'':<14}{'mean':>10}{'max':>10}")
+        for name, row in calls.items():
+            print(f"  {name:<34}{row['mean']:>10.2f}{row['max']:>10}")
+
+
+# ===== Wiring =====
+def install_fakes(args):
+    """Put the fakes into triptailor.clients' caches before any handler module is imported."""
+    from fakes import CallCounter, FakeDynamoDB, FakeOpenAI, FakeSearchSession
+    from triptailor import clients
+
+    counter = CallCounter()
+    dynamodb = FakeDynamoDB(counter, read_latency_ms=args.ddb_read_ms, write_latency_ms=args.ddb_write_ms)
+    clients._resources[None] = dynamodb
+    clients._resources["us-east-1"] = dynamodb
+    clients._openai_clients[os.environ["OPENAI_API_KEY"]] = FakeOpenAI(
+        chat_script, counter, base_ms=args.llm_base_ms, ms_per_token=args.llm_ms_per_token)
+
+    from triptailor import tools
+    clients._sessions["lambda-urls"] = FakeSearchSession(
+        dynamodb, tools.SEARCH_FLIGHTS_URL, tools.SEARCH_HOTELS_URL, counter, latency_ms=args.search_ms,
+        flight_count=args.flight_results, hotel_count=args.hotel_results)
+
+    dynamodb.Table("user").seed([{"user_id": "bench-user", "number_of_chats": 0, "chat_titles": []}])
+    return counter, dynamodb
+
+
+def instrument(timer, counter):
+    import handle_chat
+    import update_trip_card
+    from triptailor import clients
+
+    for attribute, stage in (("_build_conversation", "build_conversation"), ("_run_agent_loop", "agent_loop"),
+                             ("_save_turn", "save_turn"), ("_schedule_chat_title", "schedule_title"),
+                             ("_schedule_summary_fold", "schedule_fold"),
+                             ("_run_summary_task", "fold_summary")):
+        timer.wrap(handle_chat, attribute, f"handle_chat.{stage}")
+    original_run_tool = handle_chat._run_tool
+
+    def timed_tool(func_name, *rest):
+        start = time.perf_counter()
+        try:
+            return original_run_tool(func_name, *rest)
+        finally:
+            timer.record(f"handle_chat.tool.{func_name}", time.perf_counter() - start)
+
+    handle_chat._run_tool = timed_tool
+
+    for attribute, stage in (("_analysis_input", "read_history"), ("_analyze_history_and_decide", "analyze"),
+                             ("_upsert_trip", "upsert_trip"), ("_update_trip_items", "update_items")):
+        timer.wrap(update_trip_card, attribute, f"update_trip_card.{stage}")
+    timer.wrap(update_trip_card.OfferLoader, "load", "update_trip_card.fetch_offers")
+
+    fake_openai = clients._openai_clients[os.environ["OPENAI_API_KEY"]]
+    original_create = fake_openai.chat.completions.create
+
+    def timed_create(**kwargs):
+        start = time.perf_counter()
+        result = original_create(**kwargs)
+        timer.record("llm.completion" + (".stream_open" if kwargs.get("stream") else ""),
+                     time.perf_counter() - start)
+        return result
+
+    fake_openai.chat.completions.create = timed_create
+    return handle_chat, update_trip_card
+
+
+def _chat_event(prompt, chat_id, stream):
+    return {"body": json.dumps({"user_prompt": prompt, "user_id": "bench-user", "chat_id": str(chat_id),
+                                "stream": stream,
+                                "user_location": {"latitude": 32.08, "longitude": 34.78}})}
+
+
+def run(args):
+    timer = StageTimer()
+    if args.trip_card_stream:
+        os.environ["TRIP_CARD_ANALYSIS"] = "stream"
+    counter, dynamodb = install_fakes(args)
+    handle_chat, update_trip_card = instrument(timer, counter)
+    from triptailor.background_tasks import wait_for_background_tasks
+    from triptailor.trip_card_events import LocalQueue
+
+    queue = None
+    if args.trip_card_stream:
+        # chat-history inserts go to the in-memory stream; drained every --trip-card-stream turns
+        queue = LocalQueue()
+        dynamodb.Table("chat-history").stream = queue
+
+    calls_per_turn = defaultdict(list)
+    chat_id = 1
+    for turn in range(args.turns):
+        if turn and turn % len(CONVERSATION) == 0:
+            chat_id += 1
+        prompt = CONVERSATION[turn % len(CONVERSATION)]
+
+        counter.reset()
+        start = time.perf_counter()
+        response = handle_chat.lambda_handler(_chat_event(prompt, chat_id, args.stream), None)
+        timer.record("handle_chat.total", time.perf_counter() - start)
+        wait_for_background_tasks()
+        calls_per_turn["handle_chat"].append(counter.snapshot())
+        if response.get("statusCode") != 200:
+            raise RuntimeError(f"handle_chat failed: {response.get('body')}")
+        reply = _reply_payload(response)
+
+        counter.reset()
+        start = time.perf_counter()
+        response = update_trip_card.lambda_handler({"body": json.dumps({
+            "user_id": "bench-user", "chat_id": str(chat_id),
+            "flight_ids": reply.get("flight_ids", [])[:args.trip_card_items],
+            "hotel_ids": reply.get("hotel_ids", [])[:args.trip_card_items],
+        })}, None)
+        timer.record("update_trip_card.total", time.perf_counter() - start)
+        calls_per_turn["update_trip_card"].append(counter.snapshot())
+        if response.get("statusCode") != 200:
+            raise RuntimeError(f"update_trip_card failed: {response.get('body')}")
+
+        if queue is not None and ((turn + 1) % args.trip_card_stream == 0 or turn + 1 == args.turns):
+            counter.reset()
+            start = time.perf_counter()
+            queue.drain(update_trip_card.stream_handler)
+            timer.record("update_trip_card.stream_drain", time.perf_counter() - start)
+            calls_per_turn["update_trip_card.stream_drain"].append(counter.snapshot())
+
+    if queue is not None:
+        print(f"[bench_chat] Stream: {queue.stats()}")
+    return summarize(timer, calls_per_turn)
+
+
+def _reply_payload(response):
+    body = response.get("body") or "{}"
+    if response.get("headers", {}).get("Content-Type") == "text/event-stream":
+        for block in body.split("\n\n"):
+            if block.startswith("event: done"):
+                return json.loads(block.split("data: ", 1)[1])
+        return {}
+    return json.loads(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline latency benchmark for the chat pipeline")
+    parser.add_argument("--turns", type=int, default=24)
+    parser.add_argument("--stream", action="store_true", help="use the buffered streaming path")
+    parser.add_argument("--llm-base-ms", type=float, default=350.0)
+    parser.add_argument("--llm-ms-per-token", type=float, default=12.0)
+    parser.add_argument("--ddb-read-ms", type=float, default=4.0)
+    parser.add_argument("--ddb-write-ms", type=float, default=6.0)
+    parser.add_argument("--search-ms", type=float, default=900.0)
+    parser.add_argument("--flight-results", type=int, default=25)
+    parser.add_argument("--hotel-results", type=int, default=20)
+    parser.add_argument("--trip-card-items", type=int, default=6, help="search results passed to update_trip_card")
+    parser.add_argument("--trip-card-stream", type=int, default=0, metavar="TURNS",
+                        help="analyze trip cards from the chat-history stream, drained every TURNS turns")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--quiet", action="store_true", help="silence the lambdas' own logging")
+    args = parser.parse_args()
+
+    if args.quiet:
+        sys.stdout = open(os.devnull, "w")
+    report = run(args)
+    if args.quiet:
+        sys.stdout = sys.__stdout__
+    print_report(report, args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), **report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
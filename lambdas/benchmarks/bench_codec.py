@@ -0,0 +1,121 @@
+"""
+Micro-benchmark: the shared JSON codec vs. the old convert-then-serialize helpers.
+
+Uses a recorded Amadeus flight-offers response (--response file.json) or, by
+default, a 250-offer response generated by fakes.fake_flight_offers, and
+compares both directions of the search path:
+
+  ingest  Amadeus JSON text -> DynamoDB-ready items
+          old: response.json() + copy.deepcopy + to_dynamodb_compatible
+          new: json_codec.loads (parse_float=Decimal)
+  emit    DynamoDB items (Decimal numbers) -> response body
+          old: decimal_to_native + json.dumps
+          new: json_codec.dumps (Decimal-aware encoder)
+
+For each it reports the median time and the peak traced memory.
+
+    python lambdas/benchmarks/bench_codec.py
+    python lambdas/benchmarks/bench_codec.py --offers 250 --repeat 50 --response recorded.json
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LAMBDAS = os.path.dirname(HERE)
+sys.path[:0] = [HERE, os.path.join(LAMBDAS, "shared", "layers", "python")]
+sys.path += [os.path.join(LAMBDAS, "chat_management", "layers", "python")]  # boto3 for fakes.py
+
+from triptailor.json_codec import dumps, loads  # noqa: E402
+
+
+# ===== The helpers the codec replaced =====
+def to_dynamodb_compatible(obj):
+    if isinstance(obj, float):
+        return Decimal(str(obj))
+    if isinstance(obj, list):
+        return [to_dynamodb_compatible(x) for x in obj]
+    if isinstance(obj, dict):
+        return {k: to_dynamodb_compatible(v) for k, v in obj.items()}
+    return obj
+
+
+def decimal_to_native(obj):
+    if isinstance(obj, list):
+        return [decimal_to_native(x) for x in obj]
+    if isinstance(obj, dict):
+        return {k: decimal_to_native(v) for k, v in obj.items()}
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    return obj
+
+
+def old_ingest(text):
+    return to_dynamodb_compatible(copy.deepcopy(json.loads(text)))
+
+
+def new_ingest(text):
+    return loads(text)
+
+
+def old_emit(items):
+    return json.dumps(decimal_to_native(items))
+
+
+def new_emit(items):
+    return dumps(items)
+
+
+# ===== Measurement =====
+def measure(func, arg, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    tracemalloc.start()
+    func(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"median_ms": statistics.median(timings), "peak_kib": peak / 1024.0}
+
+
+def load_response(args):
+    if args.response:
+        with open(args.response, "rb") as f:
+            return f.read()
+    from fakes import fake_flight_offers
+    response = fake_flight_offers({}, args.offers, random.Random(7))
+    # Amadeus responses carry a few real JSON numbers besides the string prices
+    for offer in response["data"]:
+        offer["price"]["margin"] = round(random.Random(offer["id"]).uniform(0, 5), 2)
+    return json.dumps(response).encode("utf-8")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--offers", type=int, default=250, help="offers in the generated response")
+    parser.add_argument("--response", help="recorded flight-offers response (JSON file) to use instead")
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    text = load_response(args)
+    items = loads(text)
+    print(f"response: {len(text) / 1024:.0f} KiB, {len(items.get('data', []))} offers, {args.repeat} runs each\n")
+    print(f"{'path':<10}{'old ms':>10}{'new ms':>10}{'old peak KiB':>15}{'new peak KiB':>15}")
+    for name, old, new, arg in (("ingest", old_ingest, new_ingest, text), ("emit", old_emit, new_emit, items)):
+        assert json.loads(dumps(old(arg))) == json.loads(dumps(new(arg)))
+        before, after = measure(old, arg, args.repeat), measure(new, arg, args.repeat)
+        print(f"{name:<10}{before['median_ms']:>10.2f}{after['median_ms']:>10.2f}"
+              f"{before['peak_kib']:>15.0f}{after['peak_kib']:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
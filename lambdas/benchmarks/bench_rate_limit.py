@@ -0,0 +1,133 @@
+"""
+Load test: the shared Amadeus rate limiter under concurrent invocations.
+
+Starts --invocations simulated lambda invocations at once (threads), spread
+over --containers containers. Each container has its own RateLimiter, as
+separate Lambda instances would, and all of them share one in-memory
+DynamoDB rate table (fakes.FakeDynamoDB). Every invocation sends --calls
+requests of one endpoint family; a request is "sent" when acquire()
+returns and then takes --call-ms.
+
+The same load runs once without the limiter, for comparison. The test
+checks that no rolling second of the limited run sent more than the
+family's quota plus its burst allowance (``limit + burst - 1``), and reports
+the waits and DynamoDB calls it cost. Threads wake a few milliseconds after
+their slot, so the rolling check ignores gaps shortened by up to --jitter-ms.
+
+    python lambdas/benchmarks/bench_rate_limit.py
+    python lambdas/benchmarks/bench_rate_limit.py --invocations 50 --containers 10 --limit 10 --calls 4
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LAMBDAS = os.path.dirname(HERE)
+sys.path[:0] = [HERE, os.path.join(LAMBDAS, "shared", "layers", "python")]
+sys.path += [os.path.join(LAMBDAS, "chat", "layers", "python", "python"),
+             os.path.join(LAMBDAS, "chat_management", "layers", "python")]
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("TRACING_ENABLED", "false")
+
+from fakes import CallCounter, FakeDynamoDB  # noqa: E402
+from triptailor import clients  # noqa: E402
+from triptailor.amadeus_limits import RateLimiter, RateLimitTimeout  # noqa: E402
+
+WINDOW_SECONDS = 1.0
+
+
+def run_load(args, limited):
+    counter = CallCounter()
+    clients._resources[None] = FakeDynamoDB(counter, read_latency_ms=args.ddb_ms, write_latency_ms=args.ddb_ms)
+    limiters = [RateLimiter({args.family: args.limit}, burst=args.burst, lease_size=args.lease,
+                            max_wait=args.max_wait)
+                for _ in range(args.containers)]
+    sent, waits, timeouts = [], [], []
+    lock = threading.Lock()
+    start_gate = threading.Barrier(args.invocations)
+
+    def invocation(index):
+        limiter = limiters[index % args.containers]
+        start_gate.wait()
+        for _ in range(args.calls):
+            try:
+                waited = limiter.acquire(args.family) if limited else 0.0
+            except RateLimitTimeout:
+                with lock:
+                    timeouts.append(index)
+                continue
+            with lock:
+                sent.append(time.time())
+                waits.append(waited)
+            time.sleep(args.call_ms / 1000.0)
+
+    threads = [threading.Thread(target=invocation, args=(i,)) for i in range(args.invocations)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+
+    per_window = Counter(int(ts // WINDOW_SECONDS) for ts in sent)
+    ordered = sorted(sent)
+    sliding, left = 0, 0
+    window = WINDOW_SECONDS - args.jitter_ms / 1000.0
+    for right, ts in enumerate(ordered):
+        while ts - ordered[left] >= window:
+            left += 1
+        sliding = max(sliding, right - left + 1)
+    return {
+        "sent": len(sent),
+        "seconds": elapsed,
+        "max_per_window": max(per_window.values(), default=0),
+        "windows_over": sum(1 for n in per_window.values() if n > args.limit),
+        "max_sliding": sliding,
+        "wait_p50": statistics.median(waits) if waits else 0.0,
+        "wait_p95": sorted(waits)[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+        "wait_max": max(waits, default=0.0),
+        "timeouts": len(timeouts),
+        "ddb_updates": counter.snapshot().get("dynamodb.update_item", 0),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--invocations", type=int, default=50)
+    parser.add_argument("--containers", type=int, default=50, help="limiter instances the invocations share")
+    parser.add_argument("--calls", type=int, default=3, help="Amadeus requests per invocation")
+    parser.add_argument("--family", default="pricing")
+    parser.add_argument("--limit", type=int, default=10, help="quota in requests per second")
+    parser.add_argument("--burst", type=int, default=1, help="bucket capacity in tokens")
+    parser.add_argument("--lease", type=int, default=2, help="slots reserved per UpdateItem")
+    parser.add_argument("--max-wait", type=float, default=60.0, help="per-request queuing deadline (s)")
+    parser.add_argument("--call-ms", type=float, default=50.0, help="simulated Amadeus latency")
+    parser.add_argument("--ddb-ms", type=float, default=4.0, help="simulated DynamoDB latency")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="sleep wake-up jitter the rolling check allows")
+    args = parser.parse_args(argv)
+
+    print(f"{args.invocations} invocations on {args.containers} containers, {args.calls} {args.family} calls each, "
+          f"quota {args.limit}/s, burst {args.burst}, lease {args.lease}\n")
+    print(f"{'limiter':<9}{'sent':>6}{'secs':>7}{'max/win':>9}{'wins>quota':>11}{'max 1s':>8}"
+          f"{'wait p50':>10}{'p95':>7}{'max':>7}{'timeouts':>10}{'ddb upd':>9}")
+    results = {}
+    for limited in (False, True):
+        r = results[limited] = run_load(args, limited)
+        print(f"{'on' if limited else 'off':<9}{r['sent']:>6}{r['seconds']:>7.1f}{r['max_per_window']:>9}"
+              f"{r['windows_over']:>11}{r['max_sliding']:>8}{r['wait_p50']:>10.2f}{r['wait_p95']:>7.2f}"
+              f"{r['wait_max']:>7.2f}{r['timeouts']:>10}{r['ddb_updates']:>9}")
+
+    limited = results[True]
+    allowed = args.limit + args.burst - 1
+    assert limited["max_sliding"] <= allowed, "the limited run exceeded the quota in some rolling second"
+    print(f"\nquota respected: any rolling second saw at most {limited['max_sliding']} requests "
+          f"(quota {args.limit}, burst {args.burst}); {limited['ddb_updates']} UpdateItems for {limited['sent']} calls")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Check: triptailor.dates resolves the chat date phrases it is meant to.
+
+Runs resolve_dates() over a table of phrases with a fixed "today"
+(Sunday 2026-10-18) and asserts the first mention's start and end dates.
+Exits non-zero on the first mismatch.
+
+    python lambdas/benchmarks/check_dates.py
+"""
+import os
+import sys
+from datetime import date
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LAMBDAS = os.path.dirname(HERE)
+sys.path[:0] = [os.path.join(LAMBDAS, "shared", "layers", "python")]
+
+from triptailor.dates import resolve_dates  # noqa: E402
+
+TODAY = date(2026, 10, 18)
+
+# (text, expected start, expected end)
+CASES = [
+    ("fly on the 15th of December", "2026-12-15", None),
+    ("on the 3rd of march", "2027-03-03", None),
+    ("return on the 10th of May", "2027-05-10", None),
+    ("the 15th of March 2027", "2027-03-15", None),
+    ("15 March", "2027-03-15", None),
+    ("on the 10th to the 12th of May", "2027-05-10", "2027-05-12"),
+    ("the 10th-12th of May", "2027-05-10", "2027-05-12"),
+    ("Dec 7-10", "2026-12-07", "2026-12-10"),
+    ("on the 15th", "2026-11-15", None),
+    ("in two weeks", "2026-11-01", None),
+    ("tomorrow", "2026-10-19", None),
+]
+
+
+def main():
+    for text, start, end in CASES:
+        mentions = resolve_dates(text, TODAY)
+        got = (mentions[0]["start"], mentions[0]["end"]) if mentions else (None, None)
+        assert got == (start, end), f"{text!r}: expected {(start, end)}, got {got} ({mentions})"
+        print(f"ok  {text!r} -> {got[0]}" + (f" to {got[1]}" if got[1] else ""))
+    print(f"{len(CASES)} date phrases resolved as expected (today = {TODAY.isoformat()})")
+
+
+if __name__ == "__main__":
+    main()
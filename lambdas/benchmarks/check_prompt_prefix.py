@@ -0,0 +1,69 @@
+"""
+Check: the cacheable prompt prefix is the same for every chat request.
+
+Builds two conversations with handle_chat._build_conversation against the
+in-memory DynamoDB fake: different user, chat history, location, current
+time and prompt. Asserts that they differ, but that the hash of their
+prefix (tool schemas + static system prompt, triptailor.prompt_cache) is
+equal, and equal to the PROMPT_PREFIX_HASH logged at import.
+
+    python lambdas/benchmarks/check_prompt_prefix.py
+"""
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from bench_chat import install_fakes  # importing bench_chat sets up sys.path and the environment
+from triptailor.chat_history import new_message_item
+
+REQUESTS = [
+    {
+        "user_id": "alice", "chat_id": "1", "now": datetime(2026, 10, 18, 9, 30, tzinfo=timezone.utc),
+        "user_location": {"latitude": 32.08, "longitude": 34.78},
+        "history": [("user", "Hi! Any ideas for a winter trip?"), ("assistant", "Paris is lovely in December.")],
+        "prompt": "Find flights from TLV to CDG on the 15th of December.",
+    },
+    {
+        "user_id": "bob", "chat_id": "7", "now": datetime(2027, 3, 2, 22, 5, tzinfo=timezone.utc),
+        "user_location": {"latitude": 40.71, "longitude": -74.01},
+        "history": [("user", "I want to see Tokyo."), ("assistant", "Great! When are you going?"),
+                    ("user", "In spring, for cherry blossoms.")],
+        "prompt": "Hotels in Tokyo next weekend, please.",
+    },
+]
+
+
+def main():
+    _counter, dynamodb = install_fakes(SimpleNamespace(
+        ddb_read_ms=0, ddb_write_ms=0, llm_base_ms=0, llm_ms_per_token=0, search_ms=0,
+        flight_results=1, hotel_results=1))
+    import handle_chat
+
+    history = dynamodb.Table("chat-history")
+    conversations = []
+    for request in REQUESTS:
+        for i, (role, content) in enumerate(request["history"]):
+            history.put_item(Item=new_message_item(request["user_id"], request["chat_id"], role, content,
+                                                   timestamp=1_700_000_000_000 + i))
+        now = request["now"]
+
+        class FrozenDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return now
+
+        handle_chat.datetime = FrozenDatetime
+        conversation, _context = handle_chat._build_conversation(
+            request["user_id"], request["chat_id"], request["prompt"], request["user_location"], {})
+        conversations.append(conversation)
+
+    first, second = conversations
+    assert first != second, "the two requests built the same conversation"
+    hashes = [handle_chat.prompt_prefix_hash(conversation) for conversation in conversations]
+    assert hashes[0] == hashes[1] == handle_chat.PROMPT_PREFIX_HASH, \
+        f"prefix hash changed between requests: {hashes} (static {handle_chat.PROMPT_PREFIX_HASH})"
+    print(f"prefix hash stable across {len(conversations)} requests: {hashes[0]} "
+          f"({len(first)} and {len(second)} messages)")
+
+
+if __name__ == "__main__":
+    main()
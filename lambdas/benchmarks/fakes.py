@@ -0,0 +1,720 @@
+"""
+In-memory stand-ins for the services the lambdas call, for offline benchmarks.
+
+  - FakeDynamoDB: a boto3-style resource whose tables keep items in memory and
+    know the key schemas of chat-history, chat-summary, user, trip, Flights,
+    Hotels (and their latest-version projections), ServiceTokens and
+    SearchCache (plus the user_chat_id GSI). Queries, conditions
+    and update expressions are evaluated for the forms the lambdas use.
+  - FakeOpenAI: a scripted chat-completions client (plain and streaming) whose
+    latency follows the prompt and completion token counts.
+  - FakeSearchSession: answers the search lambdas' Function URLs with
+    Amadeus-shaped offers and stores them in the fake Flights / Hotels tables.
+
+Every fake sleeps for its configured latency and counts its calls in a shared
+CallCounter, so a benchmark can report calls per turn.
+"""
+import copy
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import types
+from collections import Counter
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import ConditionBase
+from botocore.exceptions import ClientError
+
+TABLE_SCHEMAS = {
+    "chat-history": {"key": ("user_id", "timestamp"),
+                     "indexes": {"user_chat_id-timestamp-index": ("user_chat_id", "timestamp")}},
+    "chat-summary": {"key": ("user_chat_id", None)},
+    "user": {"key": ("user_id", None)},
+    "trip": {"key": ("UserAndChatID", None)},
+    "Flights": {"key": ("flightId", "timestamp")},
+    "Hotels": {"key": ("hotelOfferId", "timestamp")},
+    "ServiceTokens": {"key": ("serviceName", "tokenType")},
+    "SearchCache": {"key": ("cacheKey", None)},
+    "FlightsLatest": {"key": ("flightId", None)},
+    "HotelsLatest": {"key": ("hotelOfferId", None)},
+    "RateLimits": {"key": ("bucketKey", None)},
+}
+
+
+class CallCounter:
+    """Thread-safe call counters, e.g. counts["dynamodb.query"]."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = Counter()
+
+    def add(self, name, n=1):
+        with self._lock:
+            self.counts[name] += n
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+
+
+def _sleep_ms(ms):
+    if ms > 0:
+        time.sleep(ms / 1000.0)
+
+
+def _conditional_check_failed(operation):
+    return ClientError({"Error": {"Code": "ConditionalCheckFailedException",
+                                  "Message": "The conditional request failed"}}, operation)
+
+
+def _to_dynamo(value):
+    """Store values the way DynamoDB returns them (numbers as Decimal)."""
+    if isinstance(value, bool) or value is None or isinstance(value, (str, bytes, Decimal)):
+        return value
+    if isinstance(value, float):
+        raise TypeError("Float types are not supported. Use Decimal types instead.")
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, dict):
+        return {k: _to_dynamo(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_dynamo(v) for v in value]
+    if isinstance(value, set):
+        return {_to_dynamo(v) for v in value}
+    return value
+
+
+# ===== Expressions =====
+_PATH_PART = re.compile(r"([^.\[\]]+)|\[(\d+)\]")
+
+
+def _path(expr, names):
+    parts = []
+    for name, index in _PATH_PART.findall(expr.strip()):
+        parts.append(int(index) if index else names.get(name, name))
+    return parts
+
+
+def _get_path(item, parts):
+    value = item
+    for part in parts:
+        if isinstance(part, int):
+            if not isinstance(value, list) or part >= len(value):
+                return None
+            value = value[part]
+        else:
+            if not isinstance(value, dict) or part not in value:
+                return None
+            value = value[part]
+    return value
+
+
+def _set_path(item, parts, value):
+    target = item
+    for part in parts[:-1]:
+        target = target[part]
+    last = parts[-1]
+    if isinstance(last, int) and last >= len(target):
+        target.append(value)  # like DynamoDB: out-of-range list index appends
+    else:
+        target[last] = value
+
+
+def _remove_path(item, parts):
+    target = _get_path(item, parts[:-1]) if len(parts) > 1 else item
+    if isinstance(target, dict):
+        target.pop(parts[-1], None)
+    elif isinstance(target, list) and parts[-1] < len(target):
+        target.pop(parts[-1])
+
+
+def _split_top_level(text, sep=","):
+    parts, depth, current = [], 0, ""
+    for ch in text:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == sep and depth == 0:
+            parts.append(current)
+            current = ""
+        else:
+            current += ch
+    parts.append(current)
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _operand(expr, item, names, values):
+    expr = expr.strip()
+    match = re.fullmatch(r"if_not_exists\((.+),(.+)\)", expr)
+    if match:
+        existing = _get_path(item, _path(match.group(1), names))
+        return existing if existing is not None else _operand(match.group(2), item, names, values)
+    match = re.fullmatch(r"list_append\((.+),(.+)\)", expr)
+    if match:
+        return list(_operand(match.group(1), item, names, values) or []) + \
+            list(_operand(match.group(2), item, names, values) or [])
+    match = re.fullmatch(r"size\((.+)\)", expr)
+    if match:
+        value = _get_path(item, _path(match.group(1), names))
+        return Decimal(len(value)) if value is not None else None
+    if expr.startswith(":"):
+        return values[expr]
+    return _get_path(item, _path(expr, names))
+
+
+def _evaluate(expr, item, names, values):
+    value = expr.strip()
+    for op in (" + ", " - "):
+        left, sep, right = value.rpartition(op)
+        if sep and left.count("(") == left.count(")"):
+            a = _evaluate(left, item, names, values)
+            b = _operand(right, item, names, values)
+            return a + b if op == " + " else a - b
+    return _operand(value, item, names, values)
+
+
+def apply_update(item, update_expression, names, values):
+    """Apply an UpdateExpression (SET / ADD / REMOVE clauses) to item in place."""
+    clauses = re.split(r"\b(SET|ADD|REMOVE|DELETE)\b", update_expression)
+    action = None
+    for chunk in clauses:
+        chunk = chunk.strip()
+        if chunk in ("SET", "ADD", "REMOVE", "DELETE"):
+            action = chunk
+            continue
+        for clause in _split_top_level(chunk):
+            if action == "SET":
+                path, _eq, expr = clause.partition("=")
+                _set_path(item, _path(path, names), _to_dynamo(_evaluate(expr, item, names, values)))
+            elif action == "ADD":
+                path, value = clause.split(None, 1)
+                parts = _path(path, names)
+                current = _get_path(item, parts)
+                increment = values[value.strip()]
+                if isinstance(increment, set):
+                    _set_path(item, parts, (current or set()) | increment)
+                else:
+                    _set_path(item, parts, _to_dynamo((current or 0) + increment))
+            elif action == "REMOVE":
+                _remove_path(item, _path(clause, names))
+            elif action == "DELETE":
+                path, value = clause.split(None, 1)
+                parts = _path(path, names)
+                _set_path(item, parts, (_get_path(item, parts) or set()) - values[value.strip()])
+
+
+_COMPARATORS = {
+    "=": lambda a, b: a == b, "<>": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b, "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b, ">=": lambda a, b: a is not None and a >= b,
+}
+
+
+def check_condition(expression, item, names, values):
+    """Evaluate a string ConditionExpression (AND / OR / NOT, comparisons, attribute_(not_)exists)."""
+    expression = expression.strip()
+    while _wrapped_in_parens(expression):
+        expression = expression[1:-1].strip()
+    for keyword, combine in ((" OR ", any), (" AND ", all)):
+        parts = _split_keyword(expression, keyword)
+        if len(parts) > 1:
+            return combine(check_condition(p, item, names, values) for p in parts)
+    if expression.upper().startswith("NOT "):
+        return not check_condition(expression[4:], item, names, values)
+    match = re.fullmatch(r"attribute_(not_)?exists\((.+)\)", expression)
+    if match:
+        exists = _get_path(item, _path(match.group(2), names)) is not None
+        return not exists if match.group(1) else exists
+    match = re.fullmatch(r"(.+?)\s*(<>|<=|>=|=|<|>)\s*(.+)", expression)
+    if match:
+        left = _operand(match.group(1), item, names, values)
+        right = _operand(match.group(3), item, names, values)
+        return _COMPARATORS[match.group(2)](left, right)
+    raise NotImplementedError(f"FakeDynamoDB cannot evaluate condition: {expression}")
+
+
+def _wrapped_in_parens(expression):
+    if not (expression.startswith("(") and expression.endswith(")")):
+        return False
+    depth = 0
+    for i, ch in enumerate(expression):
+        depth += ch == "("
+        depth -= ch == ")"
+        if depth == 0 and i < len(expression) - 1:
+            return False
+    return True
+
+
+def _split_keyword(expression, keyword):
+    parts, depth, start, i = [], 0, 0, 0
+    while i < len(expression):
+        ch = expression[i]
+        depth += ch == "("
+        depth -= ch == ")"
+        if depth == 0 and expression.upper().startswith(keyword, i):
+            parts.append(expression[start:i])
+            i += len(keyword)
+            start = i
+            continue
+        i += 1
+    parts.append(expression[start:])
+    return [p.strip() for p in parts]
+
+
+def _matches(condition, item):
+    """Evaluate a boto3 Key / Attr condition object against item."""
+    expression = condition.get_expression()
+    operator, operands = expression["operator"], expression["values"]
+    if operator == "AND":
+        return all(_matches(c, item) for c in operands)
+    if operator == "OR":
+        return any(_matches(c, item) for c in operands)
+    if operator == "NOT":
+        return not _matches(operands[0], item)
+    value = item.get(operands[0].name)
+    if operator == "attribute_exists":
+        return value is not None
+    if operator == "attribute_not_exists":
+        return value is None
+    if operator == "BETWEEN":
+        return value is not None and operands[1] <= value <= operands[2]
+    if operator == "begins_with":
+        return isinstance(value, str) and value.startswith(operands[1])
+    if operator == "contains":
+        return value is not None and operands[1] in value
+    if operator == "IN":
+        return value in operands[1]
+    return _COMPARATORS[operator](value, _to_dynamo(operands[1]))
+
+
+# ===== DynamoDB =====
+class FakeTable:
+    def __init__(self, name, resource):
+        schema = TABLE_SCHEMAS.get(name, {"key": ("id", None)})
+        self.name = name
+        self.resource = resource
+        self.partition_key, self.sort_key = schema["key"]
+        self.indexes = schema.get("indexes", {})
+        self._items = {}
+        self._lock = threading.Lock()
+        self.stream = None  # e.g. trip_card_events.LocalQueue: receives an INSERT per new item
+
+    # --- helpers ---
+    def _key_of(self, item):
+        return (item[self.partition_key], item.get(self.sort_key) if self.sort_key else None)
+
+    def _call(self, operation, write=False):
+        self.resource.counter.add(f"dynamodb.{operation}")
+        _sleep_ms(self.resource.write_latency_ms if write else self.resource.read_latency_ms)
+
+    def _existing(self, key):
+        return self._items.get((_to_dynamo(key[self.partition_key]),
+                                _to_dynamo(key.get(self.sort_key)) if self.sort_key else None))
+
+    def _check(self, kwargs, item, operation):
+        condition = kwargs.get("ConditionExpression")
+        if condition is None:
+            return
+        names = kwargs.get("ExpressionAttributeNames", {})
+        values = _to_dynamo(kwargs.get("ExpressionAttributeValues", {}))
+        ok = _matches(condition, item or {}) if isinstance(condition, ConditionBase) else \
+            check_condition(condition, item or {}, names, values)
+        if not ok:
+            raise _conditional_check_failed(operation)
+
+    @staticmethod
+    def _project(item, kwargs):
+        projection = kwargs.get("ProjectionExpression") or kwargs.get("AttributesToGet")
+        if not projection:
+            return copy.deepcopy(item)
+        names = kwargs.get("ExpressionAttributeNames", {})
+        if isinstance(projection, str):
+            projection = [names.get(p.strip(), p.strip()) for p in projection.split(",")]
+        return {k: copy.deepcopy(item[k]) for k in projection if k in item}
+
+    # --- API ---
+    def put_item(self, Item, **kwargs):
+        self._call("put_item", write=True)
+        item = _to_dynamo(copy.deepcopy(Item))
+        with self._lock:
+            existing = self._items.get(self._key_of(item))
+            self._check(kwargs, existing, "PutItem")
+            self._items[self._key_of(item)] = item
+        if self.stream is not None and existing is None:
+            self.stream.publish_insert(copy.deepcopy(Item))
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        self._call("get_item")
+        with self._lock:
+            item = self._existing(Key)
+            return {"Item": self._project(item, kwargs)} if item else {}
+
+    def delete_item(self, Key, **kwargs):
+        self._call("delete_item", write=True)
+        with self._lock:
+            item = self._existing(Key)
+            self._check(kwargs, item, "DeleteItem")
+            if item:
+                del self._items[self._key_of(item)]
+        return {}
+
+    def update_item(self, Key, UpdateExpression, **kwargs):
+        self._call("update_item", write=True)
+        with self._lock:
+            existing = self._existing(Key)
+            self._check(kwargs, existing, "UpdateItem")
+            item = copy.deepcopy(existing) if existing else _to_dynamo(dict(Key))
+            apply_update(item, UpdateExpression, kwargs.get("ExpressionAttributeNames", {}),
+                         _to_dynamo(kwargs.get("ExpressionAttributeValues", {})))
+            self._items[self._key_of(item)] = item
+        if kwargs.get("ReturnValues") in ("UPDATED_NEW", "ALL_NEW"):
+            return {"Attributes": copy.deepcopy(item)}
+        return {}
+
+    def query(self, KeyConditionExpression, **kwargs):
+        self._call("query")
+        index = kwargs.get("IndexName")
+        partition_key, sort_key = self.indexes[index] if index else (self.partition_key, self.sort_key)
+        with self._lock:
+            items = [i for i in self._items.values()
+                     if partition_key in i and _matches(KeyConditionExpression, i)]
+        items.sort(key=lambda i: i.get(sort_key, 0) if sort_key else 0,
+                   reverse=not kwargs.get("ScanIndexForward", True))
+        return self._page(items, kwargs, sort_key)
+
+    def scan(self, **kwargs):
+        self._call("scan")
+        with self._lock:
+            items = list(self._items.values())
+        return self._page(items, kwargs, self.sort_key)
+
+    def _page(self, items, kwargs, sort_key):
+        start = kwargs.get("ExclusiveStartKey")
+        if start:
+            marker = (start.get(self.partition_key), start.get(sort_key) if sort_key else None)
+            keys = [(i.get(self.partition_key), i.get(sort_key) if sort_key else None) for i in items]
+            items = items[keys.index(marker) + 1:] if marker in keys else []
+        limit = kwargs.get("Limit")
+        page, more = (items[:limit], len(items) > limit) if limit else (items, False)
+        last = page[-1] if page else None
+        if kwargs.get("FilterExpression") is not None:
+            page = [i for i in page if _matches(kwargs["FilterExpression"], i)]
+        response = {"Count": len(page), "ScannedCount": len(page)}
+        if kwargs.get("Select") != "COUNT":
+            response["Items"] = [self._project(i, kwargs) for i in page]
+        if more:
+            response["LastEvaluatedKey"] = {k: last[k] for k in (self.partition_key, sort_key) if k and k in last}
+        return response
+
+    def seed(self, items):
+        """Store items directly, without latency or call counting (fixtures, other lambdas' writes)."""
+        with self._lock:
+            for item in items:
+                item = _to_dynamo(copy.deepcopy(item))
+                self._items[self._key_of(item)] = item
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return _FakeBatchWriter(self)
+
+    def all_items(self):
+        with self._lock:
+            return copy.deepcopy(list(self._items.values()))
+
+
+class _FakeBatchWriter:
+    """Buffers writes and flushes them 25 at a time, counted as batch_write_item calls."""
+
+    def __init__(self, table):
+        self.table = table
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._flush()
+
+    def put_item(self, Item):
+        self.pending.append(("put", Item))
+        if len(self.pending) >= 25:
+            self._flush()
+
+    def delete_item(self, Key):
+        self.pending.append(("delete", Key))
+        if len(self.pending) >= 25:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        self.table.resource.counter.add("dynamodb.batch_write_item")
+        _sleep_ms(self.table.resource.write_latency_ms)
+        with self.table._lock:
+            for action, payload in self.pending:
+                if action == "put":
+                    item = _to_dynamo(copy.deepcopy(payload))
+                    self.table._items[self.table._key_of(item)] = item
+                else:
+                    existing = self.table._existing(payload)
+                    if existing:
+                        del self.table._items[self.table._key_of(existing)]
+        self.pending = []
+
+
+class FakeDynamoDB:
+    """boto3.resource("dynamodb") stand-in; tables are created on first use."""
+
+    def __init__(self, counter=None, read_latency_ms=4.0, write_latency_ms=6.0):
+        self.counter = counter or CallCounter()
+        self.read_latency_ms = read_latency_ms
+        self.write_latency_ms = write_latency_ms
+        self._tables = {}
+        self._lock = threading.Lock()
+        self.meta = types.SimpleNamespace(client=self)
+
+    def Table(self, name):
+        with self._lock:
+            if name not in self._tables:
+                self._tables[name] = FakeTable(name, self)
+            return self._tables[name]
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        self.counter.add("dynamodb.batch_get_item")
+        _sleep_ms(self.read_latency_ms)
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.Table(name)
+            with table._lock:
+                found = [table._existing(key) for key in request["Keys"]]
+            responses[name] = [table._project(item, request) for item in found if item]
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self.counter.add("dynamodb.batch_write_item")
+        _sleep_ms(self.write_latency_ms)
+        for name, requests in RequestItems.items():
+            table = self.Table(name)
+            with table._lock:
+                for request in requests:
+                    if "PutRequest" in request:
+                        item = _to_dynamo(copy.deepcopy(request["PutRequest"]["Item"]))
+                        table._items[table._key_of(item)] = item
+                    elif "DeleteRequest" in request:
+                        existing = table._existing(request["DeleteRequest"]["Key"])
+                        if existing:
+                            del table._items[table._key_of(existing)]
+        return {"UnprocessedItems": {}}
+
+
+# ===== OpenAI =====
+def estimate_tokens(text):
+    return max(1, len(text or "") // 4)
+
+
+def _ns(**kwargs):
+    return types.SimpleNamespace(**kwargs)
+
+
+class FakeOpenAI:
+    """
+    chat.completions.create() stand-in.
+
+    script(kwargs) returns {"content": str} or {"tool_calls": [(name, args_dict), ...]}
+    for each call. Latency is base_ms + prompt tokens * ms_per_prompt_token +
+    completion tokens * ms_per_token (streamed out token by token when stream=True).
+    """
+
+    def __init__(self, script, counter=None, base_ms=350.0, ms_per_token=12.0, ms_per_prompt_token=0.05):
+        self.script = script
+        self.counter = counter or CallCounter()
+        self.base_ms = base_ms
+        self.ms_per_token = ms_per_token
+        self.ms_per_prompt_token = ms_per_prompt_token
+        self._ids = itertools.count(1)
+        self.chat = _ns(completions=_ns(create=self._create))
+        self.usage = Counter()
+        self._lock = threading.Lock()
+
+    def _create(self, **kwargs):
+        self.counter.add("openai.chat.completions")
+        messages = kwargs.get("messages") or []
+        tools = kwargs.get("tools") or []
+        prompt_tokens = sum(estimate_tokens(json.dumps(m, default=str)) for m in messages) + \
+            estimate_tokens(json.dumps(tools))
+        planned = self.script(kwargs)
+        if kwargs.get("tool_choice") == "none":
+            planned = {"content": planned.get("content") or "Here is what I found."}
+        tool_calls = [
+            _ns(id=f"call_{next(self._ids)}", type="function",
+                function=_ns(name=name, arguments=json.dumps(arguments)))
+            for name, arguments in planned.get("tool_calls", [])
+        ]
+        content = planned.get("content")
+        completion_tokens = estimate_tokens(content) + sum(estimate_tokens(c.function.arguments) for c in tool_calls)
+        with self._lock:
+            self.usage["prompt_tokens"] += prompt_tokens
+            self.usage["completion_tokens"] += completion_tokens
+        usage = _ns(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                    total_tokens=prompt_tokens + completion_tokens, prompt_tokens_details=None)
+
+        _sleep_ms(self.base_ms + prompt_tokens * self.ms_per_prompt_token)
+        if kwargs.get("stream"):
+            return self._stream(content, tool_calls)
+        _sleep_ms(completion_tokens * self.ms_per_token)
+        message = _ns(role="assistant", content=content, tool_calls=tool_calls or None, function_call=None)
+        return _ns(choices=[_ns(index=0, message=message, finish_reason="stop")], usage=usage)
+
+    def _stream(self, content, tool_calls):
+        for index, call in enumerate(tool_calls):
+            _sleep_ms(estimate_tokens(call.function.arguments) * self.ms_per_token)
+            delta_call = _ns(index=index, id=call.id, type="function",
+                             function=_ns(name=call.function.name, arguments=call.function.arguments))
+            yield _ns(choices=[_ns(index=0, delta=_ns(content=None, tool_calls=[delta_call], function_call=None))])
+        for word in re.findall(r"\S+\s*", content or ""):
+            _sleep_ms(estimate_tokens(word) * self.ms_per_token)
+            yield _ns(choices=[_ns(index=0, delta=_ns(content=word, tool_calls=None, function_call=None))])
+
+
+# ===== Search endpoints =====
+CARRIERS = {"LY": "EL AL ISRAEL AIRLINES", "BA": "BRITISH AIRWAYS", "AF": "AIR FRANCE",
+            "LH": "LUFTHANSA", "UA": "UNITED AIRLINES", "DL": "DELTA AIR LINES"}
+
+
+def fake_flight_offers(params, count, rng):
+    origin = params.get("originLocationCode", "TLV")
+    destination = params.get("destinationLocationCode", "CDG")
+    departure = params.get("departureDate", "2026-12-07")
+    offers = []
+    for n in range(count):
+        carrier = rng.choice(list(CARRIERS))
+        stops = rng.choice([0, 0, 1, 1, 2])
+        hops = [origin] + [rng.choice(["FRA", "MUC", "LHR", "IST", "ATH"]) for _ in range(stops)] + [destination]
+        segments = [{
+            "departure": {"iataCode": a, "at": f"{departure}T{8 + i * 3:02d}:15:00"},
+            "arrival": {"iataCode": b, "at": f"{departure}T{10 + i * 3:02d}:40:00"},
+            "carrierCode": carrier, "number": str(rng.randint(100, 999)),
+            "aircraft": {"code": "320"}, "duration": "PT2H25M", "numberOfStops": 0,
+        } for i, (a, b) in enumerate(zip(hops, hops[1:]))]
+        total = f"{rng.uniform(180, 1400):.2f}"
+        offers.append({
+            "type": "flight-offer", "id": str(n + 1), "source": "GDS",
+            "numberOfBookableSeats": rng.randint(1, 9),
+            "itineraries": [{"duration": f"PT{2 + stops * 3}H{rng.randint(0, 59)}M", "segments": segments}],
+            "price": {"currency": "USD", "total": total, "base": total, "grandTotal": total,
+                      "fees": [{"amount": "0.00", "type": "SUPPLIER"}]},
+            "validatingAirlineCodes": [carrier],
+            "travelerPricings": [{
+                "travelerId": "1", "fareOption": "STANDARD", "travelerType": "ADULT",
+                "price": {"currency": "USD", "total": total, "base": total},
+                "fareDetailsBySegment": [{"segmentId": str(i), "cabin": "ECONOMY", "fareBasis": "KLOWFARE",
+                                          "class": "K", "includedCheckedBags": {"quantity": 1}}
+                                         for i in range(len(segments))],
+            }],
+        })
+    return {"meta": {"count": count}, "data": offers,
+            "dictionaries": {"carriers": CARRIERS, "aircraft": {"320": "AIRBUS A320"}}}
+
+
+def fake_hotel_offers(params, count, rng):
+    city = params.get("cityCode", "PAR")
+    check_in = params.get("checkInDate", "2026-12-07")
+    check_out = params.get("checkOutDate", "2026-12-10")
+    data = []
+    for n in range(count):
+        total = f"{rng.uniform(240, 2200):.2f}"
+        refundable = rng.random() < 0.6
+        data.append({
+            "type": "hotel-offers", "available": True,
+            "hotel": {"hotelId": f"HT{city}{n:04d}", "name": f"HOTEL {city} {n}", "cityCode": city,
+                      "latitude": 48.85, "longitude": 2.35},
+            "offers": [{
+                "id": f"OFFER{n:06d}", "checkInDate": check_in, "checkOutDate": check_out,
+                "rateCode": "RAC", "boardType": rng.choice(["ROOM_ONLY", "BREAKFAST"]),
+                "room": {"type": "A1K", "typeEstimated": {"category": "STANDARD_ROOM", "beds": 1, "bedType": "KING"},
+                         "description": {"text": "Standard room, king bed, free wifi", "lang": "EN"}},
+                "guests": {"adults": 2},
+                "price": {"currency": "EUR", "base": total, "total": total,
+                          "variations": {"average": {"base": total}}},
+                "policies": ({"cancellations": [{"deadline": f"{check_in}T12:00:00", "amount": "0.00"}],
+                              "refundable": {"cancellationRefund": "REFUNDABLE_UP_TO_DEADLINE"}}
+                             if refundable else {"refundable": {"cancellationRefund": "NON_REFUNDABLE"}}),
+            }],
+        })
+    return {"data": data}
+
+
+class _FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self._payload = payload
+        self.status_code = status_code
+        self.connection_reused = True
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class FakeSearchSession:
+    """
+    Stand-in for the "lambda-urls" pooled session: answers the search Function
+    URLs like the search lambdas do, saving the offers to the fake tables.
+    """
+
+    def __init__(self, dynamodb, flights_url, hotels_url, counter=None, latency_ms=900.0,
+                 flight_count=25, hotel_count=20, seed=7):
+        self.dynamodb = dynamodb
+        self.flights_url = flights_url
+        self.hotels_url = hotels_url
+        self.counter = counter or CallCounter()
+        self.latency_ms = latency_ms
+        self.flight_count = flight_count
+        self.hotel_count = hotel_count
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def post(self, url, json=None, timeout=None, **kwargs):
+        body = json or {}
+        params = body.get("params") or {}
+        _sleep_ms(self.latency_ms)
+        with self._rng_lock:
+            seed = self._rng.random()
+        rng = random.Random(seed)
+        now = int(time.time() * 1000)
+        if url == self.flights_url:
+            self.counter.add("http.search_flights")
+            result = fake_flight_offers(params, self.flight_count, rng)
+            # The search lambda's own writes: stored, but not counted against the caller
+            result["flightIds"] = [f"F{next(self._ids):08d}" for _ in result["data"]]
+            items = [{"flightId": flight_id, "timestamp": now, "flightDetails": _decimals(offer)}
+                     for flight_id, offer in zip(result["flightIds"], result["data"])]
+            self.dynamodb.Table("Flights").seed(items)
+            self.dynamodb.Table("FlightsLatest").seed(items)
+            return _FakeResponse(result)
+        if url == self.hotels_url:
+            self.counter.add("http.search_hotels")
+            result = fake_hotel_offers(params, self.hotel_count, rng)
+            result["hotelOfferIds"] = [f"H{next(self._ids):08d}" for _ in result["data"]]
+            items = [{"hotelOfferId": offer_id, "timestamp": now, "hotelOffersDetails": _decimals(item)}
+                     for offer_id, item in zip(result["hotelOfferIds"], result["data"])]
+            self.dynamodb.Table("Hotels").seed(items)
+            self.dynamodb.Table("HotelsLatest").seed(items)
+            return _FakeResponse(result)
+        self.counter.add("http.other")
+        return _FakeResponse({}, status_code=404)
+
+
+def _decimals(value):
+    return json.loads(json.dumps(value), parse_float=Decimal)
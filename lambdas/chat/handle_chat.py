@@ -1,17 +1,45 @@
 import json
-from openai import OpenAI
-import boto3
-from boto3.dynamodb.conditions import Key, Attr
 import time
-import requests
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from datetime import datetime, timedelta, timezone
-import re
 import os
+from triptailor.batch_writes import wait_for_pending_writes
+from triptailor.chat_history import new_message_item
+from triptailor.background_tasks import dispatch_task
+from triptailor.chat_summary import (
+    CHAT_SUMMARY_TABLE,
+    fold_is_due,
+    is_summary_task,
+    load_chat_context,
+    run_summary_task,
+    summary_prompt_message,
+    summary_task_event,
+)
+from triptailor.chat_titles import (
+    increment_user_message_count,
+    is_power_of_four,
+    is_title_task,
+    run_title_task,
+    title_task_event,
+)
+from triptailor.prompt_cache import cached_prompt_tokens, canonical, prefix_hash
+from triptailor.dates import describe_mention, resolve_date_expression, resolve_dates
+from triptailor.tools import run_search_flights, run_search_hotels
+from triptailor.projection import project_flight_offers, project_hotel_offers, to_prompt_json
+from triptailor.airports import airport_index, nearest_airports, region_for
+from triptailor.clients import dynamodb_resource, openai_client
+from triptailor.tracing import traced_handler
 
 # Initialize the DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+dynamodb = dynamodb_resource()
 chat_history_table = dynamodb.Table('chat-history')
 user_table = dynamodb.Table('user')
+chat_summary_table = dynamodb.Table(CHAT_SUMMARY_TABLE)
+
+# Build the airport index during init so requests only pay for the lookup
+airport_index()
+NEAREST_AIRPORT_MAX_KM = 550
+NEARBY_AIRPORT_KM = 110
 functionsDescription = [
     {
         "name": "search_flights",
@@ -165,18 +193,9 @@ functionsDescription = [
     # =====================================================================
 ]
 
-def invoke_lambda_http(url, args):
-    response = requests.post(url, json=args)
-    return response.json()
-
-
-def ensure_dict(response):
-    if isinstance(response, str):
-        try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            return {}
-    return response
+# Same schemas in the tools format (parallel tool_calls), in canonical key order
+# so the serialized tools - the start of every cached prompt prefix - never change
+toolsDescription = canonical([{"type": "function", "function": function} for function in functionsDescription])
 
 
 def add_new_chat_to_db(chat_id, user_id, headers):
@@ -226,105 +245,6 @@ def validate_request_body(body, headers):
     return None
 
 
-def get_user_message_count(user_id, chat_id):
-    """Return the count of user role messages in this chat."""
-    try:
-        response = chat_history_table.query(
-            KeyConditionExpression=Key('user_id').eq(user_id),
-            FilterExpression=Attr('chat_id').eq(chat_id),
-            ScanIndexForward=False,
-        )
-        items = response.get('Items', [])
-        return sum(1 for item in items if item.get('role') == 'user')
-    except Exception:
-        return 0
-
-
-def generate_chat_title(client, conversation_history):
-    """Ask the LLM to generate a concise title based on the conversation.
-
-    Returns a string title (no prefixes/suffixes), or empty string on failure.
-    """
-    try:
-        # Build a compact text transcript from the available history
-        # We keep it small to control tokens; this history already has a system
-        # prompt and up to ~10 recent messages.
-        transcript_lines = []
-        for m in conversation_history:
-            role = m.get('role', 'assistant')
-            content = m.get('content', '')
-            # Avoid overly long lines
-            content = content[:2000]
-            transcript_lines.append(f"{role}: {content}")
-        transcript = "\n".join(transcript_lines)
-
-        messages = [
-            {
-                "role": "system",
-                "content": (
-                    "You generate concise, human-readable chat titles. "
-                    "Return ONLY the title text. No prefixes, no quotes, no extra words."
-                ),
-            },
-            {
-                "role": "user",
-                "content": (
-                    "Write a short 2-4 word title for this conversation. "
-                    "Use plain text only.\n\nConversation:\n" + transcript
-                ),
-            },
-        ]
-
-        title_completion = client.chat.completions.create(
-            messages=messages,
-            model="gpt-4o",
-            max_tokens=24,
-        )
-        raw = title_completion.choices[0].message.content or ""
-        # Normalize by stripping whitespace and any accidental quotes/newlines
-        title = (raw or "").strip().strip('"').strip()
-        # Keep title modest length
-        if len(title) > 120:
-            title = title[:120]
-        return title
-    except Exception:
-        return ""
-
-
-def upsert_chat_title(user_id, chat_id, title):
-    """Persist title in user.chat_titles list at index chat_id - 1."""
-    if not title:
-        return False
-    try:
-        # Fetch current user record
-        user_res = user_table.get_item(Key={'user_id': user_id})
-        user_item = user_res.get('Item', {}) or {}
-        titles = user_item.get('chat_titles', [])
-
-        try:
-            chat_index = int(str(chat_id)) - 1
-        except Exception:
-            chat_index = 0
-
-        if chat_index < 0:
-            chat_index = 0
-
-        # Pad list to required length
-        while len(titles) <= chat_index:
-            titles.append("")
-
-        titles[chat_index] = title
-
-        user_table.update_item(
-            Key={'user_id': user_id},
-            UpdateExpression='SET chat_titles = :titles',
-            ExpressionAttributeValues={':titles': titles},
-        )
-        return True
-    except Exception:
-        return False
-
-
 def get_location_context(user_location):
     """
     Convert user location coordinates to contextual information for the LLM.
@@ -347,101 +267,11 @@ def get_location_context(user_location):
         if latitude is None or longitude is None:
             return None
             
-        # Simple airport mapping based on major cities/regions
-        # NOTE: Coordinates are approximate city centers (not precise airport coords).
-        # For production, consider a real airport DB (IATA→lat/lon) + nearest-lookup.
-
-        major_airports = {
-            # --- US East Coast ---
-            (40.7128, -74.0060): {'city': 'New York',       'airport': 'JFK',                           'code': 'JFK', 'region': 'US East Coast'},
-            (40.6892, -74.1745): {'city': 'Newark',         'airport': 'Newark',                        'code': 'EWR', 'region': 'US East Coast'},
-            (42.3601, -71.0589): {'city': 'Boston',         'airport': 'Logan',                         'code': 'BOS', 'region': 'US East Coast'},
-            (38.9072, -77.0369): {'city': 'Washington DC',  'airport': 'Reagan',                        'code': 'DCA', 'region': 'US East Coast'},
-            (39.9526, -75.1652): {'city': 'Philadelphia',   'airport': 'Philadelphia International',    'code': 'PHL', 'region': 'US East Coast'},
-            (35.2271, -80.8431): {'city': 'Charlotte',      'airport': 'Charlotte Douglas',             'code': 'CLT', 'region': 'US East Coast'},
-            (25.7617, -80.1918): {'city': 'Miami',          'airport': 'Miami International',            'code': 'MIA', 'region': 'US East Coast'},
-            (28.5383, -81.3792): {'city': 'Orlando',        'airport': 'Orlando International',          'code': 'MCO', 'region': 'US East Coast'},
-
-            # --- US South / Midwest / Mountain / West ---
-            (33.7490, -84.3880): {'city': 'Atlanta',        'airport': 'Hartsfield–Jackson',             'code': 'ATL', 'region': 'US South'},
-            (41.8781, -87.6298): {'city': 'Chicago',        'airport': "O'Hare",                        'code': 'ORD', 'region': 'US Midwest'},
-            (42.3314, -83.0458): {'city': 'Detroit',        'airport': 'Detroit Metro',                  'code': 'DTW', 'region': 'US Midwest'},
-            (44.9778, -93.2650): {'city': 'Minneapolis',    'airport': 'Minneapolis–Saint Paul',         'code': 'MSP', 'region': 'US Midwest'},
-            (32.7767, -96.7970): {'city': 'Dallas',         'airport': 'Dallas–Fort Worth',              'code': 'DFW', 'region': 'US South'},
-            (29.7604, -95.3698): {'city': 'Houston',        'airport': 'George Bush Intercontinental',   'code': 'IAH', 'region': 'US South'},
-            (30.2672, -97.7431): {'city': 'Austin',         'airport': 'Austin–Bergstrom',               'code': 'AUS', 'region': 'US South'},
-            (39.7392, -104.9903):{'city': 'Denver',         'airport': 'Denver International',           'code': 'DEN', 'region': 'US Mountain West'},
-            (33.4484, -112.0740):{'city': 'Phoenix',        'airport': 'Sky Harbor',                     'code': 'PHX', 'region': 'US Mountain West'},
-            (36.1699, -115.1398):{'city': 'Las Vegas',      'airport': 'Harry Reid International',       'code': 'LAS', 'region': 'US Mountain West'},
-            (40.7608, -111.8910):{'city': 'Salt Lake City', 'airport': 'Salt Lake City International',   'code': 'SLC', 'region': 'US Mountain West'},
-            (34.0522, -118.2437):{'city': 'Los Angeles',    'airport': 'LAX',                            'code': 'LAX', 'region': 'US West Coast'},
-            (37.7749, -122.4194):{'city': 'San Francisco',  'airport': 'SFO',                            'code': 'SFO', 'region': 'US West Coast'},
-            (47.6062, -122.3321):{'city': 'Seattle',        'airport': 'Sea-Tac',                        'code': 'SEA', 'region': 'US West Coast'},
-            (32.7157, -117.1611):{'city': 'San Diego',      'airport': 'San Diego International',        'code': 'SAN', 'region': 'US West Coast'},
-            (37.3382, -121.8863):{'city': 'San Jose',       'airport': 'Mineta San Jose',                'code': 'SJC', 'region': 'US West Coast'},
-            (45.5152, -122.6784):{'city': 'Portland',       'airport': 'Portland International',         'code': 'PDX', 'region': 'US West Coast'},
-
-            # --- Canada ---
-            (43.6532, -79.3832): {'city': 'Toronto',        'airport': 'Pearson',                        'code': 'YYZ', 'region': 'Canada'},
-            (45.5017, -73.5673): {'city': 'Montreal',       'airport': 'Trudeau',                        'code': 'YUL', 'region': 'Canada'},
-            (49.2827, -123.1207):{'city': 'Vancouver',      'airport': 'Vancouver International',        'code': 'YVR', 'region': 'Canada'},
-
-            # --- Europe ---
-            (51.5074,  -0.1278): {'city': 'London',         'airport': 'Heathrow',                       'code': 'LHR', 'region': 'Europe'},
-            (48.8566,   2.3522): {'city': 'Paris',          'airport': 'Charles de Gaulle',              'code': 'CDG', 'region': 'Europe'},
-            (52.5200,  13.4050): {'city': 'Berlin',         'airport': 'Brandenburg',                    'code': 'BER', 'region': 'Europe'},
-            (41.9028,  12.4964): {'city': 'Rome',           'airport': 'Fiumicino',                      'code': 'FCO', 'region': 'Europe'},
-            (52.3676,   4.9041): {'city': 'Amsterdam',      'airport': 'Schiphol',                       'code': 'AMS', 'region': 'Europe'},
-            (50.1109,   8.6821): {'city': 'Frankfurt',      'airport': 'Frankfurt',                      'code': 'FRA', 'region': 'Europe'},
-            (48.1351,  11.5820): {'city': 'Munich',         'airport': 'Munich',                         'code': 'MUC', 'region': 'Europe'},
-            (40.4168,  -3.7038): {'city': 'Madrid',         'airport': 'Adolfo Suárez Madrid–Barajas',   'code': 'MAD', 'region': 'Europe'},
-            (41.3874,   2.1686): {'city': 'Barcelona',      'airport': 'El Prat',                        'code': 'BCN', 'region': 'Europe'},
-            (47.3769,   8.5417): {'city': 'Zurich',         'airport': 'Zurich',                         'code': 'ZRH', 'region': 'Europe'},
-            (48.2082,  16.3738): {'city': 'Vienna',         'airport': 'Vienna International',           'code': 'VIE', 'region': 'Europe'},
-            (55.6761,  12.5683): {'city': 'Copenhagen',     'airport': 'Copenhagen (Kastrup)',           'code': 'CPH', 'region': 'Europe'},
-            (53.3498,  -6.2603): {'city': 'Dublin',         'airport': 'Dublin',                         'code': 'DUB', 'region': 'Europe'},
-            (50.8503,   4.3517): {'city': 'Brussels',       'airport': 'Brussels (Zaventem)',            'code': 'BRU', 'region': 'Europe'},
-            (38.7223,  -9.1393): {'city': 'Lisbon',         'airport': 'Humberto Delgado',               'code': 'LIS', 'region': 'Europe'},
-            (37.9838,  23.7275): {'city': 'Athens',         'airport': 'Eleftherios Venizelos',          'code': 'ATH', 'region': 'Europe'},
-            (41.0082,  28.9784): {'city': 'Istanbul',       'airport': 'Istanbul Airport',               'code': 'IST', 'region': 'Europe'},
-            (52.2297,  21.0122): {'city': 'Warsaw',         'airport': 'Chopin',                         'code': 'WAW', 'region': 'Europe'},
-            (50.0755,  14.4378): {'city': 'Prague',         'airport': 'Václav Havel',                   'code': 'PRG', 'region': 'Europe'},
-            (45.4642,   9.1900): {'city': 'Milan',          'airport': 'Malpensa',                       'code': 'MXP', 'region': 'Europe'},
-
-            # --- Middle East & North Africa ---
-            (32.0853,  34.7818): {'city': 'Tel Aviv',       'airport': 'Ben Gurion',                     'code': 'TLV', 'region': 'Middle East'},
-            (25.2048,  55.2708): {'city': 'Dubai',          'airport': 'Dubai International',            'code': 'DXB', 'region': 'Middle East'},
-            (25.2854,  51.5310): {'city': 'Doha',           'airport': 'Hamad International',            'code': 'DOH', 'region': 'Middle East'},
-            (24.4539,  54.3773): {'city': 'Abu Dhabi',      'airport': 'Abu Dhabi International',        'code': 'AUH', 'region': 'Middle East'},
-            (30.0444,  31.2357): {'city': 'Cairo',          'airport': 'Cairo International',            'code': 'CAI', 'region': 'Middle East'},
-
-            # --- Asia ---
-            (35.6762, 139.6503): {'city': 'Tokyo',          'airport': 'Narita',                         'code': 'NRT', 'region': 'Asia'},
-            (1.3521,  103.8198): {'city': 'Singapore',      'airport': 'Changi',                         'code': 'SIN', 'region': 'Asia'},
-            (22.3193, 114.1694): {'city': 'Hong Kong',      'airport': 'Hong Kong International',        'code': 'HKG', 'region': 'Asia'},
-            (37.5665, 126.9780): {'city': 'Seoul',          'airport': 'Incheon International',          'code': 'ICN', 'region': 'Asia'},
-            (13.7563, 100.5018): {'city': 'Bangkok',        'airport': 'Suvarnabhumi',                   'code': 'BKK', 'region': 'Asia'},
-            (28.6139,  77.2090): {'city': 'Delhi',          'airport': 'Indira Gandhi International',    'code': 'DEL', 'region': 'Asia'},
-
-            # --- Oceania & Latin America (a few big ones for coverage) ---
-            (-33.8688, 151.2093):{'city': 'Sydney',         'airport': 'Sydney Kingsford Smith',         'code': 'SYD', 'region': 'Oceania'},
-            (-23.5505, -46.6333):{'city': 'São Paulo',      'airport': 'Guarulhos',                      'code': 'GRU', 'region': 'South America'},
-        }
+        # k-nearest commercial airports from the load-once index (haversine distances)
+        nearby = nearest_airports(float(latitude), float(longitude), k=3, max_km=NEAREST_AIRPORT_MAX_KM)
 
-        
-        # Find the nearest airport (simple distance calculation)
-        min_distance = float('inf')
-        nearest_airport = None
-        
-        for (airport_lat, airport_lon), airport_info in major_airports.items():
-            # Simple distance calculation (not perfect but good enough for this use case)
-            distance = ((latitude - airport_lat) ** 2 + (longitude - airport_lon) ** 2) ** 0.5
-            if distance < min_distance:
-                min_distance = distance
-                nearest_airport = airport_info
-        
-        # If we found a nearby airport (within reasonable distance)
-        if nearest_airport and min_distance < 5.0:  # roughly 5 degrees = ~550km
+        if nearby:
+            nearest_airport, distance_km = nearby[0]
             return {
                 'has_location': True,
                 'latitude': latitude,
@@ -449,10 +279,14 @@ def get_location_context(user_location):
                 'accuracy_meters': accuracy,
                 'timestamp': timestamp,
                 'nearest_city': nearest_airport['city'],
-                'nearest_airport': nearest_airport['airport'],
+                'nearest_airport': nearest_airport['name'],
                 'nearest_airport_code': nearest_airport['code'],
-                'region': nearest_airport['region'],
-                'distance_estimate': 'nearby' if min_distance < 1.0 else 'regional'
+                'nearest_airport_distance_km': round(distance_km),
+                'nearby_airport_codes': [
+                    airport['code'] for airport, km in nearby if km <= NEARBY_AIRPORT_KM
+                ],
+                'region': region_for(nearest_airport),
+                'distance_estimate': 'nearby' if distance_km < NEARBY_AIRPORT_KM else 'regional'
             }
         else:
             # Generic location info without specific airport
@@ -486,134 +320,31 @@ def parse_relative_date_expression(relative_expression, context=None):
         dict: Contains 'date' (YYYY-MM-DD), 'success' (bool), 'message' (str)
     """
     try:
-        # Get current date in UTC
-        now = datetime.now(timezone.utc)
-        today = now.date()
-        
-        # Normalize the expression
-        expr = relative_expression.lower().strip()
-        
-        # Handle simple cases
-        if expr in ['today']:
-            return {
-                'date': today.strftime('%Y-%m-%d'),
-                'success': True,
-                'message': f"Today is {today.strftime('%A, %B %d, %Y')}"
-            }
-        
-        elif expr in ['tomorrow']:
-            tomorrow = today + timedelta(days=1)
-            return {
-                'date': tomorrow.strftime('%Y-%m-%d'),
+        mention = resolve_date_expression(relative_expression or '')
+        if mention and mention['start']:
+            start = datetime.strptime(mention['start'], '%Y-%m-%d')
+            result = {
+                'date': mention['start'],
                 'success': True,
-                'message': f"Tomorrow is {tomorrow.strftime('%A, %B %d, %Y')}"
+                'message': f"{mention['text'].capitalize()} is {start.strftime('%A, %B %d, %Y')}"
             }
-        
-        # Handle "in X days" pattern
-        days_match = re.search(r'in (\d+) days?', expr)
-        if days_match:
-            days = int(days_match.group(1))
-            target_date = today + timedelta(days=days)
-            return {
-                'date': target_date.strftime('%Y-%m-%d'),
-                'success': True,
-                'message': f"In {days} days is {target_date.strftime('%A, %B %d, %Y')}"
-            }
-        
-        # Handle "next week" 
-        if 'next week' in expr:
-            # Next Monday
-            days_until_next_monday = (7 - today.weekday()) % 7
-            if days_until_next_monday == 0:  # If today is Monday
-                days_until_next_monday = 7
-            next_monday = today + timedelta(days=days_until_next_monday)
-            return {
-                'date': next_monday.strftime('%Y-%m-%d'),
-                'success': True,
-                'message': f"Next week starts on {next_monday.strftime('%A, %B %d, %Y')}"
-            }
-        
-        # Handle specific weekdays
-        weekdays = {
-            'monday': 0, 'tuesday': 1, 'wednesday': 2, 'thursday': 3,
-            'friday': 4, 'saturday': 5, 'sunday': 6
-        }
-        
-        for day_name, day_num in weekdays.items():
-            if day_name in expr:
-                current_weekday = today.weekday()
-                
-                if 'next' in expr:
-                    # Next occurrence of this weekday
-                    days_ahead = day_num - current_weekday
-                    if days_ahead <= 0:  # Target day already happened this week
-                        days_ahead += 7
-                    target_date = today + timedelta(days=days_ahead)
-                elif 'this' in expr:
-                    # This week's occurrence
-                    days_ahead = day_num - current_weekday
-                    if days_ahead < 0:  # Already passed this week
-                        return {
-                            'date': None,
-                            'success': False,
-                            'message': f"This {day_name.capitalize()} has already passed. Did you mean next {day_name.capitalize()}?"
-                        }
-                    target_date = today + timedelta(days=days_ahead)
-                else:
-                    # Default to next occurrence
-                    days_ahead = day_num - current_weekday
-                    if days_ahead <= 0:
-                        days_ahead += 7
-                    target_date = today + timedelta(days=days_ahead)
-                
-                return {
-                    'date': target_date.strftime('%Y-%m-%d'),
-                    'success': True,
-                    'message': f"{expr.title()} is {target_date.strftime('%A, %B %d, %Y')}"
-                }
-        
-        # Handle "this weekend" / "next weekend"
-        if 'weekend' in expr:
-            current_weekday = today.weekday()
-            
-            if 'this' in expr:
-                # This Saturday
-                days_to_saturday = (5 - current_weekday) % 7
-                if current_weekday >= 5:  # Already weekend
-                    days_to_saturday = 0 if current_weekday == 5 else -1
-                target_date = today + timedelta(days=days_to_saturday)
-            else:  # 'next' or just 'weekend'
-                # Next Saturday
-                days_to_saturday = (5 - current_weekday) % 7
-                if days_to_saturday <= 1 and current_weekday >= 5:  # Currently weekend
-                    days_to_saturday += 7
-                target_date = today + timedelta(days=days_to_saturday)
-            
-            return {
-                'date': target_date.strftime('%Y-%m-%d'),
-                'success': True,
-                'message': f"Weekend starts {target_date.strftime('%A, %B %d, %Y')}"
-            }
-        
-        # Handle "next month"
-        if 'next month' in expr:
-            if today.month == 12:
-                next_month = today.replace(year=today.year + 1, month=1, day=1)
-            else:
-                next_month = today.replace(month=today.month + 1, day=1)
-            return {
-                'date': next_month.strftime('%Y-%m-%d'),
-                'success': True,
-                'message': f"Next month starts {next_month.strftime('%A, %B %d, %Y')}"
-            }
-        
+            if mention['end']:
+                end = datetime.strptime(mention['end'], '%Y-%m-%d')
+                result['end_date'] = mention['end']
+                result['message'] += f" to {end.strftime('%A, %B %d, %Y')}"
+            if mention['note']:
+                result['message'] += f" ({mention['note']})"
+            return result
+        if mention:
+            return {'date': None, 'success': False, 'message': mention['note']}
+
         # If we can't parse it, return error
         return {
             'date': None,
             'success': False,
             'message': f"I couldn't understand '{relative_expression}'. Please use a specific date like '2025-01-15' or try expressions like 'tomorrow', 'next Friday', 'in 3 days'."
         }
-        
+
     except Exception as e:
         return {
             'date': None,
@@ -622,17 +353,20 @@ def parse_relative_date_expression(relative_expression, context=None):
         }
 
 
+@traced_handler("handle_chat")
 def lambda_handler(event, context):
     # CORS headers - defined first to ensure they're always available
-    headers = {
-        'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Methods': 'OPTIONS,POST,GET',
-        'Access-Control-Allow-Headers': 'Content-Type,Authorization,X-Amz-Date,X-Api-Key,X-Amz-Security-Token',
-        'Access-Control-Allow-Credentials': 'false',
-        'Access-Control-Max-Age': '86400'
-    }
-    
+    headers = _cors_headers()
+
+    # Background tasks (async self-invocations from a chat turn)
+    if is_title_task(event):
+        return {"title": _run_title_task(event)}
+    if is_summary_task(event):
+        return {"folded": _run_summary_task(event)}
+
     try:
+        if _wants_stream(event):
+            return _handle_buffered_stream_request(event, headers)
         return _handle_chat_request(event, context, headers)
     except Exception as e:
         print(f"[handle_chat] Unexpected error: {str(e)}")
@@ -641,63 +375,133 @@ def lambda_handler(event, context):
             "headers": headers,
             "body": json.dumps({"error": "Internal server error"})
         }
+    finally:
+        # Search results persisted in write-behind mode (in-process tools)
+        wait_for_pending_writes()
 
 
-def _handle_chat_request(event, context, headers):
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+def _cors_headers():
+    return {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'OPTIONS,POST,GET',
+        'Access-Control-Allow-Headers': 'Content-Type,Authorization,X-Amz-Date,X-Api-Key,X-Amz-Security-Token',
+        'Access-Control-Allow-Credentials': 'false',
+        'Access-Control-Max-Age': '86400'
+    }
 
-    if event.get("requestContext", {}).get("http", {}).get("method") == "OPTIONS":
-        return {
-            "statusCode": 200,
-            "headers": headers,
-            "body": ""
-        }
 
+def _parse_chat_body(event, headers):
+    """Return (body, None) for a valid chat request, or (None, error_response)."""
     try:
-        body = json.loads(event.get('body', '{}'))
+        body = json.loads(event.get('body') or '{}')
     except json.JSONDecodeError:
-        return {
+        return None, {
             "statusCode": 400,
             'headers': headers,
             "body": json.dumps({"error": "Invalid JSON"})
         }
 
-    # Validate request body
     validation_error = validate_request_body(body, headers)
     if validation_error:
-        return validation_error
-
-    user_prompt = body.get('user_prompt')
-    user_id = body.get('user_id')
-    chat_id = body.get('chat_id')
-    user_location = body.get('user_location')  # Extract location data
-
-    # Retrieve the last 10 messages from DynamoDB
-    response = chat_history_table.query(
-        KeyConditionExpression=Key('user_id').eq(user_id),
-        FilterExpression=Attr('chat_id').eq(chat_id),
-        ScanIndexForward=False,
-    )
+        return None, validation_error
+
+    return body, None
+
+
+# ============================================================================
+# Prompt layout
+#
+# Provider-side prompt caching only reuses an exact prefix of the request
+# (tool schemas first, then the messages). Everything that is the same for
+# every turn therefore comes first and never changes byte-for-byte: the tool
+# schemas (canonical key order) and SYSTEM_PROMPT. Everything per-turn comes
+# after it: summary and history, then the date/location context, then the
+# resolved dates and the user prompt. Keep request-specific values out of
+# SYSTEM_PROMPT; prompt_prefix_hash() changes whenever the prefix does.
+
+SYSTEM_PROMPT = (
+    "You are TripTailor's Travel Agent AI assistant, your main goal is to help the user plan their next vacation.\n\n"
+    "RELATIVE DATE HANDLING:\n"
+    "When users mention relative dates like 'tomorrow', 'next week', 'this Friday', etc., you have two options:\n"
+    "1. For simple cases, calculate the date yourself based on the current date given in the conversation context.\n"
+    "2. For complex or ambiguous cases, use the parse_relative_date function to get the exact date.\n"
+    "Dates that were already resolved from the user's message are listed right before it; use those directly.\n"
+    "Always convert relative dates to YYYY-MM-DD format before calling search_flights or search_hotels.\n"
+    "If a calculated date seems to be in the past based on the current date, ask the user to clarify.\n\n"
+    "TRIP CARD MANAGEMENT:\n"
+    "You are also responsible for managing the user's 'trip card' - a personalized record that tracks their evolving trip plan. "
+    "This trip card contains destinations, travel dates, a trip summary, and collections of flights and hotels the user has explored. "
+    "When users ask you to remove flights, hotels, or other items from their trip card, acknowledge their request and confirm that you will make the requested changes. "
+    "For example, if they say 'remove that expensive flight' or 'take out the hotel in Paris', respond positively like 'I'll remove that flight from your trip card' or 'I'll take that hotel out of your trip planning'. "
+    "The trip card is automatically updated based on our conversation, so you don't need to perform manual actions - just acknowledge that their preferences will be reflected.\n\n"
+    "Carefully distinguish between helping the user plan their vacation and helping them find flights or hotels. "
+    "if the user did not specificaly asked you to find them a flight or hotel, dont ask them for the required details in order to search flight or hotels. Instead be more attentive to the user's request and answer accordingly.\n\n"
+    "You can help the user find flights and hotels using the functions at your disposal, use them as much as you need. Use them either if the user explicitly asked you to look for flights or hotels, or you can ask the user yourself if they are interested in you looking for flight or hotels for them. "
+    "Don't make assumptions about function arguments. Always validate inputs. "
+    "If the user asks for a function call, but the parameters are not valid, ask the user to clarify. "
+    "Ensure all function inputs follow their expected format before proceeding. "
+    "When using function calls, always respect the function's own parameter description. "
+    "If a location is mentioned (like a city or country), convert it to the proper IATA airport code or ask the user to clarify.\n\n" 
+    "You can also help the user with overall planing of their vacation by answering their questions, and asking followup questions if needed. "
+    "You are ecouraged to give recomendations for attractions and places to see and visit at the user's destination, but first ask if the user is interested. "
+    "If the user asks questions that are out of scope or inapropriate for your context, for example asking thing that are not travel related or feel unrelated to the flow of the conversation, tell them politely that you are unable to help with that subject. "
+    "If the user asks in scope questions that you are unable to answer for some reason, for example you were not able to find flights according to the criteria the user asked, Do Not send the user to external options like google or other websites and tell them politely that you were unable to help them, let them try again with better guidance.\n\n"
+    "Keep responses helpful, engaging, and focused on travel planning. Use a friendly, enthusiastic tone. "
+    "You are welcome to use emojis in your answers. "
+)
+STATIC_PREFIX = [{"role": "system", "content": SYSTEM_PROMPT}]
+
+
+def prompt_prefix_hash(conversation_history=None):
+    """Hash of the cacheable prefix (tools + static system prompt) of a conversation."""
+    messages = conversation_history if conversation_history is not None else STATIC_PREFIX
+    return prefix_hash(messages[:len(STATIC_PREFIX)], toolsDescription)
+
+
+PROMPT_PREFIX_HASH = prompt_prefix_hash()
+print(f"[handle_chat] Prompt prefix hash {PROMPT_PREFIX_HASH}")
+
+
+def _context_message(current_time, location_prompt):
+    """Per-turn system context: current date/time and the user's location."""
+    current_date_str = current_time.strftime('%A, %B %d, %Y at %I:%M %p UTC')
+    today_str = current_time.strftime('%Y-%m-%d')
+    tomorrow_str = (current_time + timedelta(days=1)).strftime('%Y-%m-%d')
+    next_week_str = (current_time + timedelta(days=7)).strftime('%Y-%m-%d')
+    return {"role": "system", "content": (
+        f"CURRENT DATE AND TIME: {current_date_str}\n"
+        f"Today's date: {today_str}\n"
+        f"- 'today' = {today_str}\n"
+        f"- 'tomorrow' = {tomorrow_str}\n"
+        f"- 'next week' = around {next_week_str}\n\n"
+        f"{location_prompt}"
+    ).rstrip()}
 
-    conversation_history = response.get('Items', [])[:10]  # Get the last 10 messages
 
+def _build_conversation(user_id, chat_id, user_prompt, user_location, headers):
+    """
+    Build the message list for the model: static system prompt, rolling summary,
+    recent history, date/location context and the new prompt. Also returns the loaded chat context,
+    which _schedule_summary_fold() needs after the turn.
+    """
+    # Summary of older turns + the messages it does not cover yet (bounded by a token budget)
+    chat_context = load_chat_context(chat_history_table, chat_summary_table, user_id, chat_id)
 
-    if len(conversation_history) == 0:
+    if not chat_context['summary'] and not chat_context['messages']:
         add_new_chat_to_db(chat_id, user_id, headers)
 
-    conversation_history = sorted(conversation_history, key=lambda x: x['timestamp'])
-
-    # Remove unnecessary fields
-    for message in conversation_history:
-        del message['user_id']
-        del message['timestamp']
+    # Static prefix first (cacheable), then the summary and recent history
+    conversation_history = list(STATIC_PREFIX)
+    summary_message = summary_prompt_message(chat_context['summary'])
+    if summary_message:
+        conversation_history.append(summary_message)
+    # Keep only the fields the model needs
+    conversation_history.extend(
+        {'role': message['role'], 'content': message['content']}
+        for message in chat_context['messages']
+    )
 
-    # Get current date/time for the system prompt
     current_time = datetime.now(timezone.utc)
-    current_date_str = current_time.strftime('%A, %B %d, %Y at %I:%M %p UTC')
-    today_str = current_time.strftime('%Y-%m-%d')
-    tomorrow_str = (current_time + timedelta(days=1)).strftime('%Y-%m-%d')
-    next_week_str = (current_time + timedelta(days=7)).strftime('%Y-%m-%d')
 
     # Process user location data
     location_context = get_location_context(user_location)
@@ -713,8 +517,13 @@ def _handle_chat_request(event, context, headers):
                 f"{location_context['nearest_airport_code']} ({location_context['nearest_city']}) as their departure airport. "
                 f"Feel free to mention this contextually in your responses, for example: "
                 f"'Since you're near {location_context['nearest_city']}, I can search for flights from {location_context['nearest_airport_code']}.' "
-                f"Always ask for confirmation before using this as the origin airport.\n\n"
+                f"Always ask for confirmation before using this as the origin airport.\n"
             )
+            other_airports = [code for code in location_context.get('nearby_airport_codes', [])
+                              if code != location_context['nearest_airport_code']]
+            if other_airports:
+                location_prompt += f"Other airports close to the user: {', '.join(other_airports)}.\n"
+            location_prompt += "\n"
         else:
             location_prompt = (
                 f"USER LOCATION CONTEXT:\n"
@@ -723,263 +532,486 @@ def _handle_chat_request(event, context, headers):
                 f"When they ask for flights, you'll need to ask them to specify their departure airport.\n\n"
             )
 
-    # Add the system message
-    conversation_history.insert(0, {"role": "system",
-        "content": (
-        f"CURRENT DATE AND TIME: {current_date_str}\n"
-        f"Today's date: {today_str}\n\n"
-        f"{location_prompt}"
-        "You are TripTailor's Travel Agent AI assistant, your main goal is to help the user plan their next vacation.\n\n"
-        "RELATIVE DATE HANDLING:\n"
-        "When users mention relative dates like 'tomorrow', 'next week', 'this Friday', etc., you have two options:\n"
-        "1. For simple cases, calculate the date yourself based on the current date above:\n"
-        f"   - 'today' = {today_str}\n"
-        f"   - 'tomorrow' = {tomorrow_str}\n"
-        f"   - 'next week' = around {next_week_str}\n"
-        "2. For complex or ambiguous cases, use the parse_relative_date function to get the exact date.\n"
-        "Always convert relative dates to YYYY-MM-DD format before calling search_flights or search_hotels.\n"
-        "If a calculated date seems to be in the past based on the current date, ask the user to clarify.\n\n"
-        "TRIP CARD MANAGEMENT:\n"
-        "You are also responsible for managing the user's 'trip card' - a personalized record that tracks their evolving trip plan. "
-        "This trip card contains destinations, travel dates, a trip summary, and collections of flights and hotels the user has explored. "
-        "When users ask you to remove flights, hotels, or other items from their trip card, acknowledge their request and confirm that you will make the requested changes. "
-        "For example, if they say 'remove that expensive flight' or 'take out the hotel in Paris', respond positively like 'I'll remove that flight from your trip card' or 'I'll take that hotel out of your trip planning'. "
-        "The trip card is automatically updated based on our conversation, so you don't need to perform manual actions - just acknowledge that their preferences will be reflected.\n\n"
-        "Carefully distinguish between helping the user plan their vacation and helping them find flights or hotels. "
-        "if the user did not specificaly asked you to find them a flight or hotel, dont ask them for the required details in order to search flight or hotels. Instead be more attentive to the user's request and answer accordingly.\n\n"
-        "You can help the user find flights and hotels using the functions at your disposal, use them as much as you need. Use them either if the user explicitly asked you to look for flights or hotels, or you can ask the user yourself if they are interested in you looking for flight or hotels for them. "
-        "Don't make assumptions about function arguments. Always validate inputs. "
-        "If the user asks for a function call, but the parameters are not valid, ask the user to clarify. "
-        "Ensure all function inputs follow their expected format before proceeding. "
-        "When using function calls, always respect the function's own parameter description. "
-        "If a location is mentioned (like a city or country), convert it to the proper IATA airport code or ask the user to clarify.\n\n" 
-        "You can also help the user with overall planing of their vacation by answering their questions, and asking followup questions if needed. "
-        "You are ecouraged to give recomendations for attractions and places to see and visit at the user's destination, but first ask if the user is interested. "
-        "If the user asks questions that are out of scope or inapropriate for your context, for example asking thing that are not travel related or feel unrelated to the flow of the conversation, tell them politely that you are unable to help with that subject. "
-        "If the user asks in scope questions that you are unable to answer for some reason, for example you were not able to find flights according to the criteria the user asked, Do Not send the user to external options like google or other websites and tell them politely that you were unable to help them, let them try again with better guidance.\n\n"
-        "Keep responses helpful, engaging, and focused on travel planning. Use a friendly, enthusiastic tone. "
-        "You are welcome to use emojis in your answers. "
-        
-    )})
+    # Per-turn context goes after the static prefix and the history
+    conversation_history.append(_context_message(current_time, location_prompt))
+
+    # Dates in the prompt resolved up front, so they don't need a parse_relative_date call
+    resolved_dates = resolve_dates(user_prompt, current_time.date())
+    if resolved_dates:
+        conversation_history.append({"role": "system", "content": (
+            "DATES IN THE USER'S NEXT MESSAGE (already resolved from today's date, use them as given):\n"
+            + "\n".join(f"- {describe_mention(mention)}" for mention in resolved_dates)
+        )})
+
     # Add the new user prompt
     conversation_history.append({"role": "user", "content": user_prompt})
 
-    # Call OpenAI API with the conversation history and function descriptions
-    try:
-        chat_completion = client.chat.completions.create(
-            messages=conversation_history,
-            model="gpt-4o",
-            max_tokens=1000,
-            functions=functionsDescription,
-        )
-    except Exception as e:
-        print(f"[handle_chat] OpenAI API error: {str(e)}")
-        return {
-            "statusCode": 500,
-            "headers": headers,
-            "body": json.dumps({"error": f"OpenAI API error: {str(e)}"})
-        }
+    return conversation_history, chat_context
 
-    # Initialize ID collections for response
-    collected_flight_ids = []
-    collected_hotel_ids = []
 
-    try:
-        ai_reply = chat_completion.choices[0].message
-    except (IndexError, AttributeError) as e:
-        print(f"[handle_chat] OpenAI response parsing error: {str(e)}")
-        return {
-            "statusCode": 500,
-            "headers": headers,
-            "body": json.dumps({"error": f"Invalid OpenAI response format: {str(e)}"})
-        }
-    
-    if ai_reply.function_call:
+def _run_tool(func_name, function_arguments, user_id, chat_id):
+    """
+    Run one tool call. Returns {"content", "flight_ids", "hotel_ids"}; content
+    is the tool message the model sees when it writes the answer.
+    """
+    result = {"content": "", "flight_ids": [], "hotel_ids": []}
+
+    if func_name == "search_flights":  # Handle flight search
         try:
-            func_name = ai_reply.function_call.name
-            function_arguments = json.loads(ai_reply.function_call.arguments)
-        except json.JSONDecodeError as e:
-            print(f"[handle_chat] Function arguments JSON decode error: {str(e)}")
-            return {
-                "statusCode": 500,
-                "headers": headers,
-                "body": json.dumps({"error": f"Invalid function arguments: {str(e)}"})
-            }
-        except AttributeError as e:
-            print(f"[handle_chat] Function call parsing error: {str(e)}")
-            return {
-                "statusCode": 500,
-                "headers": headers,
-                "body": json.dumps({"error": f"Invalid function call format: {str(e)}"})
-            }
+            lambda_response = run_search_flights(user_id, chat_id, function_arguments)
+        except Exception as e:
+            print(f"[handle_chat] Error running search_flights: {str(e)}")
+            lambda_response = {"data": [], "flightIds": []}
+        # Only the fields the summary needs, best TOOL_RESULT_TOP_K offers first
+        flights = project_flight_offers(lambda_response, top_k=TOOL_RESULT_TOP_K)
+        result["flight_ids"] = lambda_response.get("flightIds", [])
+        formatted_flights_results = (
+            "Summarize the following flights for a non-technical user.\n"
+            "Include airline names, departure and arrival times, duration, number of stops, and price. "
+            "Do not include any code or technical formats like JSON or TypeScript. "
+            "Format times and durations in a readable format (e.g., '3h 30m'). "
+            "Mention how many options were found. "
+            "Make it friendly and conversational, remember to keep you travel agent persona and be concise.\n\n"
+            f"Flights:\n{to_prompt_json(flights)}"
+        )
+        result["content"] = (
+            formatted_flights_results
+            if flights["offers"]
+            else "No flight options found. Inform the user and ask them to try again."
+        )
 
-        params = {
-            'user_id': user_id,
-            'chat_id': chat_id,
-            'params': function_arguments
-        }
+    elif func_name == "search_hotels":
+        try:
+            lambda_response = run_search_hotels(user_id, chat_id, function_arguments)
+        except Exception as e:
+            print(f"[handle_chat] Error running search_hotels: {str(e)}")
+            lambda_response = {"data": [], "hotelOfferIds": []}
+
+        hotels = project_hotel_offers(lambda_response, top_k=TOOL_RESULT_TOP_K)
+        result["hotel_ids"] = lambda_response.get("hotelOfferIds", [])
+        formatted_hotels_results = (
+            "Summarize the following hotel offers for a non-technical traveler.\n"
+            "For each option, include: hotel name, neighborhood/city, star rating if available, "
+            "check-in and check-out dates, whether breakfast/refundability is included when available, "
+            "and the total price with currency. Mention how many options were found. "
+            "Keep it friendly and conversational, remember to keep you travel agent persona and be concise.\n\n"
+            f"Hotels:\n{to_prompt_json(hotels)}"
+        )
+        result["content"] = (
+            formatted_hotels_results
+            if hotels["hotels"]
+            else "No hotel options found. Inform the user and offer to change dates or filters."
+        )
 
-        if func_name == "search_flights":  # Handle flight search
-            try:
-                lambda_response = invoke_lambda_http(
-                    "https://hg7skevcilgzhpzan4rwsnggyy0mleap.lambda-url.us-east-1.on.aws/", params)
-                lambda_response = ensure_dict(lambda_response)
-            except Exception as e:
-                print(f"[handle_chat] Error calling search_flights lambda: {str(e)}")
-                lambda_response = {"data": [], "flightIds": []}
-            flight_data = lambda_response.get("data", [])
-            flight_ids = lambda_response.get("flightIds", [])
-            collected_flight_ids.extend(flight_ids)
-            formatted_flights_results = (
-                "Summarize the following flights for a non-technical user.\n"
-                "Include airline names, departure and arrival times, duration, number of stops, and price. "
-                "Do not include any code or technical formats like JSON or TypeScript. "
-                "Format times and durations in a readable format (e.g., '3h 30m'). "
-                "Mention how many options were found. "
-                "Make it friendly and conversational, remember to keep you travel agent persona and be concise.\n\n"
-                f"Flights:\n{flight_data}"
-            )
+    elif func_name == "parse_relative_date":
+        relative_expression = function_arguments.get('relative_expression', '')
+        context = function_arguments.get('context', '')
+
+        # Call our date parsing function
+        date_result = parse_relative_date_expression(relative_expression, context)
 
-            conversation_history.append(
-                {"role": "system", "content": formatted_flights_results}
-                if flight_data
-                else
-                {"role": "system", "content": "No flight options found. Inform the user and ask them to try again."}
+        if date_result['success']:
+            result["content"] = (
+                f"Date parsing successful: '{relative_expression}' = {date_result['date']}\n"
+                f"Explanation: {date_result['message']}\n"
+                f"Use this date ({date_result['date']}) in your response and for any subsequent flight or hotel searches."
             )
+        else:
+            result["content"] = (
+                f"Date parsing failed for '{relative_expression}': {date_result['message']}\n"
+                "Ask the user to provide a specific date or try a different relative date expression."
+            )
+            print(f"Date parsing failed: {date_result['message']}")
+
+    else:
+        result["content"] = f"Unknown tool '{func_name}'. Answer the user without it."
+
+    return result
+
+
+# ============================================================================
+# Tool loop
+#
+# The model may request several tool calls in one step (e.g. flights and hotels
+# for the same trip); they run concurrently on a container-wide thread pool.
+# The loop stops after AGENT_MAX_STEPS completions or once AGENT_LATENCY_BUDGET_S
+# is spent; the last completion is always made without tools so the user gets
+# an answer.
+
+AGENT_MAX_STEPS = int(os.getenv("AGENT_MAX_STEPS", "3"))
+AGENT_LATENCY_BUDGET_S = float(os.getenv("AGENT_LATENCY_BUDGET_S", "25"))
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "4"))
+TOOL_RESULT_TOP_K = int(os.getenv("TOOL_RESULT_TOP_K", "5"))
+TOOL_TIMEOUT_MESSAGE = "This search did not finish in time. Tell the user and offer to try again."
 
-        elif func_name == "search_hotels":
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool")
+
+
+def _assistant_tool_call_message(content, tool_calls):
+    """The assistant message that carries tool calls, as it is sent back to the API."""
+    return {
+        "role": "assistant",
+        "content": content or None,
+        "tool_calls": [
+            {"id": call["id"], "type": "function",
+             "function": {"name": call["name"], "arguments": call["arguments"]}}
+            for call in tool_calls
+        ],
+    }
+
+
+def _execute_tool_calls(tool_calls, user_id, chat_id, conversation_history,
+                        collected_flight_ids, collected_hotel_ids, deadline):
+    """Run a step's tool calls concurrently and append their results in call order."""
+    futures = []
+    for call in tool_calls:
+        try:
+            function_arguments = json.loads(call["arguments"] or '{}')
+        except json.JSONDecodeError as e:
+            print(f"[handle_chat] Tool arguments JSON decode error: {str(e)}")
+            futures.append(None)
+            continue
+        futures.append(tool_executor.submit(_run_tool, call["name"], function_arguments, user_id, chat_id))
+
+    for call, future in zip(tool_calls, futures):
+        if future is None:
+            content = "The tool arguments were not valid JSON. Ask the user to clarify their request."
+        else:
             try:
-                lambda_response = invoke_lambda_http(
-                    "https://hwwsigfrywgdxn57ceh5c7t6my0uwzfa.lambda-url.us-east-1.on.aws/",
-                    params
-                )
+                result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                content = result["content"]
+                collected_flight_ids.extend(result["flight_ids"])
+                collected_hotel_ids.extend(result["hotel_ids"])
+            except FuturesTimeout:
+                print(f"[handle_chat] Tool {call['name']} exceeded the latency budget")
+                content = TOOL_TIMEOUT_MESSAGE
             except Exception as e:
-                print(f"[handle_chat] Error calling search_hotels lambda: {str(e)}")
-                lambda_response = {"data": [], "hotelIds": []}
-
-            lambda_response = ensure_dict(lambda_response)
-            hotel_data = lambda_response.get("data", [])
-            hotel_ids = lambda_response.get("hotelOfferIds", [])
-            collected_hotel_ids.extend(hotel_ids)
-            formatted_hotels_results = (
-                "Summarize the following hotel offers for a non-technical traveler.\n"
-                "For each option, include: hotel name, neighborhood/city, star rating if available, "
-                "check-in and check-out dates, whether breakfast/refundability is included when available, "
-                "and the total price with currency. Mention how many options were found. "
-                "Keep it friendly and conversational, remember to keep you travel agent persona and be concise.\n\n"
-                f"Hotels:\n{hotel_data}"
-            )
+                print(f"[handle_chat] Tool {call['name']} failed: {str(e)}")
+                content = f"The tool failed: {str(e)}"
+        conversation_history.append({"role": "tool", "tool_call_id": call["id"], "content": content})
+
+
+def _tools_allowed(step, deadline):
+    return step < AGENT_MAX_STEPS - 1 and time.monotonic() < deadline
+
+
+def _tool_kwargs(step, deadline):
+    """
+    Tools for this completion. They are always sent, so the cached prompt prefix
+    stays the same; when no more tool rounds are allowed the model is told not to call them.
+    """
+    if _tools_allowed(step, deadline):
+        return {"tools": toolsDescription}
+    return {"tools": toolsDescription, "tool_choice": "none"}
 
-            conversation_history.append(
-                {"role": "system", "content": formatted_hotels_results}
-                if hotel_data
-                else
-                {"role": "system", "content": "No hotel options found. Inform the user and offer to change dates or filters."}
-            )
-        
-        elif func_name == "parse_relative_date":
-            
-            relative_expression = function_arguments.get('relative_expression', '')
-            context = function_arguments.get('context', '')
-            
-            # Call our date parsing function
-            result = parse_relative_date_expression(relative_expression, context)
-        
-            if result['success']:
-                formatted_date_result = (
-                    f"Date parsing successful: '{relative_expression}' = {result['date']}\n"
-                    f"Explanation: {result['message']}\n"
-                    f"Use this date ({result['date']}) in your response and for any subsequent flight or hotel searches."
-                )
-            else:
-                formatted_date_result = (
-                    f"Date parsing failed for '{relative_expression}': {result['message']}\n"
-                    "Ask the user to provide a specific date or try a different relative date expression."
-                )
-                print(f"Date parsing failed: {result['message']}")
-            
-            conversation_history.append(
-                {"role": "system", "content": formatted_date_result}
-            )
-        
-        # ============================================================================
-        # Re-ask the model to write the final user-facing answer
-        try:
-            chat_completion = client.chat.completions.create(
-                messages=conversation_history,
-                model="gpt-4o",
-                max_tokens=1000,
-            )
-            ai_reply = chat_completion.choices[0].message
-        except Exception as e:
-            print(f"[handle_chat] Second OpenAI API call error: {str(e)}")
-            return {
-                "statusCode": 500,
-                "headers": headers,
-                "body": json.dumps({"error": f"OpenAI API error in final response: {str(e)}"})
-            }
 
-    response_content = ai_reply.content
+def _log_prompt_cache(completion):
+    cached = cached_prompt_tokens(getattr(completion, "usage", None))
+    if cached is not None:
+        print(f"[handle_chat] Prompt tokens {completion.usage.prompt_tokens}, cached {cached} (prefix {PROMPT_PREFIX_HASH})")
 
+
+def _tool_calls_from_message(message):
+    return [
+        {"id": call.id, "name": call.function.name, "arguments": call.function.arguments}
+        for call in (message.tool_calls or [])
+    ]
+
+
+def _run_agent_loop(client, conversation_history, user_id, chat_id, collected_flight_ids, collected_hotel_ids):
+    """Complete the turn, running tool calls until the model answers. Returns the reply text."""
+    deadline = time.monotonic() + AGENT_LATENCY_BUDGET_S
+    for step in range(AGENT_MAX_STEPS):
+        chat_completion = client.chat.completions.create(
+            messages=conversation_history,
+            model="gpt-4o",
+            max_tokens=1000,
+            **_tool_kwargs(step, deadline),
+        )
+        _log_prompt_cache(chat_completion)
+        ai_reply = chat_completion.choices[0].message
+        tool_calls = _tool_calls_from_message(ai_reply)
+        if not tool_calls:
+            return ai_reply.content
+
+        conversation_history.append(_assistant_tool_call_message(ai_reply.content, tool_calls))
+        _execute_tool_calls(tool_calls, user_id, chat_id, conversation_history,
+                            collected_flight_ids, collected_hotel_ids, deadline)
+    return ""
+
+
+def _save_turn(user_id, chat_id, user_prompt, response_content):
+    """Save the user prompt and the reply. Returns the items that were written."""
+    saved_items = []
     # Save user prompt
     try:
-        chat_history_table.put_item(
-            Item={
-                'user_id': user_id,
-                'timestamp': int(time.time() * 1000),
-                'role': 'user',
-                'content': user_prompt,
-                'chat_id': str(chat_id)
-            }
-        )
+        item = new_message_item(user_id, chat_id, 'user', user_prompt)
+        chat_history_table.put_item(Item=item)
+        saved_items.append(item)
     except Exception as e:
         print(f"[handle_chat] Error saving user message: {str(e)}")
         # Continue execution - this is not critical enough to fail the request
 
-    if ai_reply.content:
+    if response_content:
         # Save assistant reply
         try:
-            chat_history_table.put_item(
-                Item={
-                    'user_id': user_id,
-                    'timestamp': int(time.time() * 1000),
-                    'role': 'assistant',
-                    'content': response_content,
-                    'chat_id': str(chat_id)
-                }
-            )
+            item = new_message_item(user_id, chat_id, 'assistant', response_content)
+            chat_history_table.put_item(Item=item)
+            saved_items.append(item)
         except Exception as e:
             print(f"[handle_chat] Error saving assistant message: {str(e)}")
             # Continue execution - this is not critical enough to fail the request
 
-    # Title generation: on powers of 4 user messages (1, 4, 16, ...)
-    updated_title = ""
+    return saved_items
+
+
+def _run_summary_task(event):
+    """Summary fold task body (async self-invocation, or a background thread locally)."""
+    try:
+        folded = run_summary_task(event, openai_client(), chat_history_table, chat_summary_table)
+        if folded:
+            print(f"[handle_chat] Updated rolling summary for chat {event.get('chat_id')}")
+        return folded
+    except Exception as e:
+        print(f"[handle_chat] Error updating chat summary: {str(e)}")
+        return False
+
+
+def _schedule_summary_fold(user_id, chat_id, chat_context, saved_items):
+    """
+    Once enough messages have left the token window, fold them into the chat
+    summary in the background. Returns True if a fold was dispatched.
+    """
+    try:
+        if not fold_is_due(chat_context, saved_items):
+            return False
+        return dispatch_task(summary_task_event(user_id, chat_id), local_runner=_run_summary_task)
+    except Exception as e:
+        # Non-fatal: the messages stay in the prompt and the next turn tries again
+        print(f"[handle_chat] Error scheduling summary fold: {str(e)}")
+        return False
+
+
+def _run_title_task(event):
+    """Title task body (async self-invocation, or a background thread locally)."""
     try:
-        user_msg_count = get_user_message_count(user_id, str(chat_id))
-        def is_power_of_four(n: int) -> bool:
-            if n <= 0:
-                return False
-            while n % 4 == 0:
-                n //= 4
-            return n == 1
-
-        if is_power_of_four(user_msg_count):
-            # Use the same recent conversation context to propose a title
-            updated_title = generate_chat_title(client, conversation_history)
-            if updated_title:
-                upsert_chat_title(user_id, chat_id, updated_title)
-    except Exception:
-        # Non-fatal if title update fails
-        updated_title = ""
+        return run_title_task(event, openai_client(), chat_history_table, chat_summary_table, user_table)
+    except Exception as e:
+        print(f"[handle_chat] Error generating chat title: {str(e)}")
+        return ""
+
+
+def _schedule_chat_title(user_id, chat_id, saved_items):
+    """
+    Count the saved user message and, on powers of 4 (1, 4, 16, ...), start title
+    generation in the background. Returns True if a new title is on its way.
+    """
+    if not any(item.get('role') == 'user' for item in saved_items):
+        return False
+    try:
+        user_msg_count = increment_user_message_count(chat_summary_table, chat_history_table, user_id, chat_id)
+        if not is_power_of_four(user_msg_count):
+            return False
+        return dispatch_task(title_task_event(user_id, chat_id, user_msg_count), local_runner=_run_title_task)
+    except Exception as e:
+        # Non-fatal if the title cannot be scheduled
+        print(f"[handle_chat] Error scheduling chat title: {str(e)}")
+        return False
+
+
+def _handle_chat_request(event, context, headers):
+    client = openai_client()
+
+    if event.get("requestContext", {}).get("http", {}).get("method") == "OPTIONS":
+        return {
+            "statusCode": 200,
+            "headers": headers,
+            "body": ""
+        }
+
+    body, error_response = _parse_chat_body(event, headers)
+    if error_response:
+        return error_response
+
+    user_prompt = body.get('user_prompt')
+    user_id = body.get('user_id')
+    chat_id = body.get('chat_id')
+    user_location = body.get('user_location')  # Extract location data
+
+    conversation_history, chat_context = _build_conversation(user_id, chat_id, user_prompt, user_location, headers)
+
+    # Initialize ID collections for response
+    collected_flight_ids = []
+    collected_hotel_ids = []
+
+    # Call OpenAI with the tools; searches requested together run concurrently
+    try:
+        response_content = _run_agent_loop(client, conversation_history, user_id, chat_id,
+                                           collected_flight_ids, collected_hotel_ids)
+    except Exception as e:
+        print(f"[handle_chat] OpenAI API error: {str(e)}")
+        return {
+            "statusCode": 500,
+            "headers": headers,
+            "body": json.dumps({"error": f"OpenAI API error: {str(e)}"})
+        }
+
+    saved_items = _save_turn(user_id, chat_id, user_prompt, response_content)
+    title_pending = _schedule_chat_title(user_id, chat_id, saved_items)
+    _schedule_summary_fold(user_id, chat_id, chat_context, saved_items)
 
     return {
         "statusCode": 200,
         "headers": headers,
         "body": json.dumps({
             "ai_reply": response_content,
-            "title": updated_title,
+            # Titles are generated in the background and read back via get_user_chats
+            "title": "",
+            "title_pending": title_pending,
             "chat_id": str(chat_id),
             "flight_ids": collected_flight_ids,
             "hotel_ids": collected_hotel_ids
         })
     }
+
+
+# ============================================================================
+# Streaming mode
+#
+# A request with "stream": true gets the turn as server-sent events:
+#   event: token  data: {"text": "..."}         (assistant text, in order)
+#   event: done   data: {"ai_reply", "title", "title_pending", "chat_id", "flight_ids", "hotel_ids"}
+#   event: error  data: {"error": "..."}
+# Deployed with RESPONSE_STREAM invoke mode and streaming_runtime.py, events are
+# flushed as the model produces them (streaming_handler). On the managed runtime
+# the same events are returned as one buffered text/event-stream body.
+
+def _wants_stream(event):
+    try:
+        body = json.loads(event.get('body') or '{}')
+    except (json.JSONDecodeError, TypeError):
+        return False
+    return isinstance(body, dict) and body.get('stream') is True
+
+
+def _sse(event_name, data):
+    return f"event: {event_name}\ndata: {json.dumps(data)}\n\n"
+
+
+def _stream_headers(headers):
+    return {**headers, 'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'}
+
+
+def _stream_completion(client, conversation_history, tool_calls, **kwargs):
+    """Stream a completion, yielding text deltas and filling tool_calls with any calls the model makes."""
+    stream = client.chat.completions.create(
+        messages=conversation_history,
+        model="gpt-4o",
+        max_tokens=1000,
+        stream=True,
+        **kwargs,
+    )
+    calls_by_index = {}
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        for call_delta in (delta.tool_calls or []):
+            call = calls_by_index.setdefault(call_delta.index, {"id": None, "name": "", "arguments": ""})
+            if call_delta.id:
+                call["id"] = call_delta.id
+            if call_delta.function:
+                if call_delta.function.name:
+                    call["name"] = call_delta.function.name
+                call["arguments"] += call_delta.function.arguments or ''
+        if delta.content:
+            yield delta.content
+    tool_calls.extend(calls_by_index[index] for index in sorted(calls_by_index))
+
+
+def stream_chat_events(event):
+    """Run one chat turn and yield it as server-sent event strings."""
+    client = openai_client()
+
+    body, error_response = _parse_chat_body(event, {})
+    if error_response:
+        yield _sse("error", json.loads(error_response["body"]))
+        return
+
+    user_prompt = body.get('user_prompt')
+    user_id = body.get('user_id')
+    chat_id = body.get('chat_id')
+    user_location = body.get('user_location')
+
+    conversation_history, chat_context = _build_conversation(user_id, chat_id, user_prompt, user_location, {})
+    collected_flight_ids = []
+    collected_hotel_ids = []
+    reply_parts = []
+
+    try:
+        deadline = time.monotonic() + AGENT_LATENCY_BUDGET_S
+        for step in range(AGENT_MAX_STEPS):
+            tool_calls = []
+            step_parts = []
+            for text in _stream_completion(client, conversation_history, tool_calls, **_tool_kwargs(step, deadline)):
+                step_parts.append(text)
+                reply_parts.append(text)
+                yield _sse("token", {"text": text})
+            if not tool_calls:
+                break
+
+            conversation_history.append(_assistant_tool_call_message("".join(step_parts), tool_calls))
+            _execute_tool_calls(tool_calls, user_id, chat_id, conversation_history,
+                                collected_flight_ids, collected_hotel_ids, deadline)
+    except Exception as e:
+        print(f"[handle_chat] OpenAI streaming error: {str(e)}")
+        yield _sse("error", {"error": f"OpenAI API error: {str(e)}"})
+        return
+
+    # Persist only once the model stream has closed
+    response_content = "".join(reply_parts)
+    saved_items = _save_turn(user_id, chat_id, user_prompt, response_content)
+    title_pending = _schedule_chat_title(user_id, chat_id, saved_items)
+    _schedule_summary_fold(user_id, chat_id, chat_context, saved_items)
+
+    yield _sse("done", {
+        "ai_reply": response_content,
+        "title": "",
+        "title_pending": title_pending,
+        "chat_id": str(chat_id),
+        "flight_ids": collected_flight_ids,
+        "hotel_ids": collected_hotel_ids
+    })
+
+
+def _handle_buffered_stream_request(event, headers):
+    return {
+        "statusCode": 200,
+        "headers": _stream_headers(headers),
+        "body": "".join(stream_chat_events(event))
+    }
+
+
+@traced_handler("handle_chat")
+def streaming_handler(event, response_stream, context):
+    """Entry point for RESPONSE_STREAM invocations (see streaming_runtime.py)."""
+    headers = _cors_headers()
+    if is_title_task(event):
+        _run_title_task(event)
+        return
+    if is_summary_task(event):
+        _run_summary_task(event)
+        return
+    if event.get("requestContext", {}).get("http", {}).get("method") == "OPTIONS":
+        response_stream.start({"statusCode": 200, "headers": headers})
+        return
+
+    response_stream.start({"statusCode": 200, "headers": _stream_headers(headers)})
+    try:
+        for chunk in stream_chat_events(event):
+            response_stream.write(chunk.encode("utf-8"))
+    except Exception as e:
+        print(f"[handle_chat] Unexpected streaming error: {str(e)}")
+        response_stream.write(_sse("error", {"error": "Internal server error"}).encode("utf-8"))
+    finally:
+        wait_for_pending_writes()
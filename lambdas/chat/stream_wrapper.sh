@@ -0,0 +1,4 @@
+#!/bin/bash
+# AWS_LAMBDA_EXEC_WRAPPER for the streaming handle_chat function:
+# replace the managed Python bootstrap with the response-streaming runtime loop.
+exec python3 "${LAMBDA_TASK_ROOT}/streaming_runtime.py"
@@ -0,0 +1,158 @@
+"""
+Minimal Lambda runtime loop with response streaming, used for handle_chat's streaming mode.
+
+The managed Python runtime only returns buffered responses, so the streaming
+function is deployed with:
+  - Function URL invoke mode RESPONSE_STREAM
+  - handler = handle_chat.streaming_handler
+  - AWS_LAMBDA_EXEC_WRAPPER = /var/task/stream_wrapper.sh (starts this loop
+    instead of the managed bootstrap)
+
+The handler is called as handler(event, response_stream, context). It calls
+response_stream.start(metadata) with the HTTP status/headers and then
+response_stream.write(bytes) for every chunk; each write is sent to the
+Runtime API immediately as an HTTP chunk.
+"""
+import base64
+import http.client
+import importlib
+import json
+import os
+import sys
+import time
+import traceback
+
+RUNTIME_API = os.environ.get("AWS_LAMBDA_RUNTIME_API", "")
+API_PREFIX = "/2018-06-01/runtime"
+HTTP_INTEGRATION_CONTENT_TYPE = "application/vnd.awslambda.http-integration-response"
+PRELUDE_DELIMITER = b"\x00" * 8
+
+
+class LambdaContext:
+    def __init__(self, request_id, deadline_ms, function_arn):
+        self.aws_request_id = request_id
+        self.invoked_function_arn = function_arn
+        self.function_name = os.environ.get("AWS_LAMBDA_FUNCTION_NAME")
+        self.function_version = os.environ.get("AWS_LAMBDA_FUNCTION_VERSION")
+        self.memory_limit_in_mb = os.environ.get("AWS_LAMBDA_FUNCTION_MEMORY_SIZE")
+        self.log_group_name = os.environ.get("AWS_LAMBDA_LOG_GROUP_NAME")
+        self.log_stream_name = os.environ.get("AWS_LAMBDA_LOG_STREAM_NAME")
+        self._deadline_ms = deadline_ms
+
+    def get_remaining_time_in_millis(self):
+        return max(0, self._deadline_ms - int(time.time() * 1000))
+
+
+class HttpResponseStream:
+    """Chunked response body for one invocation, in the Function URL streaming format."""
+
+    def __init__(self, request_id):
+        self._conn = http.client.HTTPConnection(RUNTIME_API)
+        self._conn.putrequest("POST", f"{API_PREFIX}/invocation/{request_id}/response")
+        self._conn.putheader("Lambda-Runtime-Function-Response-Mode", "streaming")
+        self._conn.putheader("Transfer-Encoding", "chunked")
+        self._conn.putheader("Content-Type", HTTP_INTEGRATION_CONTENT_TYPE)
+        self._conn.putheader("Trailer", "Lambda-Runtime-Function-Error-Type, Lambda-Runtime-Function-Error-Body")
+        self._conn.endheaders()
+        self._started = False
+        self._closed = False
+
+    def start(self, metadata):
+        """Send the status code and headers. Must come before the first write."""
+        if self._started:
+            return
+        self._started = True
+        self._send_chunk(json.dumps(metadata).encode("utf-8") + PRELUDE_DELIMITER)
+
+    def write(self, data):
+        if not self._started:
+            self.start({"statusCode": 200})
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if data:
+            self._send_chunk(data)
+
+    def close(self):
+        if self._closed:
+            return
+        if not self._started:
+            self.start({"statusCode": 200})
+        self._closed = True
+        self._conn.send(b"0\r\n\r\n")
+        self._conn.getresponse().read()
+
+    def fail(self, error):
+        """End the stream with error trailers so Lambda records the invocation as failed."""
+        if self._closed:
+            return
+        self._closed = True
+        error_body = base64.b64encode(json.dumps(_error_payload(error)).encode("utf-8")).decode("ascii")
+        self._conn.send(
+            b"0\r\n"
+            + f"Lambda-Runtime-Function-Error-Type: {type(error).__name__}\r\n".encode("utf-8")
+            + f"Lambda-Runtime-Function-Error-Body: {error_body}\r\n".encode("utf-8")
+            + b"\r\n"
+        )
+        self._conn.getresponse().read()
+
+    def _send_chunk(self, data):
+        self._conn.send(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+
+
+def _error_payload(error):
+    return {
+        "errorMessage": str(error),
+        "errorType": type(error).__name__,
+        "stackTrace": traceback.format_exception(type(error), error, error.__traceback__),
+    }
+
+
+def _post(path, payload):
+    conn = http.client.HTTPConnection(RUNTIME_API)
+    conn.request("POST", f"{API_PREFIX}{path}", body=json.dumps(payload),
+                 headers={"Content-Type": "application/json"})
+    conn.getresponse().read()
+
+
+def _load_handler():
+    for path in ("/opt/python", os.environ.get("LAMBDA_TASK_ROOT", "")):
+        if path and path not in sys.path:
+            sys.path.insert(0, path)
+    module_name, function_name = os.environ["_HANDLER"].rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def main():
+    try:
+        handler = _load_handler()
+    except Exception as e:
+        _post("/init/error", _error_payload(e))
+        sys.exit(1)
+
+    while True:
+        conn = http.client.HTTPConnection(RUNTIME_API)
+        conn.request("GET", f"{API_PREFIX}/invocation/next")
+        resp = conn.getresponse()
+        event = json.loads(resp.read() or b"{}")
+        request_id = resp.getheader("Lambda-Runtime-Aws-Request-Id")
+        trace_id = resp.getheader("Lambda-Runtime-Trace-Id")
+        if trace_id:
+            os.environ["_X_AMZN_TRACE_ID"] = trace_id
+
+        context = LambdaContext(
+            request_id,
+            int(resp.getheader("Lambda-Runtime-Deadline-Ms") or 0),
+            resp.getheader("Lambda-Runtime-Invoked-Function-Arn"),
+        )
+        stream = HttpResponseStream(request_id)
+        try:
+            handler(event, stream, context)
+            stream.close()
+        except Exception as e:
+            traceback.print_exc()
+            stream.fail(e)
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
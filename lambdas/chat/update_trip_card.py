@@ -1,17 +1,33 @@
+import hashlib
 import json
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime, timezone
-import boto3
-from boto3.dynamodb.conditions import Key, Attr
-from openai import OpenAI
+from triptailor.chat_history import query_chat_messages
+from triptailor.chat_summary import CHAT_SUMMARY_TABLE, load_chat_context, split_by_token_budget
+from triptailor.clients import dynamodb_resource, openai_client
+from triptailor.latest_offers import OfferLoader
+from triptailor.prompt_cache import canonical_json
+from triptailor.tracing import traced_handler
+from triptailor.trip_card import (
+    TRIP_UPDATE_ATTEMPTS, TRIP_VERSION_ATTR, TripChanged, build_card, compact_flight, compact_hotel,
+    conditional_write, next_version, put_trip, version_condition,
+)
+from triptailor.trip_card_events import coalesce
 
 openAIKey = os.environ.get("OPENAI_API_KEY")
-dynamodb = boto3.resource("dynamodb")
+dynamodb = dynamodb_resource()
 chat_history_table = dynamodb.Table("chat-history")
 trips_table = dynamodb.Table("trip")
-flights_table = dynamodb.Table("Flights")
-hotels_table = dynamodb.Table("Hotels")
+chat_summary_table = dynamodb.Table(CHAT_SUMMARY_TABLE)
+
+# Token budget for the raw messages sent next to the rolling summary
+TRIP_CARD_TOKEN_BUDGET = int(os.environ.get("TRIP_CARD_TOKEN_BUDGET", "3000"))
+# Attributes an update without analysis writes (destinations / dates / summary stay as analyzed)
+ITEM_ATTRIBUTES = ("flight_tuples", "hotel_tuples", "card_version", "card_flights", "card_hotels")
+# "request": the HTTP call analyzes new messages itself. "stream": only stream_handler (chat-history
+# stream) runs the LLM; HTTP calls just add candidates / statuses / ID mappings.
+TRIP_CARD_ANALYSIS = os.environ.get("TRIP_CARD_ANALYSIS", "request").strip().lower()
 
 
 def _cors_headers():
@@ -39,14 +55,47 @@ def _server_error(msg: str):
     }
 
 
-def _query_chat_history(user_id: str, chat_id: str) -> List[Dict[str, Any]]:
-    """Return full conversation history for a user/chat ordered by timestamp asc."""
-    resp = chat_history_table.query(
-        KeyConditionExpression=Key("user_id").eq(user_id),
-        FilterExpression=Attr("chat_id").eq(str(chat_id)),
-        ScanIndexForward=True,
-    )
-    return resp.get("Items", [])
+def _query_chat_history(user_id: str, chat_id: str) -> Dict[str, Any]:
+    """Return the rolling summary and the messages it does not cover, ordered by timestamp asc."""
+    return load_chat_context(chat_history_table, chat_summary_table, user_id, chat_id, TRIP_CARD_TOKEN_BUDGET)
+
+
+def _analysis_input(user_id: str, chat_id: str, trip_item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    What the LLM should read for this update, or None if nothing was said
+    since the last analysis (the trip item's ``analyzed_until`` watermark).
+
+    A small delta is sent alone, next to the trip card it updates; a large
+    one (or a trip without a watermark) gets the usual summary + window and
+    no previous card, since that transcript is not limited to newer messages.
+    Returns {"messages", "summary", "previous_card", "until"}.
+    """
+    watermark = trip_item.get("analyzed_until")
+    if watermark is not None:
+        new_messages = query_chat_messages(
+            chat_history_table, user_id, chat_id, attributes=["role", "content"], after=int(watermark),
+        )
+        if not new_messages:
+            return None
+        older, _window = split_by_token_budget(new_messages, TRIP_CARD_TOKEN_BUDGET)
+        if not older:
+            previous_card = {k: trip_item.get(k) for k in ("destinations", "dates", "summary")}
+            return {"messages": new_messages, "summary": "", "previous_card": previous_card,
+                    "until": int(new_messages[-1]["timestamp"])}
+
+    chat_context = _query_chat_history(user_id, chat_id)
+    messages = chat_context["messages"]
+    if not messages and not chat_context["summary"]:
+        return None
+    until = messages[-1]["timestamp"] if messages else chat_context["covered_until"]
+    return {"messages": messages, "summary": chat_context["summary"], "previous_card": None,
+            "until": int(until) if until is not None else None}
+
+
+def _items_hash(trip_data: Dict[str, Any]) -> str:
+    """Hash of the trip's items: their [id, status] tuples and card summaries."""
+    items = {attr: trip_data.get(attr) for attr in ITEM_ATTRIBUTES}
+    return hashlib.sha256(canonical_json(items).encode("utf-8")).hexdigest()
 
 
 # Combined analysis: extract trip metadata AND decide relevance based on full history and compact items
@@ -54,9 +103,13 @@ def _analyze_history_and_decide(
     history_items: List[Dict[str, Any]],
     compact_flights: List[Dict[str, Any]],
     compact_hotels: List[Dict[str, Any]],
+    history_summary: str = "",
+    previous_card: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
     lines = []
-    for item in history_items[-60:]:
+    if history_summary:
+        lines.append(f"summary of earlier messages: {history_summary}")
+    for item in history_items:
         role = item.get("role", "assistant")
         content = (item.get("content") or "")[:2000]
         lines.append(f"{role}: {content}")
@@ -91,6 +144,16 @@ def _analyze_history_and_decide(
             "flights": compact_flights,
             "hotels": compact_hotels,
         },
+    }
+    if previous_card is not None:
+        # Delta update: the transcript only holds the messages since this card was written
+        user_payload["current_trip_card"] = previous_card
+        user_payload["update_rules"] = [
+            "The transcript only contains messages sent after current_trip_card was written",
+            "Start from current_trip_card and change only what the new messages change",
+            "Return the complete destinations, dates and summary, not just the changes",
+        ]
+    user_payload.update({
         "instructions": {
             "destinations_rules": [
                 "Exclude origin and layovers",
@@ -108,9 +171,9 @@ def _analyze_history_and_decide(
                 "Always include full date range, don't use 'around', 'sometime', etc. If the date is uncertain, omit for now.",
             ],
         },
-    }
+    })
 
-    client = OpenAI(api_key=openAIKey)
+    client = openai_client(openAIKey)
     completion = client.chat.completions.create(
         model=os.environ.get("OPENAI_MODEL", "gpt-4o"),
         messages=[
@@ -148,7 +211,8 @@ def _analyze_history_and_decide(
         "_raw": raw,
     }
 
-def _upsert_trip(user_id: str, chat_id: str, trip_data: Dict[str, Any], flights: List[str], hotels: List[str], last_modified: str):
+def _upsert_trip(user_id: str, chat_id: str, trip_data: Dict[str, Any], flights: List[str], hotels: List[str],
+                 last_modified: str, current_item: Optional[Dict[str, Any]] = None):
     item = {
         "UserAndChatID": f"{user_id}:{chat_id}",
         "last modified": last_modified,
@@ -158,161 +222,57 @@ def _upsert_trip(user_id: str, chat_id: str, trip_data: Dict[str, Any], flights:
         "flight_tuples": trip_data.get("flight_tuples", []),
         "hotel_tuples": trip_data.get("hotel_tuples", []),
     }
-    trips_table.put_item(Item=item)
-
-
-def _fetch_compact_flight(f_id: str) -> Dict[str, Any]:
-    try:
-        # Query by flightId since table has composite key (flightId + timestamp)
-        res = flights_table.query(
-            KeyConditionExpression=Key("flightId").eq(f_id),
-            ScanIndexForward=False,  # Get most recent
-            Limit=1
-        )
-        items = res.get("Items", [])
-        root = items[0] if items else {}
-        item = root.get("flightDetails", {})
-        if not item:
-            return {"id": f_id, "airline": "", "flight_number": "", "route": "", "departure": "", "arrival": "", "duration": "", "price": ""}
-
-        itinerary = (item.get("itineraries") or [{}])[0]
-        segments = itinerary.get("segments", [])
-        price_info = item.get("price", {})
-        total_price = price_info.get("total", "")
-        currency = price_info.get("currency", "")
-
-        airline = (item.get("validatingAirlineCodes") or [None])
-        airline_code = airline[0] if airline else None
-        if not airline_code and segments:
-            airline_code = segments[0].get("carrierCode")
-
-        # Flight number from first segment
-        flight_number = ""
-        if segments:
-            first_seg = segments[0]
-            flight_number = f"{first_seg.get('carrierCode','')}{first_seg.get('number','')}".strip()
-
-        # Route string: origin -> layovers -> destination
-        route_points = []
-        if segments:
-            route_points.append(segments[0].get("departure", {}).get("iataCode", ""))
-            for seg in segments:
-                arr = seg.get("arrival", {}).get("iataCode", "")
-                if arr:
-                    route_points.append(arr)
-        route = " -> ".join([p for p in route_points if p])
-
-        # Departure/arrival timestamps
-        departure_iso = segments[0].get("departure", {}).get("at", "") if segments else ""
-        arrival_iso = segments[-1].get("arrival", {}).get("at", "") if segments else ""
-
-        # Duration humanized
-        dur = itinerary.get("duration", "")
-        if dur:
-            dur = dur.replace("PT", "").replace("H", "h ").replace("M", "m").strip()
-
-        price = f"{total_price} {currency}".strip()
-
-        return {
-            "id": f_id,
-            "airline": airline_code or "",
-            "flight_number": flight_number,
-            "route": route,
-            "departure": departure_iso,
-            "arrival": arrival_iso,
-            "duration": dur,
-            "price": price,
-        }
-    except Exception:
-        return {"id": f_id, "airline": "", "flight_number": "", "route": "", "departure": "", "arrival": "", "duration": "", "price": ""}
-
-
-def _fetch_compact_hotel(h_id: str) -> Dict[str, Any]:
-    try:
-        # Query by hotelOfferId since table has composite key (hotelOfferId + timestamp)
-        res = hotels_table.query(
-            KeyConditionExpression=Key("hotelOfferId").eq(h_id),
-            ScanIndexForward=False,  # Get most recent
-            Limit=1
-        )
-        items = res.get("Items", [])
-        root = items[0] if items else {}
-        item = root.get("hotelOffersDetails", {})
-        if not item:
-            return {"id": h_id, "name": "", "location": "", "check_in": "", "check_out": "", "nights": "", "price_per_night": "", "overall_price": ""}
-
-        hotel_info = item.get("hotel", {})
-        offers = item.get("offers", [])
-        first_offer = offers[0] if offers else {}
-        price_info = first_offer.get("price", {})
-        total_price = price_info.get("total", "")
-        currency = price_info.get("currency", "")
-        check_in = first_offer.get("checkInDate", "")
-        check_out = first_offer.get("checkOutDate", "")
-
-        name = hotel_info.get("name", "")
-        address = hotel_info.get("address", {}) or {}
-        city = address.get("cityName") or hotel_info.get("cityCode", "")
-        country = address.get("countryCode", "")
-        location = ", ".join([p for p in [city, country] if p])
-
-        # Nights and per-night price
-        nights = ""
-        price_per_night = ""
-        try:
-            if check_in and check_out:
-                from datetime import date
-                d_in = date.fromisoformat(check_in)
-                d_out = date.fromisoformat(check_out)
-                delta = (d_out - d_in).days
-                if delta > 0:
-                    nights = str(delta)
-                    try:
-                        total_float = float(total_price)
-                        price_per_night = f"{round(total_float / delta, 2)} {currency}".strip()
-                    except Exception:
-                        price_per_night = ""
-        except Exception:
-            nights = ""
-
-        overall_price = f"{total_price} {currency}".strip()
-
-        return {
-            "id": h_id,
-            "name": name,
-            "location": location,
-            "check_in": check_in,
-            "check_out": check_out,
-            "nights": nights,
-            "price_per_night": price_per_night,
-            "overall_price": overall_price,
-        }
-    except Exception:
-        return {"id": h_id, "name": "", "location": "", "check_in": "", "check_out": "", "nights": "", "price_per_night": "", "overall_price": ""}
+    # Denormalized trip card (compact summaries, see triptailor.trip_card) and the analysis watermark
+    for attr in ("card_version", "card_flights", "card_hotels", "analyzed_until", "items_hash"):
+        if attr in trip_data:
+            item[attr] = trip_data[attr]
+    put_trip(trips_table, item, current_item or {})
+
+
+def _update_trip_items(user_id: str, chat_id: str, trip_data: Dict[str, Any], last_modified: str,
+                       current_item: Dict[str, Any]):
+    """Write only the items, the card and the timestamp, in one conditional UpdateItem."""
+    condition = version_condition(current_item)
+    names = dict(condition.pop("ExpressionAttributeNames", {}), **{"#lm": "last modified", "#ver": TRIP_VERSION_ATTR})
+    values = dict(condition.pop("ExpressionAttributeValues", {}),
+                  **{":now": last_modified, ":next": next_version(current_item)})
+    updates = ["#lm = :now", "#ver = :next"]
+    for attr in (*ITEM_ATTRIBUTES, "items_hash"):
+        updates.append(f"{attr} = :{attr}")
+        values[f":{attr}"] = trip_data[attr]
+    conditional_write(
+        trips_table.update_item,
+        Key={"UserAndChatID": f"{user_id}:{chat_id}"},
+        UpdateExpression="SET " + ", ".join(updates),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+        **condition,
+    )
 
 
 def _apply_llm_decisions_to_ids(initial_flight_ids: List[str], initial_hotel_ids: List[str], decisions: Dict[str, Any]):
-    # Start from the provided baseline sets (should already include candidates + existing)
-    flight_ids = {str(x) for x in (initial_flight_ids or [])}
-    hotel_ids = {str(x) for x in (initial_hotel_ids or [])}
+    # Start from the provided baseline (should already include candidates + existing); kept in order
+    # so an update that changes nothing writes the same tuples
+    flight_ids = dict.fromkeys(str(x) for x in (initial_flight_ids or []))
+    hotel_ids = dict.fromkeys(str(x) for x in (initial_hotel_ids or []))
 
     for ent in decisions.get("flight_decisions", []):
         _id = str(ent.get("id")); action = (ent.get("decision") or "").lower()
         if not _id:
             continue
         if action == "remove":
-            flight_ids.discard(_id)
+            flight_ids.pop(_id, None)
         else:  # add or keep
-            flight_ids.add(_id)
+            flight_ids.setdefault(_id)
 
     for ent in decisions.get("hotel_decisions", []):
         _id = str(ent.get("id")); action = (ent.get("decision") or "").lower()
         if not _id:
             continue
         if action == "remove":
-            hotel_ids.discard(_id)
+            hotel_ids.pop(_id, None)
         else:
-            hotel_ids.add(_id)
+            hotel_ids.setdefault(_id)
 
     return list(flight_ids), list(hotel_ids)
 
@@ -385,6 +345,230 @@ def _infer_hotel_status_from_item(item: Dict[str, Any], existing_status: str = N
     return "available" if has_offers else "unavailable"
 
 
+def _update_trip(headers, user_id: str, chat_id: str, flights, hotels, flight_statuses, hotel_statuses,
+                 flight_id_mapping, hotel_id_mapping, analyze: bool = True):
+    # Read current trip record to support add/keep/remove decisions
+    try:
+        trip_key = {"UserAndChatID": f"{user_id}:{chat_id}"}
+        current_item = trips_table.get_item(Key=trip_key).get("Item", {})
+        existing_flights_raw = current_item.get("flight_tuples") or current_item.get("flights") or []
+        existing_hotels_raw = current_item.get("hotel_tuples") or current_item.get("hotels") or []
+    except Exception:
+        current_item = {}
+        existing_flights_raw, existing_hotels_raw = [], []
+
+    # Normalize stored tuples which may be list-of-lists [[id,status],...] or list of dicts
+    def _normalize_tuples_to_dicts(items):
+        out = []
+        if not isinstance(items, list):
+            return out
+        for it in items:
+            try:
+                if isinstance(it, dict) and it.get("id") is not None:
+                    out.append({"id": str(it.get("id")), "status": str(it.get("status", "available"))})
+                elif isinstance(it, (list, tuple)) and len(it) >= 1:
+                    _id = str(it[0])
+                    _status = str(it[1]) if len(it) > 1 and it[1] is not None else "available"
+                    out.append({"id": _id, "status": _status})
+            except Exception:
+                continue
+        return out
+
+    existing_flights = _normalize_tuples_to_dicts(existing_flights_raw)
+    existing_hotels = _normalize_tuples_to_dicts(existing_hotels_raw)
+
+    # Separate existing vs new items for different handling
+    existing_f_ids = [str(x.get("id")) for x in existing_flights if isinstance(x, dict) and x.get("id")]
+    existing_h_ids = [str(x.get("id")) for x in existing_hotels if isinstance(x, dict) and x.get("id")]
+    candidate_f_ids = [str(fid) for fid in (flights or [])]
+    candidate_h_ids = [str(hid) for hid in (hotels or [])]
+
+    # Request-scoped identity map: every Flights/Hotels item is read once, in one BatchGetItem,
+    # and serves both the LLM compaction (existing items) and the status inference (all items)
+    offers = OfferLoader()
+    offers.load(existing_f_ids + candidate_f_ids, existing_h_ids + candidate_h_ids)
+
+    # Compact fetch ONLY existing items for LLM decisions (user has seen these)
+    existing_compact_flights = [compact_flight(fid, offers.flight(fid)) for fid in existing_f_ids]
+    existing_compact_hotels = [compact_hotel(hid, offers.hotel(hid)) for hid in existing_h_ids]
+
+    # The LLM only runs when messages arrived after the last analysis (the trip item's watermark)
+    try:
+        analysis = _analysis_input(user_id, chat_id, current_item) if analyze else None
+    except Exception as e:
+        return _server_error(f"Failed to read history: {str(e)}")
+
+    if analysis is None:
+        # Status / ID-mapping / candidate update: keep the analyzed trip data and every existing item
+        combined = {k: current_item.get(k) for k in ("destinations", "dates", "summary")}
+    else:
+        # LLM decides only on existing items (user has had time to give feedback)
+        combined = _analyze_history_and_decide(
+            analysis["messages"], existing_compact_flights, existing_compact_hotels, analysis["summary"],
+            previous_card=analysis["previous_card"],
+        )
+    trip_data = {k: combined.get(k) for k in ("destinations", "dates", "summary")}
+    decisions = {
+        "flight_decisions": combined.get("flight_decisions", []),
+        "hotel_decisions": combined.get("hotel_decisions", []),
+    }
+
+    # Apply LLM decisions only to existing items
+    kept_existing_f_ids, kept_existing_h_ids = _apply_llm_decisions_to_ids(existing_f_ids, existing_h_ids, decisions)
+
+    # Auto-add new candidate items (user hasn't seen them yet, so add them for user review)
+    final_f_ids = list(dict.fromkeys([*kept_existing_f_ids, *candidate_f_ids]))
+    final_h_ids = list(dict.fromkeys([*kept_existing_h_ids, *candidate_h_ids]))
+
+    # Apply ID mapping: replace original IDs with new IDs
+    if flight_id_mapping:
+        final_f_ids = [flight_id_mapping.get(fid, fid) for fid in final_f_ids]
+        # Also update existing flights list for status preservation
+        for existing_flight in existing_flights:
+            if isinstance(existing_flight, dict) and existing_flight.get("id") in flight_id_mapping:
+                old_id = existing_flight["id"]
+                new_id = flight_id_mapping[old_id]
+                existing_flight["id"] = new_id
+
+    if hotel_id_mapping:
+        final_h_ids = [hotel_id_mapping.get(hid, hid) for hid in final_h_ids]
+        # Also update existing hotels list for status preservation
+        for existing_hotel in existing_hotels:
+            if isinstance(existing_hotel, dict) and existing_hotel.get("id") in hotel_id_mapping:
+                old_id = existing_hotel["id"]
+                new_id = hotel_id_mapping[old_id]
+                existing_hotel["id"] = new_id
+
+    # Infer statuses from DB items (LLM does not decide statuses)
+    # Upgrade/override status for any item we keep, but preserve existing statuses from trip table
+    f_idx = {fid: {"id": fid, "status": "available"} for fid in final_f_ids}
+    h_idx = {hid: {"id": hid, "status": "available"} for hid in final_h_ids}
+
+    # First, preserve existing statuses from trip table (especially "booked")
+    for existing_flight in existing_flights:
+        if isinstance(existing_flight, dict) and existing_flight.get("id") in f_idx:
+            existing_status = existing_flight.get("status", "available")
+            if existing_status.lower() == "booked":
+                f_idx[existing_flight["id"]]["status"] = "booked"
+
+    for existing_hotel in existing_hotels:
+        if isinstance(existing_hotel, dict) and existing_hotel.get("id") in h_idx:
+            existing_status = existing_hotel.get("status", "available")
+            if existing_status.lower() == "booked":
+                h_idx[existing_hotel["id"]]["status"] = "booked"
+
+    # Second, apply provided statuses from the request (these override existing statuses)
+    for fid, provided_status in flight_statuses.items():
+        if fid in f_idx and provided_status:
+            f_idx[fid]["status"] = str(provided_status)
+
+    for hid, provided_status in hotel_statuses.items():
+        if hid in h_idx and provided_status:
+            h_idx[hid]["status"] = str(provided_status)
+
+    # Now infer statuses for items that don't have a status yet (using "available" as default)
+    # Skip items that already have a meaningful status
+    pending_f_ids = [fid for fid in f_idx if f_idx[fid]["status"] in ["available", "unavailable"]]
+    pending_h_ids = [hid for hid in h_idx if h_idx[hid]["status"] in ["available", "unavailable"]]
+    # Only IDs introduced by the ID mapping are not loaded yet (all final IDs are needed for the card)
+    offers.load(list(f_idx), list(h_idx))
+
+    for fid in pending_f_ids:
+        db = (offers.flight(fid) or {}).get("flightDetails", {})
+        f_idx[fid]["status"] = _infer_flight_status_from_item(db, f_idx[fid]["status"])
+
+    for hid in pending_h_ids:
+        db = (offers.hotel(hid) or {}).get("hotelOffersDetails", {})
+        h_idx[hid]["status"] = _infer_hotel_status_from_item(db, h_idx[hid]["status"])
+    print(f"[update_trip_card] Offer reads: {offers.stats()}")
+    updated_flights = list(f_idx.values())
+    updated_hotels = list(h_idx.values())
+
+    # Upsert into trips table
+    try:
+        # Store tuple lists under canonical keys
+        trip_data_to_write = dict(trip_data)
+        # Convert to list-of-lists [[id,status], ...] for DynamoDB compatibility
+        def _dicts_to_list_of_lists(items):
+            out = []
+            for it in items:
+                _id = it.get("id") if isinstance(it, dict) else None
+                if _id is None:
+                    continue
+                _status = it.get("status", "available") if isinstance(it, dict) else "available"
+                out.append([str(_id), str(_status)])
+            return out
+
+        trip_data_to_write["flight_tuples"] = _dicts_to_list_of_lists(updated_flights)
+        trip_data_to_write["hotel_tuples"] = _dicts_to_list_of_lists(updated_hotels)
+        trip_data_to_write.update(build_card(
+            {"flight": [f["id"] for f in updated_flights], "hotel": [h["id"] for h in updated_hotels]},
+            offers.get,
+        ))
+        trip_data_to_write["items_hash"] = _items_hash(trip_data_to_write)
+
+        if analysis is None and current_item.get("items_hash") == trip_data_to_write["items_hash"]:
+            # Nothing new to analyze and nothing to store (e.g. a repeated status update)
+            last_modified = current_item.get("last modified", "")
+        elif analysis is None:
+            last_modified = datetime.now(timezone.utc).isoformat()
+            _update_trip_items(user_id, chat_id, trip_data_to_write, last_modified, current_item)
+        else:
+            if analysis["until"] is not None:
+                trip_data_to_write["analyzed_until"] = analysis["until"]
+            last_modified = datetime.now(timezone.utc).isoformat()
+            _upsert_trip(user_id, chat_id, trip_data_to_write, flights, hotels, last_modified, current_item)
+    except TripChanged:
+        raise
+    except Exception as e:
+        return _server_error(f"Failed to upsert trip: {str(e)}")
+
+    return {
+        "statusCode": 200,
+        "headers": headers,
+        "body": json.dumps({
+            "success": True,
+            "UserAndChatID": f"{user_id}:{chat_id}",
+            "last_modified": last_modified,
+        }),
+    }
+
+
+def _update_with_retries(headers, user_id: str, chat_id: str, *args, **kwargs):
+    """_update_trip(), re-run from a fresh read while the trip keeps changing under it."""
+    for attempt in range(TRIP_UPDATE_ATTEMPTS):
+        try:
+            return _update_trip(headers, user_id, chat_id, *args, **kwargs)
+        except TripChanged:
+            print(f"[update_trip_card] Trip {user_id}:{chat_id} changed during the update (attempt {attempt + 1})")
+    return _server_error("Trip was modified concurrently, please retry")
+
+
+@traced_handler("update_trip_card_stream")
+def stream_handler(event, context):
+    """
+    chat-history stream consumer (DynamoDB Streams or SQS, with ReportBatchItemFailures):
+    one analysis per chat in the batch, however many messages it inserted.
+    """
+    records = event.get("Records", [])
+    chats = coalesce(records)
+    print(f"[update_trip_card] Coalesced {len(records)} records into {len(chats)} trip updates")
+    failures = []
+    for user_and_chat_id, chat in chats.items():
+        try:
+            response = _update_with_retries(_cors_headers(), chat["user_id"], chat["chat_id"],
+                                            None, None, {}, {}, {}, {})
+            failed = response["statusCode"] != 200
+        except Exception as e:
+            print(f"[update_trip_card] Stream update of {user_and_chat_id} raised: {str(e)}")
+            failed = True
+        if failed:
+            # Redelivered (and coalesced again) by the event source
+            failures.extend({"itemIdentifier": record_id} for record_id in chat["record_ids"])
+    return {"batchItemFailures": failures}
+
+
+@traced_handler("update_trip_card")
 def lambda_handler(event, context):
     headers = _cors_headers()
 
@@ -440,182 +624,8 @@ def lambda_handler(event, context):
         if not isinstance(hotel_id_mapping, dict):
             return _bad_request("hotel_id_mapping must be a dict if provided")
 
-        try:
-            history_items = _query_chat_history(user_id, chat_id)
-        except Exception as e:
-            return _server_error(f"Failed to read history: {str(e)}")
-
-        # Read current trip record to support add/keep/remove decisions
-        try:
-            trip_key = {"UserAndChatID": f"{user_id}:{chat_id}"}
-            current_item = trips_table.get_item(Key=trip_key).get("Item", {})
-            existing_flights_raw = current_item.get("flight_tuples") or current_item.get("flights") or []
-            existing_hotels_raw = current_item.get("hotel_tuples") or current_item.get("hotels") or []
-        except Exception:
-            existing_flights_raw, existing_hotels_raw = [], []
-
-        # Normalize stored tuples which may be list-of-lists [[id,status],...] or list of dicts
-        def _normalize_tuples_to_dicts(items):
-            out = []
-            if not isinstance(items, list):
-                return out
-            for it in items:
-                try:
-                    if isinstance(it, dict) and it.get("id") is not None:
-                        out.append({"id": str(it.get("id")), "status": str(it.get("status", "available"))})
-                    elif isinstance(it, (list, tuple)) and len(it) >= 1:
-                        _id = str(it[0])
-                        _status = str(it[1]) if len(it) > 1 and it[1] is not None else "available"
-                        out.append({"id": _id, "status": _status})
-                except Exception:
-                    continue
-            return out
-
-        existing_flights = _normalize_tuples_to_dicts(existing_flights_raw)
-        existing_hotels = _normalize_tuples_to_dicts(existing_hotels_raw)
-
-        # Separate existing vs new items for different handling
-        existing_f_ids = [str(x.get("id")) for x in existing_flights if isinstance(x, dict) and x.get("id")]
-        existing_h_ids = [str(x.get("id")) for x in existing_hotels if isinstance(x, dict) and x.get("id")]
-        candidate_f_ids = [str(fid) for fid in (flights or [])]
-        candidate_h_ids = [str(hid) for hid in (hotels or [])]
-        
-        # Compact fetch ONLY existing items for LLM decisions (user has seen these)
-        existing_compact_flights = [_fetch_compact_flight(fid) for fid in existing_f_ids]
-        existing_compact_hotels = [_fetch_compact_hotel(hid) for hid in existing_h_ids]
-
-        # LLM decides only on existing items (user has had time to give feedback)
-        combined = _analyze_history_and_decide(history_items, existing_compact_flights, existing_compact_hotels)
-        trip_data = {k: combined.get(k) for k in ("destinations", "dates", "summary")}
-        decisions = {
-            "flight_decisions": combined.get("flight_decisions", []),
-            "hotel_decisions": combined.get("hotel_decisions", []),
-        }
-
-        # Apply LLM decisions only to existing items
-        kept_existing_f_ids, kept_existing_h_ids = _apply_llm_decisions_to_ids(existing_f_ids, existing_h_ids, decisions)
-        
-        # Auto-add new candidate items (user hasn't seen them yet, so add them for user review)
-        final_f_ids = list({*kept_existing_f_ids, *candidate_f_ids})
-        final_h_ids = list({*kept_existing_h_ids, *candidate_h_ids})
-        
-        # Apply ID mapping: replace original IDs with new IDs
-        if flight_id_mapping:
-            final_f_ids = [flight_id_mapping.get(fid, fid) for fid in final_f_ids]
-            # Also update existing flights list for status preservation
-            for existing_flight in existing_flights:
-                if isinstance(existing_flight, dict) and existing_flight.get("id") in flight_id_mapping:
-                    old_id = existing_flight["id"]
-                    new_id = flight_id_mapping[old_id]
-                    existing_flight["id"] = new_id
-        
-        if hotel_id_mapping:
-            final_h_ids = [hotel_id_mapping.get(hid, hid) for hid in final_h_ids]
-            # Also update existing hotels list for status preservation
-            for existing_hotel in existing_hotels:
-                if isinstance(existing_hotel, dict) and existing_hotel.get("id") in hotel_id_mapping:
-                    old_id = existing_hotel["id"]
-                    new_id = hotel_id_mapping[old_id]
-                    existing_hotel["id"] = new_id
-
-        # Infer statuses from DB items (LLM does not decide statuses)
-        # Upgrade/override status for any item we keep, but preserve existing statuses from trip table
-        f_idx = {fid: {"id": fid, "status": "available"} for fid in final_f_ids}
-        h_idx = {hid: {"id": hid, "status": "available"} for hid in final_h_ids}
-        
-        # First, preserve existing statuses from trip table (especially "booked")
-        for existing_flight in existing_flights:
-            if isinstance(existing_flight, dict) and existing_flight.get("id") in f_idx:
-                existing_status = existing_flight.get("status", "available")
-                if existing_status.lower() == "booked":
-                    f_idx[existing_flight["id"]]["status"] = "booked"
-        
-        for existing_hotel in existing_hotels:
-            if isinstance(existing_hotel, dict) and existing_hotel.get("id") in h_idx:
-                existing_status = existing_hotel.get("status", "available")
-                if existing_status.lower() == "booked":
-                    h_idx[existing_hotel["id"]]["status"] = "booked"
-        
-        # Second, apply provided statuses from the request (these override existing statuses)
-        for fid, provided_status in flight_statuses.items():
-            if fid in f_idx and provided_status:
-                f_idx[fid]["status"] = str(provided_status)
-        
-        for hid, provided_status in hotel_statuses.items():
-            if hid in h_idx and provided_status:
-                h_idx[hid]["status"] = str(provided_status)
-        
-        # Now infer statuses for items that don't have a status yet (using "available" as default)
-        for fid in list(f_idx.keys()):
-            # Skip if we already have a meaningful status
-            if f_idx[fid]["status"] not in ["available", "unavailable"]:
-                continue
-                
-            try:
-                res = flights_table.query(
-                    KeyConditionExpression=Key("flightId").eq(fid),
-                    ScanIndexForward=False,
-                    Limit=1
-                )
-                items = res.get("Items", [])
-                db_root = items[0] if items else {}
-                db = db_root.get("flightDetails", {})
-                f_idx[fid]["status"] = _infer_flight_status_from_item(db, f_idx[fid]["status"])
-            except Exception:
-                pass
-        
-        for hid in list(h_idx.keys()):
-            # Skip if we already have a meaningful status
-            if h_idx[hid]["status"] not in ["available", "unavailable"]:
-                continue
-                
-            try:
-                res = hotels_table.query(
-                    KeyConditionExpression=Key("hotelOfferId").eq(hid),
-                    ScanIndexForward=False,
-                    Limit=1
-                )
-                items = res.get("Items", [])
-                db_root = items[0] if items else {}
-                db = db_root.get("hotelOffersDetails", {})
-                h_idx[hid]["status"] = _infer_hotel_status_from_item(db, h_idx[hid]["status"])
-            except Exception:
-                pass
-        updated_flights = list(f_idx.values())
-        updated_hotels = list(h_idx.values())
-
-        # Upsert into trips table
-        try:
-            # Store tuple lists under canonical keys
-            trip_data_to_write = dict(trip_data)
-            # Convert to list-of-lists [[id,status], ...] for DynamoDB compatibility
-            def _dicts_to_list_of_lists(items):
-                out = []
-                for it in items:
-                    _id = it.get("id") if isinstance(it, dict) else None
-                    if _id is None:
-                        continue
-                    _status = it.get("status", "available") if isinstance(it, dict) else "available"
-                    out.append([str(_id), str(_status)])
-                return out
-
-            trip_data_to_write["flight_tuples"] = _dicts_to_list_of_lists(updated_flights)
-            trip_data_to_write["hotel_tuples"] = _dicts_to_list_of_lists(updated_hotels)
-            last_modified = datetime.now(timezone.utc).isoformat()
-            
-            _upsert_trip(user_id, chat_id, trip_data_to_write, flights, hotels, last_modified)
-        except Exception as e:
-            return _server_error(f"Failed to upsert trip: {str(e)}")
-
-        return {
-            "statusCode": 200,
-            "headers": headers,
-            "body": json.dumps({
-                "success": True,
-                "UserAndChatID": f"{user_id}:{chat_id}",
-                "last_modified": last_modified,
-            }),
-        }
+        return _update_with_retries(headers, user_id, chat_id, flights, hotels, flight_statuses, hotel_statuses,
+                                    flight_id_mapping, hotel_id_mapping, analyze=TRIP_CARD_ANALYSIS != "stream")
     
     except Exception as e:
         # Catch any unhandled exceptions and return a proper error response
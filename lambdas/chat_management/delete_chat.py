@@ -1,64 +1,36 @@
 import json
-import boto3
 from botocore.exceptions import ClientError
 from boto3.dynamodb.conditions import Key
+from triptailor.chat_history import message_keys, query_chat_messages
+from triptailor.chat_summary import CHAT_SUMMARY_TABLE, delete_chat_summary
+from triptailor.clients import dynamodb_resource
+from triptailor.tracing import traced_handler
 
 # DynamoDB tables
-dynamodb = boto3.resource('dynamodb')
+dynamodb = dynamodb_resource()
 chat_history_table = dynamodb.Table("chat-history")
 trips_table = dynamodb.Table("trip")
 users_table = dynamodb.Table("user")
+chat_summary_table = dynamodb.Table(CHAT_SUMMARY_TABLE)
 
 def delete_chat_messages(user_id, chat_id):
     """
     Delete all messages for a specific chat from the ChatHistory table
-    Note: Partition key is userID, chatID is a regular attribute
+    Note: Messages are looked up per chat (see triptailor.chat_history) and
+    deleted by their base-table key (user_id + timestamp) in batches
     """
     try:
-        # Query to get all messages for this user
-        response = chat_history_table.query(
-            KeyConditionExpression=Key('user_id').eq(user_id)
+        messages = query_chat_messages(
+            chat_history_table, user_id, chat_id, attributes=['user_id']
         )
-        
-        messages = response.get('Items', [])
-        deleted_count = 0
-        
-        # Filter messages for the specific chat and delete them
-        for message in messages:
-            if message.get('chat_id') == chat_id:
-                try:
-                    chat_history_table.delete_item(
-                        Key={
-                            'user_id': message['user_id'],
-                            'timestamp': message['timestamp']
-                        }
-                    )
-                    deleted_count += 1
-                except ClientError as e:
-                    print(f"Error deleting message {message.get('timestamp')}: {e}")
-        
-        # Handle pagination if there are more messages
-        while 'LastEvaluatedKey' in response:
-            response = chat_history_table.query(
-                KeyConditionExpression=Key('user_id').eq(user_id),
-                ExclusiveStartKey=response['LastEvaluatedKey']
-            )
-            
-            for message in response.get('Items', []):
-                if message.get('chat_id') == chat_id:
-                    try:
-                        chat_history_table.delete_item(
-                            Key={
-                                'user_id': message['user_id'],
-                                'timestamp': message['timestamp']
-                            }
-                        )
-                        deleted_count += 1
-                    except ClientError as e:
-                        print(f"Error deleting message {message.get('timestamp')}: {e}")
-        
-        return deleted_count
-        
+
+        # batch_writer groups deletes into BatchWriteItem calls and retries unprocessed keys
+        with chat_history_table.batch_writer() as batch:
+            for key in message_keys(messages):
+                batch.delete_item(Key=key)
+
+        return len(messages)
+
     except ClientError as e:
         print(f"Error querying messages for user {user_id}: {e}")
         raise
@@ -150,6 +122,7 @@ def mark_chat_as_deleted_in_user(user_id, chat_id):
         print(f"Error updating user {user_id}: {e}")
         return False
 
+@traced_handler("delete_chat")
 def lambda_handler(event, context):
     
     # CORS headers
@@ -191,6 +164,9 @@ def lambda_handler(event, context):
         
         # Delete chat messages
         messages_deleted = delete_chat_messages(user_id, chat_id)
+
+        # Delete the rolling summary of the chat
+        delete_chat_summary(chat_summary_table, user_id, chat_id)
         
         # Delete trip data
         trips_deleted = delete_trip_data(user_id, chat_id)
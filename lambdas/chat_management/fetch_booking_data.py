@@ -1,14 +1,9 @@
 import json
-import boto3
-from boto3.dynamodb.conditions import Key, Attr
 from boto3.dynamodb.types import TypeDeserializer
-from decimal import Decimal
 from typing import List, Dict, Any, Optional
-
-# Initialize DynamoDB resource
-dynamodb = boto3.resource("dynamodb")
-flights_table = dynamodb.Table("Flights")
-hotels_table = dynamodb.Table("Hotels")
+from triptailor.json_codec import dumps
+from triptailor.latest_offers import batch_get_latest
+from triptailor.tracing import traced_handler
 
 def _cors_headers():
     return {
@@ -18,60 +13,36 @@ def _cors_headers():
         "Access-Control-Allow-Credentials": "false"
     }
 
-def convert_decimals(obj):
-    """
-    Recursively convert DynamoDB Decimal objects to int/float for JSON serialization.
-    """
-    if isinstance(obj, list):
-        return [convert_decimals(item) for item in obj]
-    elif isinstance(obj, dict):
-        return {key: convert_decimals(value) for key, value in obj.items()}
-    elif isinstance(obj, Decimal):
-        # Convert Decimal to int if it's a whole number, otherwise float
-        if obj % 1 == 0:
-            return int(obj)
-        else:
-            return float(obj)
-    else:
-        return obj
-
 def fetch_flight_details(flight_ids: List[str]) -> Dict[str, Any]:
     """
     Fetch flight details for a list of TripTailor flight IDs.
     Returns a dictionary mapping flight ID to flight details.
     """
     flight_data = {}
+    try:
+        # Newest item per ID from the latest-version projection (BatchGetItem)
+        flight_items = batch_get_latest("flight", flight_ids)
+    except Exception as e:
+        print(f"[fetch_booking_data] Error fetching flights: {str(e)}")
+        flight_items = {}
     
     for flight_id in flight_ids:
-        try:
-            # Query the Flights table using the flight ID as partition key
-            response = flights_table.query(
-                KeyConditionExpression=Key("flightId").eq(flight_id),
-                ScanIndexForward=False,  # Get most recent first
-                Limit=1
-            )
+        flight_item = flight_items.get(flight_id)
+        if flight_item:
+            flight_details = flight_item.get("flightDetails", {})
             
-            items = response.get("Items", [])
-            if items:
-                flight_item = items[0]
-                flight_details = flight_item.get("flightDetails", {})
-                
-                # Include additional metadata and convert Decimals
-                flight_data[flight_id] = convert_decimals({
-                    "tripTailorFlightId": flight_id,
-                    "flightDetails": flight_details,
-                    "status": flight_item.get("status", "unknown"),
-                    "timestamp": flight_item.get("timestamp"),
-                    "bookingTimestamp": flight_item.get("bookingTimestamp"),
-                    "departureTime": flight_item.get("departureTime")
-                })
-                
-            else:
-                print(f"[fetch_booking_data] No flight found for ID: {flight_id}")
-                flight_data[flight_id] = None
-                
-        except Exception as e:
-            print(f"[fetch_booking_data] Error fetching flight {flight_id}: {str(e)}")
+            # Include additional metadata (Decimals are handled when the response is encoded)
+            flight_data[flight_id] = {
+                "tripTailorFlightId": flight_id,
+                "flightDetails": flight_details,
+                "status": flight_item.get("status", "unknown"),
+                "timestamp": flight_item.get("timestamp"),
+                "bookingTimestamp": flight_item.get("bookingTimestamp"),
+                "departureTime": flight_item.get("departureTime")
+            }
+            
+        else:
+            print(f"[fetch_booking_data] No flight found for ID: {flight_id}")
             flight_data[flight_id] = None
     
     return flight_data
@@ -82,49 +53,42 @@ def fetch_hotel_details(hotel_ids: List[str]) -> Dict[str, Any]:
     Returns a dictionary mapping hotel ID to hotel details.
     """
     hotel_data = {}
+    try:
+        # Newest item per ID from the latest-version projection (BatchGetItem)
+        hotel_items = batch_get_latest("hotel", hotel_ids)
+    except Exception as e:
+        print(f"[fetch_booking_data] Error fetching hotels: {str(e)}")
+        hotel_items = {}
     
     for hotel_id in hotel_ids:
-        try:
-            # First try to query by hotelOfferId (for regular hotels where TripTailor ID = partition key)
-            response = hotels_table.query(
-                KeyConditionExpression=Key("hotelOfferId").eq(hotel_id),
-                ScanIndexForward=False,  # Get most recent first
-                Limit=1
-            )
-            items = response.get("Items", [])
+        hotel_item = hotel_items.get(hotel_id)
+        if hotel_item:
+            hotel_offers_details = hotel_item.get("hotelOffersDetails", {})
+            
+            # Check if this is a booked hotel (has hotelOffersDetails.booked = true)
+            is_booked = hotel_offers_details.get("booked", False)
+            
+            hotel_data_item = {
+                "tripTailorHotelId": hotel_id,
+                "hotelOffersDetails": hotel_offers_details,
+                "status": hotel_item.get("status", "available"),
+                "timestamp": hotel_item.get("timestamp"),
+                "isBooked": is_booked
+            }
             
-            if items:
-                hotel_item = items[0]
-                hotel_offers_details = hotel_item.get("hotelOffersDetails", {})
-                
-                # Check if this is a booked hotel (has hotelOffersDetails.booked = true)
-                is_booked = hotel_offers_details.get("booked", False)
-                
-                hotel_data_item = {
-                    "tripTailorHotelId": hotel_id,
-                    "hotelOffersDetails": hotel_offers_details,
-                    "status": hotel_item.get("status", "available"),
-                    "timestamp": hotel_item.get("timestamp"),
-                    "isBooked": is_booked
-                }
-                
-                # If it's a booked hotel, include additional booking information
-                if is_booked:
-                    hotel_data_item["bookingResponse"] = hotel_offers_details.get("bookingResponse", {})
-                    hotel_data_item["hotelPricingData"] = hotel_offers_details.get("hotelPricingData", {})
-                
-                # Convert Decimals before storing
-                hotel_data[hotel_id] = convert_decimals(hotel_data_item)
-                
-            else:
-                hotel_data[hotel_id] = None
-                
-        except Exception as e:
-            print(f"[fetch_booking_data] Error fetching hotel {hotel_id}: {str(e)}")
+            # If it's a booked hotel, include additional booking information
+            if is_booked:
+                hotel_data_item["bookingResponse"] = hotel_offers_details.get("bookingResponse", {})
+                hotel_data_item["hotelPricingData"] = hotel_offers_details.get("hotelPricingData", {})
+            
+            hotel_data[hotel_id] = hotel_data_item
+            
+        else:
             hotel_data[hotel_id] = None
     
     return hotel_data
 
+@traced_handler("fetch_booking_data")
 def lambda_handler(event, context):
     """
     Lambda handler to fetch booking details for flights and hotels.
@@ -188,8 +152,8 @@ def lambda_handler(event, context):
         if hotel_ids:
             hotel_data = fetch_hotel_details(hotel_ids)
         
-        # Prepare response and convert any remaining Decimals
-        response_data = convert_decimals({
+        # Prepare response (DynamoDB Decimals are written by the codec's encoder)
+        response_data = {
             "flights": flight_data,
             "hotels": hotel_data,
             "summary": {
@@ -198,12 +162,12 @@ def lambda_handler(event, context):
                 "flightsFound": len([f for f in flight_data.values() if f is not None]),
                 "hotelsFound": len([h for h in hotel_data.values() if h is not None])
             }
-        })
+        }
         
         return {
             "statusCode": 200,
             "headers": headers,
-            "body": json.dumps(response_data)
+            "body": dumps(response_data)
         }
         
     except json.JSONDecodeError:
@@ -1,12 +1,14 @@
 import json
-import boto3
 from boto3.dynamodb.conditions import Key
+from triptailor.clients import dynamodb_resource
+from triptailor.tracing import traced_handler
 
 # Initialize the DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+dynamodb = dynamodb_resource()
 table = dynamodb.Table('user')
 
 
+@traced_handler("get_user_chats")
 def lambda_handler(event, context):
     # CORS headers
     headers = {
@@ -0,0 +1,245 @@
+import argparse
+import json
+import os
+import time
+from decimal import Decimal
+from botocore.exceptions import ClientError
+from triptailor.chat_history import (
+    CHAT_HISTORY_TABLE,
+    CHAT_INDEX_NAME,
+    CHAT_KEY_ATTRIBUTE,
+    chat_key,
+)
+from triptailor.clients import dynamodb_resource
+from triptailor.tracing import traced_handler
+
+# Backfill for the per-chat key layout of chat-history (see triptailor.chat_history).
+# Every pass scans a slice of the table and sets user_chat_id on items that do not
+# have it yet. The scan position is returned (and checkpointed by the CLI), so the
+# migration can be stopped and resumed at any point; re-running is idempotent.
+
+dynamodb = dynamodb_resource()
+chat_history_table = dynamodb.Table(CHAT_HISTORY_TABLE)
+
+SCAN_PAGE_SIZE = int(os.getenv("MIGRATION_PAGE_SIZE", "200"))
+TIME_BUDGET_MARGIN_MS = 10_000
+
+
+def create_chat_index():
+    """Create the user_chat_id-timestamp GSI if it does not exist yet."""
+    description = dynamodb.meta.client.describe_table(TableName=CHAT_HISTORY_TABLE)["Table"]
+    existing = {gsi["IndexName"] for gsi in description.get("GlobalSecondaryIndexes", [])}
+    if CHAT_INDEX_NAME in existing:
+        return False
+
+    index = {
+        "Create": {
+            "IndexName": CHAT_INDEX_NAME,
+            "KeySchema": [
+                {"AttributeName": CHAT_KEY_ATTRIBUTE, "KeyType": "HASH"},
+                {"AttributeName": "timestamp", "KeyType": "RANGE"},
+            ],
+            "Projection": {"ProjectionType": "ALL"},
+        }
+    }
+    if description.get("BillingModeSummary", {}).get("BillingMode") != "PAY_PER_REQUEST":
+        throughput = description["ProvisionedThroughput"]
+        index["Create"]["ProvisionedThroughput"] = {
+            "ReadCapacityUnits": throughput["ReadCapacityUnits"],
+            "WriteCapacityUnits": throughput["WriteCapacityUnits"],
+        }
+
+    dynamodb.meta.client.update_table(
+        TableName=CHAT_HISTORY_TABLE,
+        AttributeDefinitions=[
+            {"AttributeName": CHAT_KEY_ATTRIBUTE, "AttributeType": "S"},
+            {"AttributeName": "timestamp", "AttributeType": "N"},
+        ],
+        GlobalSecondaryIndexUpdates=[index],
+    )
+    return True
+
+
+def backfill_item(item):
+    """Set user_chat_id on a single message. Returns True if the item was updated."""
+    if item.get(CHAT_KEY_ATTRIBUTE) or item.get("chat_id") is None:
+        return False
+    try:
+        chat_history_table.update_item(
+            Key={"user_id": item["user_id"], "timestamp": item["timestamp"]},
+            UpdateExpression="SET #k = :k",
+            ConditionExpression="attribute_exists(user_id) AND attribute_not_exists(#k)",
+            ExpressionAttributeNames={"#k": CHAT_KEY_ATTRIBUTE},
+            ExpressionAttributeValues={":k": chat_key(item["user_id"], item["chat_id"])},
+        )
+        return True
+    except ClientError as e:
+        # Written by a new-style writer (or deleted) in the meantime
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+
+
+def encode_start_key(key):
+    """JSON-safe copy of a LastEvaluatedKey; the numeric timestamp stays a number."""
+    if not key:
+        return None
+    encoded = {}
+    for name, value in key.items():
+        if isinstance(value, Decimal):
+            value = int(value) if value == value.to_integral_value() else float(value)
+        encoded[name] = value
+    return encoded
+
+
+def decode_start_key(key):
+    """ExclusiveStartKey from encode_start_key() output (or an older checkpoint with string numbers)."""
+    if not key:
+        return None
+    key = dict(key)
+    if key.get("timestamp") is not None:
+        key["timestamp"] = Decimal(str(key["timestamp"]))
+    return key
+
+
+def run_backfill(start_key=None, segment=0, total_segments=1, should_stop=None):
+    """
+    Backfill one scan segment starting at start_key.
+
+    Returns a dict with the counters and the next start key (None when the
+    segment is done). should_stop is polled between pages.
+    """
+    scanned = 0
+    updated = 0
+    kwargs = {
+        "ProjectionExpression": "user_id, #ts, chat_id, #k",
+        "ExpressionAttributeNames": {"#ts": "timestamp", "#k": CHAT_KEY_ATTRIBUTE},
+        "Limit": SCAN_PAGE_SIZE,
+    }
+    if total_segments > 1:
+        kwargs["Segment"] = segment
+        kwargs["TotalSegments"] = total_segments
+
+    next_key = decode_start_key(start_key)
+    while True:
+        if next_key:
+            kwargs["ExclusiveStartKey"] = next_key
+        response = chat_history_table.scan(**kwargs)
+        for item in response.get("Items", []):
+            scanned += 1
+            if backfill_item(item):
+                updated += 1
+        next_key = response.get("LastEvaluatedKey")
+        if not next_key or (should_stop and should_stop()):
+            break
+
+    return {
+        "segment": segment,
+        "total_segments": total_segments,
+        "scanned": scanned,
+        "updated": updated,
+        "next_start_key": encode_start_key(next_key),
+        "done": next_key is None,
+    }
+
+
+@traced_handler("migrate_chat_history")
+def lambda_handler(event, context):
+    """
+    Run one resumable backfill pass.
+
+    Expected input (all optional):
+    {
+        "create_index": true,
+        "start_key": {...},      # next_start_key from the previous pass
+        "segment": 0,
+        "total_segments": 1
+    }
+
+    Re-invoke with the returned next_start_key until "done" is true.
+    """
+    event = event or {}
+    index_created = False
+    if event.get("create_index"):
+        index_created = create_chat_index()
+
+    def should_stop():
+        if context is None:
+            return False
+        return context.get_remaining_time_in_millis() < TIME_BUDGET_MARGIN_MS
+
+    result = run_backfill(
+        start_key=event.get("start_key"),
+        segment=int(event.get("segment", 0)),
+        total_segments=int(event.get("total_segments", 1)),
+        should_stop=should_stop,
+    )
+    result["index_created"] = index_created
+    return result
+
+
+def _checkpoint_path(segment, total_segments):
+    """Default resume file; parallel segments each get their own."""
+    if total_segments == 1:
+        return "chat_history_backfill.json"
+    return f"chat_history_backfill.{segment}-of-{total_segments}.json"
+
+
+def _load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_checkpoint(path, state):
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill user_chat_id on chat-history items")
+    parser.add_argument("--create-index", action="store_true", help="create the per-chat GSI first")
+    parser.add_argument("--checkpoint", help="resume file (default: chat_history_backfill[.<segment>-of-<total>].json)")
+    parser.add_argument("--segment", type=int, default=0)
+    parser.add_argument("--total-segments", type=int, default=1)
+    args = parser.parse_args()
+    checkpoint = args.checkpoint or _checkpoint_path(args.segment, args.total_segments)
+
+    if args.create_index and create_chat_index():
+        print(f"Creating index {CHAT_INDEX_NAME}; new writes are indexed while it builds")
+
+    state = _load_checkpoint(checkpoint)
+    if state and (state.get("segment", 0), state.get("total_segments", 1)) != (args.segment, args.total_segments):
+        raise SystemExit(f"{checkpoint} belongs to segment {state.get('segment', 0)} of "
+                         f"{state.get('total_segments', 1)}, not {args.segment} of {args.total_segments}")
+    if state.get("done"):
+        print("Checkpoint says the backfill is already complete")
+        return
+
+    started = time.time()
+    pages = 0
+    totals = {"scanned": state.get("scanned", 0), "updated": state.get("updated", 0)}
+    start_key = state.get("next_start_key")
+    while True:
+        # One page per pass so the checkpoint is never more than a page behind
+        result = run_backfill(start_key, args.segment, args.total_segments, should_stop=lambda: True)
+        pages += 1
+        totals["scanned"] += result["scanned"]
+        totals["updated"] += result["updated"]
+        start_key = result["next_start_key"]
+        _save_checkpoint(checkpoint, {**totals, "segment": args.segment, "total_segments": args.total_segments,
+                                      "next_start_key": start_key, "done": result["done"]})
+        if pages % 10 == 0 or result["done"]:
+            print(f"pages={pages} scanned={totals['scanned']} updated={totals['updated']} "
+                  f"elapsed={time.time() - started:.1f}s")
+        if result["done"]:
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
 import json
-import boto3
-from boto3.dynamodb.conditions import Key, Attr
+from triptailor.chat_history import query_chat_messages
+from triptailor.clients import dynamodb_resource
+from triptailor.tracing import traced_handler
 
 # Initialize DynamoDB
-dynamodb = boto3.resource('dynamodb')
+dynamodb = dynamodb_resource()
 user_table = dynamodb.Table('user')
 chat_history_table = dynamodb.Table('chat-history')
 
@@ -29,18 +30,10 @@ def set_active_chat_id(new_chat_id, user_id, headers):
         }
 
 def get_chat_messages(chat_id, user_id):
-    response = chat_history_table.query(
-        KeyConditionExpression=Key('user_id').eq(user_id),
-        FilterExpression=Attr('chat_id').eq(chat_id),
-        ProjectionExpression='#c, #r',
-        ExpressionAttributeNames={
-            '#c': 'content',
-            '#r': 'role'
-        },
-        ScanIndexForward=True
-    )
-    return response.get('Items', [])
+    items = query_chat_messages(chat_history_table, user_id, chat_id, attributes=['content', 'role'])
+    return [{'content': item.get('content'), 'role': item.get('role')} for item in items]
 
+@traced_handler("set_active_chat")
 def lambda_handler(event, context):
     # CORS headers
     headers = {
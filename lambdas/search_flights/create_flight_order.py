@@ -1,77 +1,30 @@
 import json
 import time
-import os
-import boto3
 import requests
 from botocore.exceptions import ClientError
 # Attr import removed - no longer needed for trip table operations
-from decimal import Decimal
 import hashlib
-from datetime import datetime, timezone
+from triptailor.amadeus_auth import get_amadeus_token
+from triptailor.amadeus_http import amadeus_session
+from triptailor.clients import dynamodb_resource
+from triptailor.json_codec import response_json
+from triptailor.latest_offers import put_latest
+from triptailor.tracing import traced_handler
+from triptailor.trip_card import add_card_entry
+
+# Pooled keep-alive session, reused across warm invocations (rate limited and retried: triptailor.amadeus_http)
+amadeus = amadeus_session()
 
 # ========= Dynamo & Config =========
-dynamodb = boto3.resource('dynamodb')
-service_tokens_table = dynamodb.Table('ServiceTokens')
-# trips_table removed - trip updates now handled by update_trip_card lambda
+dynamodb = dynamodb_resource()
+# Trip updates are handled by update_trip_card; this lambda only adds booked flights to the card document
+trips_table = dynamodb.Table("trip")
 flights_table = dynamodb.Table("Flights")
 
-AMADEUS_TOKEN_URL = "https://test.api.amadeus.com/v1/security/oauth2/token"
 CREATE_ORDER_URL  = "https://test.api.amadeus.com/v1/booking/flight-orders"
 
-CLIENT_ID = os.environ.get("AMADEUS_CLIENT_ID")
-CLIENT_SECRET = os.environ.get("AMADEUS_CLIENT_SECRET")
-
-# ========= Token helpers =========
-def get_token_from_db():
-    try:
-        res = service_tokens_table.get_item(Key={'serviceName':'AmadeusAPI','tokenType':'flight-search'})
-        item = res.get('Item')
-        if item and item.get('id') == 'access_token' and time.time() < item['expires_at']:
-            return item['token']
-    except ClientError as e:
-        print("DynamoDB token read error:", e)
-    return None
-
-def store_token_in_db(token, expires_in):
-    try:
-        expires_at = int(time.time()) + int(expires_in) - 60
-        service_tokens_table.put_item(Item={
-            'serviceName':'AmadeusAPI',
-            'tokenType':'flight-search',
-            'id':'access_token',
-            'token':token,
-            'expires_at':expires_at
-        })
-    except ClientError as e:
-        print("DynamoDB token write error:", e)
-
-def fetch_token_from_amadeus():
-    r = requests.post(
-        AMADEUS_TOKEN_URL,
-        headers={"Content-Type":"application/x-www-form-urlencoded"},
-        data={"grant_type":"client_credentials","client_id":CLIENT_ID,"client_secret":CLIENT_SECRET}
-    )
-    r.raise_for_status()
-    return r.json()
-
-def get_token():
-    token = get_token_from_db()
-    if token:
-        return token
-    data = fetch_token_from_amadeus()
-    store_token_in_db(data['access_token'], data['expires_in'])
-    return data['access_token']
 
 # ========= Utilities =========
-def decimal_to_native(obj):
-    if isinstance(obj, list):
-        return [decimal_to_native(x) for x in obj]
-    if isinstance(obj, dict):
-        return {k: decimal_to_native(v) for k, v in obj.items()}
-    if isinstance(obj, Decimal):
-        return int(obj) if obj % 1 == 0 else float(obj)
-    return obj
-
 # Country code normalization is now handled in the UI with CountrySelector component
 
 def validate_flight_offers(flight_offers: list) -> list:
@@ -194,9 +147,9 @@ def call_create_order(token: str, payload: dict):
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json"
     }
-    r = requests.post(CREATE_ORDER_URL, headers=headers, data=json.dumps(payload))
+    r = amadeus.post(CREATE_ORDER_URL, headers=headers, data=json.dumps(payload))
     r.raise_for_status()
-    return r.json()
+    return response_json(r)  # floats as Decimal, so the offers can be saved as-is
 
 def generate_flight_id(flight_offer: dict, is_booked: bool = False) -> str:
     """
@@ -245,6 +198,7 @@ def save_flight_details(flight_details: dict):
             ConditionExpression="attribute_not_exists(flightId)",
             Item=flight_item
         )
+        put_latest("flight", flight_item)
         
         return flight_id
     except ClientError as e:
@@ -255,6 +209,7 @@ def save_flight_details(flight_details: dict):
             raise
 
 # ========= Lambda Handler =========
+@traced_handler("create_flight_order")
 def lambda_handler(event, context):
     # CORS
     headers = {
@@ -286,6 +241,7 @@ def _handle_flight_booking(event, headers):
     flight_offers_input = body.get("flightOffers")
     travelers_input = body.get("travelers")
     original_triptailor_flight_ids = body.get("originalTripTailorFlightIds", [])  # TripTailor flight IDs for mapping
+    user_and_chat_id = body.get("UserAndChatID")  # optional: trip whose card gets the booked flights
 
     # Validate input
     if not flight_offers_input:
@@ -296,7 +252,6 @@ def _handle_flight_booking(event, headers):
     try:
         # Validate and process flight offers
         flight_offers = validate_flight_offers(flight_offers_input)
-        flight_offers = [decimal_to_native(offer) for offer in flight_offers]
 
         # Normalize travelers
         travelers = normalize_travelers(travelers_input)
@@ -366,7 +321,7 @@ def _handle_flight_booking(event, headers):
             sample_traveler = payload["data"]["travelers"][0]
 
         # Call Amadeus Create Order API
-        token = get_token()
+        token = get_amadeus_token()
         order_resp = call_create_order(token, payload)
 
         # Process returned flight offers and save to database
@@ -384,6 +339,10 @@ def _handle_flight_booking(event, headers):
             if  not save_result:
                 print(f"WARNING: Flight {new_flight_id} already exists in DynamoDB")
             
+            # Put the booked flight's summary on the trip card ahead of the ID remap
+            if user_and_chat_id:
+                add_card_entry(trips_table, user_and_chat_id, "flight", new_flight_id, {"flightDetails": returned_offer})
+            
             new_flight_ids.append(new_flight_id)
             
             # Map TripTailor ID to new ID if provided
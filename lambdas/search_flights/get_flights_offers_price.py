@@ -1,110 +1,23 @@
 import json
-import time
-import boto3
 import requests
-from botocore.exceptions import ClientError
-from boto3.dynamodb.conditions import Key
-from datetime import datetime, timezone
-from decimal import Decimal
-import os
+from triptailor.amadeus_auth import get_amadeus_token
+from triptailor.amadeus_http import amadeus_session
+from triptailor.json_codec import dumps
+from triptailor.latest_offers import batch_get_latest
+from triptailor.tracing import traced_handler
+
+# Pooled keep-alive session, reused across warm invocations (rate limited and retried: triptailor.amadeus_http)
+amadeus = amadeus_session()
 
 # ======== קיימים כבר אצלך בקוד (משתמש בהם כמו שהם) ========
-CLIENT_ID = os.environ.get("AMADEUS_CLIENT_ID")
-CLIENT_SECRET = os.environ.get("AMADEUS_CLIENT_SECRET")
-TOKEN_KEY = 'access_token'
-AMADEUS_GET_TOKEN_URL = "https://test.api.amadeus.com/v1/security/oauth2/token"
 AMADEUS_FLIGHT_OFFERS_PRICE = "https://test.api.amadeus.com/v1/shopping/flight-offers/pricing"
 
-dynamodb = boto3.resource('dynamodb')
-service_tokens_table = dynamodb.Table('ServiceTokens')
-flights_table = dynamodb.Table('Flights')
-
-def get_token_from_db():
-    try:
-        response = service_tokens_table.get_item(Key={
-            'serviceName': 'AmadeusAPI',
-            'tokenType': 'flight-search'
-        })
-        item = response.get('Item')
-        if item and item.get('id') == 'access_token':
-            if time.time() < item['expires_at']:
-                return item['token']
-        return None
-    except ClientError as e:
-        print("DynamoDB error:", e)
-        return None
-
-def store_token_in_db(token, expires_in):
-    try:
-        expires_at = int(time.time()) + expires_in - 60
-        item = {
-            'serviceName': 'AmadeusAPI',
-            'tokenType': 'flight-search',
-            'id': 'access_token',
-            'token': token,
-            'expires_at': expires_at
-        }
-        service_tokens_table.put_item(Item=item)
-    except ClientError as e:
-        print("Failed to store token:", e)
-
-def get_token_from_amadeus():
-    headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    data = {
-        "grant_type": "client_credentials",
-        "client_id": CLIENT_ID,
-        "client_secret": CLIENT_SECRET
-    }
-    r = requests.post(AMADEUS_GET_TOKEN_URL, headers=headers, data=data)
-    r.raise_for_status()
-    return r.json()
-
-def get_token():
-    token = get_token_from_db()
-    if token:
-        return token
-    result = get_token_from_amadeus()
-    store_token_in_db(result['access_token'], result['expires_in'])
-    return result['access_token']
-
 # ======== עוזרים חדשים ללמבדת ה-PRICE ========
 
-def _decimal_to_native(obj):
-    """המרה רקורסיבית מ-Decimal ל-int/float כדי ש-json.dumps יעבוד נקי."""
-    if isinstance(obj, list):
-        return [_decimal_to_native(x) for x in obj]
-    if isinstance(obj, dict):
-        return {k: _decimal_to_native(v) for k, v in obj.items()}
-    if isinstance(obj, Decimal):
-        # שמירה על שלמים כ-int
-        if obj % 1 == 0:
-            return int(obj)
-        return float(obj)
-    return obj
-
-def _get_flight_offer_by_id(flight_id: str):
-    """Get flightDetails from Flights table by flightId."""
-    try:
-        # Query by partition key (flightId) and get the most recent flight (highest timestamp)
-        response = flights_table.query(
-            KeyConditionExpression=Key('flightId').eq(flight_id),
-            ScanIndexForward=False,  # Return items in descending order (newest first)
-            Limit=1  # Get only the most recent flight
-        )
-        
-        items = response.get('Items', [])
-        if not items:
-            return None
-            
-        # Get the first (most recent) item
-        item = items[0]
-        
-        # Return the flightDetails from the item
-        return item.get('flightDetails')
-        
-    except ClientError as e:
-        print(f"DynamoDB query error: {e}")
-        raise
+def _get_flight_offers_by_id(flight_ids: list) -> dict:
+    """Get flightDetails of the most recent Flights item per flightId, in one BatchGetItem."""
+    items = batch_get_latest("flight", flight_ids)
+    return {flight_id: item.get('flightDetails') for flight_id, item in items.items()}
 
 def _price_flight_offer(token: str, flight_offer: dict, include_options=None):
     """Call Amadeus Flight Offers Price API and return JSON response."""
@@ -126,7 +39,7 @@ def _price_flight_offer(token: str, flight_offer: dict, include_options=None):
         }
     }
     
-    r = requests.post(url, headers=headers, data=json.dumps(payload))
+    r = amadeus.post(url, headers=headers, data=dumps(payload))
     r.raise_for_status()
     return r.json()
 
@@ -152,7 +65,7 @@ def _price_multiple_flight_offers(token: str, flight_offers: list, include_optio
     }
 
     try:
-        r = requests.post(url, headers=headers, data=json.dumps(payload))
+        r = amadeus.post(url, headers=headers, data=dumps(payload))
 
         if r.status_code != 200:
             print(f"Error response: {r.text}")
@@ -191,6 +104,7 @@ def test_lambda_handler(event, context):
 
 # ======== ה-Handler החדש: מקבל flightId ומחזיר Price ========
 
+@traced_handler("get_flights_offers_price")
 def lambda_handler(event, context):
     # CORS
     response_headers = {
@@ -231,18 +145,16 @@ def lambda_handler(event, context):
     try:
         # Get all flight offers from database
         flight_offers = []
+        stored_offers = _get_flight_offers_by_id(flight_ids)
         for flight_id in flight_ids:
-            flight_offer = _get_flight_offer_by_id(flight_id)
+            flight_offer = stored_offers.get(flight_id)
             if not flight_offer:
                 print(f"Flight {flight_id} not found in database")
                 return {"statusCode": 404, "headers": response_headers, "body": json.dumps({"error": f"Flight {flight_id} not found"})}
             flight_offers.append(flight_offer)
 
-        # Convert Decimal types for JSON serialization
-        flight_offers = [_decimal_to_native(offer) for offer in flight_offers]
-
         # Get Amadeus token
-        token = get_token()
+        token = get_amadeus_token()
 
         # Extract include options from request
         include_options = body.get('include', [])
@@ -1,14 +1,16 @@
 import json
-import boto3
 from boto3.dynamodb.conditions import Key
 import logging
+from triptailor.clients import dynamodb_resource
+from triptailor.tracing import traced_handler
+from triptailor.trip_card import TRIP_UPDATE_ATTEMPTS, TripChanged, drop_card_entry, put_trip
 
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize DynamoDB
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+dynamodb = dynamodb_resource('us-east-1')
 trips_table = dynamodb.Table('trip')
 
 def _cors_headers():
@@ -20,6 +22,7 @@ def _cors_headers():
         "Access-Control-Allow-Credentials": "false"
     }
 
+@traced_handler("remove_flight")
 def lambda_handler(event, context):
     """
     Remove a flight from trip's flight_tuples by tripTailorFlightId
@@ -53,6 +56,62 @@ def lambda_handler(event, context):
             "body": json.dumps({"error": f"Critical lambda error: {str(e)}"})
         }
 
+def _remove_flight_once(partition_key, trip_tailor_flight_id, headers):
+    """
+    Read the trip and write it back without the flight. Returns an error
+    response, or None once the flight is removed; raises TripChanged if the
+    trip was written in between.
+    """
+    # Get the current trip item
+    trip_key = {"UserAndChatID": partition_key}
+    response = trips_table.get_item(Key=trip_key)
+    trip_item = response.get("Item")
+    
+    if not trip_item:
+        logger.warning(f"No trip found for {partition_key}")
+        return {
+            "statusCode": 404,
+            "headers": headers,
+            "body": json.dumps({"error": "Trip not found"})
+        }
+    current_flight_tuples = trip_item.get('flight_tuples', [])
+    
+    logger.info(f"Current flight_tuples: {current_flight_tuples}")
+    
+    # Find and remove the flight tuple containing the specified flight ID
+    updated_flight_tuples = []
+    flight_removed = False
+    
+    for flight_tuple in current_flight_tuples:
+        # Each flight_tuple is a list like [flight_id, status]
+        if isinstance(flight_tuple, list) and len(flight_tuple) >= 1:
+            if flight_tuple[0] == trip_tailor_flight_id:
+                # Skip this tuple (remove it)
+                flight_removed = True
+                logger.info(f"Removing flight tuple: {flight_tuple}")
+            else:
+                # Keep this tuple
+                updated_flight_tuples.append(flight_tuple)
+        else:
+            # Keep malformed tuples as-is
+            updated_flight_tuples.append(flight_tuple)
+    
+    if not flight_removed:
+        logger.warning(f"Flight {trip_tailor_flight_id} not found in flight_tuples")
+        return {
+            "statusCode": 404,
+            "headers": headers,
+            "body": json.dumps({"error": "Flight not found in trip"})
+        }
+    
+    # Update the trip item with the new flight_tuples
+    trip_item['flight_tuples'] = updated_flight_tuples
+    drop_card_entry(trip_item, "flight", trip_tailor_flight_id)
+    # Fails if update_trip_card (or another removal) wrote the trip since we read it
+    put_trip(trips_table, trip_item, trip_item)
+    logger.info(f"Updated flight_tuples: {updated_flight_tuples}")
+    return None
+
 def _handle_remove_flight(event, headers):
     """Handle the flight removal logic"""
     try:
@@ -94,54 +153,24 @@ def _handle_remove_flight(event, headers):
         # Construct partition key
         partition_key = f"{user_id}:{chat_id}"
         
-        # Get the current trip item
-        trip_key = {"UserAndChatID": partition_key}
-        response = trips_table.get_item(Key=trip_key)
-        trip_item = response.get("Item")
-        
-        if not trip_item:
-            logger.warning(f"No trip found for {partition_key}")
-            return {
-                "statusCode": 404,
-                "headers": headers,
-                "body": json.dumps({"error": "Trip not found"})
-            }
-        current_flight_tuples = trip_item.get('flight_tuples', [])
-        
-        logger.info(f"Current flight_tuples: {current_flight_tuples}")
-        
-        # Find and remove the flight tuple containing the specified flight ID
-        updated_flight_tuples = []
-        flight_removed = False
-        
-        for flight_tuple in current_flight_tuples:
-            # Each flight_tuple is a list like [flight_id, status]
-            if isinstance(flight_tuple, list) and len(flight_tuple) >= 1:
-                if flight_tuple[0] == trip_tailor_flight_id:
-                    # Skip this tuple (remove it)
-                    flight_removed = True
-                    logger.info(f"Removing flight tuple: {flight_tuple}")
-                else:
-                    # Keep this tuple
-                    updated_flight_tuples.append(flight_tuple)
-            else:
-                # Keep malformed tuples as-is
-                updated_flight_tuples.append(flight_tuple)
-        
-        if not flight_removed:
-            logger.warning(f"Flight {trip_tailor_flight_id} not found in flight_tuples")
+        for attempt in range(TRIP_UPDATE_ATTEMPTS):
+            try:
+                error_response = _remove_flight_once(partition_key, trip_tailor_flight_id, headers)
+                break
+            except TripChanged:
+                # Usually a background trip card update; re-read and apply the removal again
+                logger.warning(f"Trip {partition_key} changed while removing flight {trip_tailor_flight_id} "
+                               f"(attempt {attempt + 1})")
+        else:
             return {
-                "statusCode": 404,
+                "statusCode": 409,
                 "headers": headers,
-                "body": json.dumps({"error": "Flight not found in trip"})
+                "body": json.dumps({"error": "Trip was modified concurrently, please retry"})
             }
-        
-        # Update the trip item with the new flight_tuples
-        trip_item['flight_tuples'] = updated_flight_tuples
-        trips_table.put_item(Item=trip_item)
-        
+        if error_response:
+            return error_response
+
         logger.info(f"Successfully removed flight {trip_tailor_flight_id} from trip {partition_key}")
-        logger.info(f"Updated flight_tuples: {updated_flight_tuples}")
         
         return {
             "statusCode": 200,
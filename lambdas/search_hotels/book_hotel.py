@@ -1,75 +1,26 @@
 import json
 import time
-import os
-import boto3
-import requests
-from boto3.dynamodb.conditions import Key
-from botocore.exceptions import ClientError
 from datetime import datetime, timezone
 import hashlib
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any
+from triptailor.amadeus_auth import get_amadeus_token
+from triptailor.amadeus_http import amadeus_session
+from triptailor.clients import dynamodb_resource
+from triptailor.latest_offers import get_latest, put_latest
+from triptailor.tracing import traced_handler
+from triptailor.trip_card import add_card_entry
+
+# Pooled keep-alive session, reused across warm invocations (rate limited and retried: triptailor.amadeus_http)
+amadeus = amadeus_session()
 
 # ========= Dynamo & Config =========
-dynamodb = boto3.resource("dynamodb")
-service_tokens_table = dynamodb.Table("ServiceTokens")
+dynamodb = dynamodb_resource()
 
 # טבלאות קיימות אצלך
 hotels_table = dynamodb.Table("Hotels")     # cache + booking
 trips_table  = dynamodb.Table("trip")       # trip summary
 
-AMADEUS_TOKEN_URL = "https://test.api.amadeus.com/v1/security/oauth2/token"
 AMADEUS_HOTEL_ORDER_URL = "https://test.api.amadeus.com/v2/booking/hotel-orders"
-CLIENT_ID = os.environ.get("AMADEUS_CLIENT_ID")
-CLIENT_SECRET = os.environ.get("AMADEUS_CLIENT_SECRET")
-
-# ========= OAuth helpers =========
-def _get_token_from_db() -> Optional[str]:
-    try:
-        res = service_tokens_table.get_item(
-            Key={"serviceName": "AmadeusAPI", "tokenType": "hotel-booking"}
-        )
-        item = res.get("Item")
-        if item and item.get("id") == "access_token" and time.time() < item["expires_at"]:
-            return item["token"]
-    except ClientError as e:
-        print("DynamoDB token read error:", e)
-    return None
-
-def _store_token_in_db(token: str, expires_in: int) -> None:
-    try:
-        expires_at = int(time.time()) + int(expires_in) - 60
-        service_tokens_table.put_item(
-            Item={
-                "serviceName": "AmadeusAPI",
-                "tokenType": "hotel-booking",
-                "id": "access_token",
-                "token": token,
-                "expires_at": expires_at,
-            }
-        )
-    except ClientError as e:
-        print("DynamoDB token write error:", e)
-
-def _fetch_token_from_amadeus() -> Dict[str, Any]:
-    r = requests.post(
-        AMADEUS_TOKEN_URL,
-        headers={"Content-Type": "application/x-www-form-urlencoded"},
-        data={
-            "grant_type": "client_credentials",
-            "client_id": CLIENT_ID,
-            "client_secret": CLIENT_SECRET,
-        },
-    )
-    r.raise_for_status()
-    return r.json()
-
-def get_token() -> str:
-    tok = _get_token_from_db()
-    if tok:
-        return tok
-    data = _fetch_token_from_amadeus()
-    _store_token_in_db(data["access_token"], data["expires_in"])
-    return data["access_token"]
 
 # ========= Payload builder =========
 def build_hotel_order_payload(
@@ -204,8 +155,8 @@ def upsert_booking_into_hotels_table(
     booking_resp: Dict[str, Any],
     triptailor_hotel_id: str,
     hotel_pricing_data: Dict[str, Any] = None
-) -> str:
-    
+) -> Dict[str, Any]:
+    """Store the booking on the hotel's Hotels item (or a new one) and return the stored item."""
     data = booking_resp.get("data") or booking_resp
     booking_ref = data.get("id") or data.get("bookingId") or data.get("providerReference") or ""
     now_ms = int(time.time() * 1000)
@@ -214,23 +165,16 @@ def upsert_booking_into_hotels_table(
     # The booking response has a different structure than regular hotel search responses
     # Since the table has composite key (hotelOfferId + timestamp), we need to find the existing item first
     try:
-        # Query for existing hotel items (there might be multiple with different timestamps)
-        response = hotels_table.query(
-            KeyConditionExpression=Key("hotelOfferId").eq(triptailor_hotel_id),
-            ScanIndexForward=False,  # Get most recent first
-            Limit=1
-        )
-        
-        items = response.get("Items", [])
+        # Most recent item for this ID (there might be multiple with different timestamps)
+        existing_item = get_latest("hotel", triptailor_hotel_id)
         
-        if items:
+        if existing_item:
             # Update the most recent item
-            existing_item = items[0]
             existing_timestamp = existing_item["timestamp"]
             
             # Store the complete booking response (different structure than regular hotel offers)
             # Note: No TTL attribute for booked hotels - they should remain permanently
-            hotels_table.update_item(
+            updated = hotels_table.update_item(
                 Key={
                     "hotelOfferId": triptailor_hotel_id,
                     "timestamp": existing_timestamp  # Must include sort key!
@@ -252,7 +196,9 @@ def upsert_booking_into_hotels_table(
                     ":triptailor_id": triptailor_hotel_id,  # Store TripTailor hotel ID
                     ":resp": booking_resp,
                 },
+                ReturnValues="ALL_NEW",
             )
+            stored_item = updated["Attributes"]
         else:
             # Store complete booking response for new hotel
             # Note: No TTL attribute for booked hotels - they should remain permanently
@@ -267,12 +213,17 @@ def upsert_booking_into_hotels_table(
             }
             
             hotels_table.put_item(Item=hotel_item)
+            stored_item = hotel_item
+
+        put_latest("hotel", stored_item)
+        return stored_item
             
     except Exception as e:
         print(f"ERROR: Error updating hotel {triptailor_hotel_id}: {e}")
         raise
     
 # ========= Lambda Handler =========
+@traced_handler("book_hotel")
 def lambda_handler(event, context):
     headers = {
         "Access-Control-Allow-Origin": "*",
@@ -334,7 +285,7 @@ def _handle_hotel_booking(event, headers):
         return {"statusCode": 400, "headers": headers, "body": json.dumps({"error": "UserAndChatID is required"})}
 
     try:
-        token = get_token()
+        token = get_amadeus_token()
         
         new_hotel_ids = []
         hotel_id_mapping = {}  # originalId -> newId mapping
@@ -369,7 +320,10 @@ def _handle_hotel_booking(event, headers):
             new_hotel_id = _stable_hotel_id_for_trip(offer_id, is_booked=True)
             
             # Save hotel booking to database (similar to flight order pattern)
-            upsert_booking_into_hotels_table(order_resp, new_hotel_id, hotel_pricing_data)
+            stored_item = upsert_booking_into_hotels_table(order_resp, new_hotel_id, hotel_pricing_data)
+            
+            # Put the booked hotel's summary on the trip card ahead of the ID remap
+            add_card_entry(trips_table, user_and_chat_id, "hotel", new_hotel_id, stored_item)
             
             new_hotel_ids.append(new_hotel_id)
             
@@ -1,101 +1,36 @@
 import json
 import os
-import time
-from typing import Dict, List, Optional
-import boto3
-from boto3.dynamodb.conditions import Key
+from typing import Dict, List, Optional, Tuple
 import requests
-from botocore.exceptions import ClientError
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from triptailor.amadeus_auth import get_amadeus_token
+from triptailor.amadeus_http import amadeus_session
+from triptailor.latest_offers import batch_get_latest
+from triptailor.tracing import traced_handler
+
+# Pooled keep-alive session, reused across warm invocations (rate limited and retried: triptailor.amadeus_http)
+amadeus = amadeus_session()
 
 # ========================= Config =========================
 AMADEUS_BASE_URL = "https://test.api.amadeus.com"  # Sandbox
-OAUTH_TOKEN_URL = f"{AMADEUS_BASE_URL}/v1/security/oauth2/token"
 HOTEL_PRICING_ENDPOINT = f"{AMADEUS_BASE_URL}/v3/shopping/hotel-offers"
 HOTEL_SEARCH_ENDPOINT = f"{AMADEUS_BASE_URL}/v3/shopping/hotel-offers"
 
-HTTP_TIMEOUT_SECONDS = int(os.getenv("HTTP_TIMEOUT", "20"))
-MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "5"))  # Limit concurrent Amadeus calls
-
-# Use the same credentials pattern as other lambdas
-CLIENT_ID = os.environ.get("AMADEUS_CLIENT_ID")
-CLIENT_SECRET = os.environ.get("AMADEUS_CLIENT_SECRET")
-TOKEN_KEY = 'access_token'
-
-# DynamoDB setup
-dynamodb = boto3.resource('dynamodb')
-service_tokens_table = dynamodb.Table('ServiceTokens')
-HOTELS_TABLE = dynamodb.Table('Hotels')
-
-# ========================= Token helpers (using proven pattern) =========================
-def get_token_from_db():
-    """Get token from DynamoDB using the same pattern as other lambdas."""
-    try:
-        response = service_tokens_table.get_item(Key={
-            'serviceName': 'AmadeusAPI',
-            'tokenType': 'hotel-search'
-        })
-        item = response.get('Item')
-        if item and item.get('id') == 'access_token':
-            if time.time() < item['expires_at']:
-                return item['token']
-        return None
-    except ClientError as e:
-        print("DynamoDB error:", e)
-        return None
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "5"))  # Limit concurrent Amadeus calls (all hotels)
 
-def store_token_in_db(token, expires_in):
-    """Store token in DynamoDB using the same pattern as other lambdas."""
-    try:
-        expires_at = int(time.time()) + expires_in - 60
-        item = {
-            'serviceName': 'AmadeusAPI',
-            'tokenType': 'hotel-search',
-            'id': 'access_token',
-            'token': token,
-            'expires_at': expires_at
-        }
-        service_tokens_table.put_item(Item=item)
-    except ClientError as e:
-        print("Failed to store token:", e)
-
-def get_token_from_amadeus():
-    """Get new token from Amadeus using the same pattern as other lambdas."""
-    headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    data = {
-        "grant_type": "client_credentials",
-        "client_id": CLIENT_ID,
-        "client_secret": CLIENT_SECRET
-    }
-    r = requests.post(OAUTH_TOKEN_URL, headers=headers, data=data)
-    r.raise_for_status()
-    return r.json()
-
-def get_token():
-    """Main token function using the same pattern as other lambdas."""
-    token = get_token_from_db()
-    if token:
-        return token
-    result = get_token_from_amadeus()
-    store_token_in_db(result['access_token'], result['expires_in'])
-    return result['access_token']
+# Container-wide pool for the Amadeus calls; calls that are no longer needed finish in the background
+_pricing_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS, thread_name_prefix="hotel-pricing")
 
 # ========================= Hotel data helpers =========================
-def get_hotel_offer_details(hotel_id: str) -> Optional[Dict]:
-    """Retrieve hotel offer details from DynamoDB for a given hotel ID."""
+def get_hotel_offer_details(hotel_ids: List[str]) -> Dict[str, Dict]:
+    """Retrieve hotel offer details from DynamoDB for the given hotel IDs (one BatchGetItem)."""
     try:
-        response = HOTELS_TABLE.query(
-            KeyConditionExpression=Key("hotelOfferId").eq(hotel_id),
-            ScanIndexForward=False,
-            Limit=1
-        )
-        items = response.get("Items", [])
-        if items:
-            return items[0].get("hotelOffersDetails", {})
-        return None
+        items = batch_get_latest("hotel", hotel_ids)
     except Exception as e:
-        print(f"Error retrieving hotel details for {hotel_id}: {e}")
-    return None
+        print(f"Error retrieving hotel details for {hotel_ids}: {e}")
+        return {}
+    return {hotel_id: item.get("hotelOffersDetails", {}) for hotel_id, item in items.items()}
 
 
 def extract_offer_ids(hotel_details: Dict) -> List[str]:
@@ -144,10 +79,9 @@ def call_amadeus_hotel_search_with_self_url(self_url: str, access_token: str) ->
     try:
         headers = {"Authorization": f"Bearer {access_token}"}
         
-        response = requests.get(
+        response = amadeus.get(
             self_url, 
-            headers=headers, 
-            timeout=HTTP_TIMEOUT_SECONDS
+            headers=headers
         )
         response.raise_for_status()
         
@@ -172,10 +106,9 @@ def call_amadeus_hotel_pricing(offer_id: str, access_token: str, hotel_details:
         # The Amadeus hotel pricing API expects a GET request to the specific offer endpoint
         offer_url = f"{HOTEL_PRICING_ENDPOINT}/{offer_id}"
         
-        response = requests.get(
+        response = amadeus.get(
             offer_url, 
-            headers=headers, 
-            timeout=HTTP_TIMEOUT_SECONDS
+            headers=headers
         )
         response.raise_for_status()
         
@@ -208,139 +141,149 @@ def call_amadeus_hotel_pricing(offer_id: str, access_token: str, hotel_details:
         }
 
 
-def process_hotel_pricing_with_fallback(hotel_id: str, hotel_details: Dict, access_token: str) -> Dict:
-    """Process hotel pricing with fallback logic for all pricing failures."""
-    offer_ids = extract_offer_ids(hotel_details)
-    if not offer_ids:
+class _HotelPricing:
+    """
+    Pricing state of one hotel: its offer IDs are tried until one prices,
+    then (if all failed) the self-URL refresh runs once and its fresh offer
+    IDs are tried the same way. next_call() hands out one Amadeus call at a
+    time, so nothing is requested after the first successful offer.
+    """
+
+    def __init__(self, hotel_id: str, hotel_details: Dict):
+        self.hotel_id = hotel_id
+        self.pending = deque(extract_offer_ids(hotel_details))
+        # Hotels without offer IDs fail right away, as before (no refresh)
+        self.self_url = extract_self_url_from_hotel_details(hotel_details) if self.pending else None
+        self.in_flight = 0
+        self.used_fallback = False
+        self.price = None
+        self.error = None if self.pending else "No offer IDs found in hotel details"
+        self.calls = 0
+        self.skipped = 0  # offer IDs never requested because an earlier one priced
+
+    @property
+    def done(self) -> bool:
+        if self.price is not None:
+            return True
+        return not self.pending and not self.in_flight and not self._can_fall_back()
+
+    def _can_fall_back(self) -> bool:
+        return bool(self.self_url) and not self.used_fallback
+
+    def next_call(self) -> Optional[Tuple[str, str]]:
+        """("price", offer_id) or ("refresh", self_url), or None if nothing is due right now."""
+        if self.price is not None:
+            return None
+        if self.pending:
+            call = ("price", self.pending.popleft())
+        elif not self.in_flight and self._can_fall_back():
+            # Every offer failed: refresh the offers through the self URL, once
+            self.used_fallback = True
+            call = ("refresh", self.self_url)
+        else:
+            return None
+        self.in_flight += 1
+        self.calls += 1
+        return call
+
+    def on_result(self, kind: str, result) -> None:
+        self.in_flight -= 1
+        if self.price is not None:
+            return  # an offer already priced; late results are ignored
+        if kind == "refresh":
+            fresh_offer_ids = extract_offer_ids(result) if result else []
+            self.pending.extend(fresh_offer_ids)
+            if not fresh_offer_ids:
+                self.error = self.error or "Self URL refresh returned no offers"
+        elif result["success"]:
+            self.price = result["data"]
+            self.skipped = len(self.pending)
+            self.pending.clear()
+        else:
+            self.error = result.get("error", "Pricing failed")
+
+    def as_result(self) -> Dict:
+        if self.price is not None:
+            return {
+                "hotel_id": self.hotel_id,
+                "success": True,
+                "used_fallback": self.used_fallback,
+                "hotel_offer_price": self.price,
+            }
         return {
+            "hotel_id": self.hotel_id,
             "success": False,
-            "error": "No offer IDs found in hotel details"
-        }
-    
-    # First attempt: Try pricing with current offer IDs
-    hotel_results = []
-    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
-        future_to_offer = {
-            executor.submit(call_amadeus_hotel_pricing, offer_id, access_token, hotel_details): offer_id 
-            for offer_id in offer_ids
+            "used_fallback": self.used_fallback,
+            "hotel_offer_price": None,
+            "error": self.error or "No successful pricing results",
         }
-        
-        for future in as_completed(future_to_offer):
-            result = future.result()
-            hotel_results.append(result)
-    
-    # Check if we have ROOM TYPE INVALID errors that we can handle
-    failed_offers_with_fallback = []
-    successful_results = []
-    
-    for result in hotel_results:
-        if result["success"]:
-            successful_results.append(result)
-        elif extract_self_url_from_hotel_details(hotel_details):
-            # Try fallback for any failed offer if we have a self URL
-            failed_offers_with_fallback.append(result)
-        else:
-            # No self URL available for fallback, just add to results
-            successful_results.append(result)
-    
-    # If we have failed offers and can try fallback, attempt it
-    if failed_offers_with_fallback:
-        # Get fresh offer data using self URL
-        self_url = extract_self_url_from_hotel_details(hotel_details)
-        if self_url:
-            fresh_hotel_data = call_amadeus_hotel_search_with_self_url(self_url, access_token)
-            if fresh_hotel_data:
-                # Extract fresh offer IDs from the new data
-                fresh_offer_ids = extract_offer_ids(fresh_hotel_data)
-                if fresh_offer_ids:                    
-                    # Retry pricing with fresh offer IDs
-                    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
-                        fallback_future_to_offer = {
-                            executor.submit(call_amadeus_hotel_pricing, offer_id, access_token, fresh_hotel_data): offer_id 
-                            for offer_id in fresh_offer_ids
-                        }
-                        
-                        for future in as_completed(fallback_future_to_offer):
-                            fallback_result = future.result()
-                            if fallback_result["success"]:
-                                successful_results.append(fallback_result)
-                            else:
-                                # Even fallback failed, add to results
-                                successful_results.append(fallback_result)
-                else:
-                    # Add original failed results
-                    successful_results.extend(failed_offers_with_fallback)
-            else:
-                # Add original failed results
-                successful_results.extend(failed_offers_with_fallback)
-        else:
-            # Add original failed results
-            successful_results.extend(failed_offers_with_fallback)
-    else:
-        # No fallback needed, use original results
-        successful_results = hotel_results
-    
-    return {
-        "success": True,
-        "pricing_results": successful_results,
-        "total_offers": len(offer_ids),
-        "successful_pricing": len([r for r in successful_results if r["success"]]),
-        "fallback_attempted": len(failed_offers_with_fallback) > 0
-    }
+
+
+def _run_call(kind: str, target: str, access_token: str):
+    if kind == "refresh":
+        return call_amadeus_hotel_search_with_self_url(target, access_token)
+    return call_amadeus_hotel_pricing(target, access_token)
 
 
 def process_hotel_pricing_requests(hotel_ids: List[str]) -> List[Dict]:
-    """Process multiple hotel pricing requests in parallel."""
-    access_token = get_token()
-    results = []
-    
-    # Process hotels sequentially but offers in parallel to avoid overwhelming Amadeus
-    for hotel_id in hotel_ids:        
-        # Get hotel details from DynamoDB
-        hotel_details = get_hotel_offer_details(hotel_id)
+    """
+    Price all hotels concurrently, with at most MAX_CONCURRENT_REQUESTS Amadeus
+    calls in flight for the whole request. Calls are handed out round-robin
+    across the hotels still unpriced; a hotel stops after its first priced offer.
+    """
+    access_token = get_amadeus_token()
+
+    # Get hotel details from DynamoDB for all hotels at once
+    all_hotel_details = get_hotel_offer_details(hotel_ids)
+    hotels = []
+    results = {}
+    for hotel_id in dict.fromkeys(hotel_ids):
+        hotel_details = all_hotel_details.get(hotel_id)
         if not hotel_details:
-            results.append({
+            results[hotel_id] = {
                 "hotel_id": hotel_id,
                 "success": False,
                 "used_fallback": False,
                 "hotel_offer_price": None,
                 "error": "Hotel details not found in database"
-            })
-            continue
-        
-        # Process pricing with fallback logic
-        hotel_result = process_hotel_pricing_with_fallback(hotel_id, hotel_details, access_token)
-        
-        # Extract the first successful pricing result
-        if hotel_result["success"] and hotel_result["pricing_results"]:
-            first_pricing_result = hotel_result["pricing_results"][0]
-            if first_pricing_result["success"]:
-                results.append({
-                    "hotel_id": hotel_id,
-                    "success": True,
-                    "used_fallback": hotel_result["fallback_attempted"],
-                    "hotel_offer_price": first_pricing_result["data"]
-                })
-            else:
-                results.append({
-                    "hotel_id": hotel_id,
-                    "success": False,
-                    "used_fallback": hotel_result["fallback_attempted"],
-                    "hotel_offer_price": None,
-                    "error": first_pricing_result.get("error", "Pricing failed")
-                })
+            }
         else:
-            results.append({
-                "hotel_id": hotel_id,
-                "success": False,
-                "used_fallback": hotel_result["fallback_attempted"],
-                "hotel_offer_price": None,
-                "error": "No successful pricing results"
-            })
-    
-    return results
+            hotels.append(_HotelPricing(hotel_id, hotel_details))
+
+    in_flight = {}  # future -> (hotel, kind); includes calls of hotels that are already priced
+    turn = 0
+    while not all(hotel.done for hotel in hotels):
+        # Fill the free slots, one call per hotel per round
+        while len(in_flight) < MAX_CONCURRENT_REQUESTS:
+            candidates = [hotel for hotel in hotels[turn:] + hotels[:turn] if not hotel.done]
+            for hotel in candidates:
+                call = hotel.next_call()
+                if call:
+                    in_flight[_pricing_executor.submit(_run_call, call[0], call[1], access_token)] = (hotel, call[0])
+                    turn = (hotels.index(hotel) + 1) % len(hotels)
+                    break
+            else:
+                break
+        if not in_flight:
+            break
+        finished, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+        for future in finished:
+            hotel, kind = in_flight.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = None if kind == "refresh" else {"success": False, "error": str(e)}
+            hotel.on_result(kind, result)
+
+    for hotel in hotels:
+        results[hotel.hotel_id] = hotel.as_result()
+    skipped = sum(hotel.skipped for hotel in hotels)
+    print(f"[get_hotel_offer_price] Priced {sum(h.price is not None for h in hotels)}/{len(hotel_ids)} hotels "
+          f"with {sum(h.calls for h in hotels)} Amadeus calls ({len(in_flight)} still running, {skipped} not needed)")
+    return [results[hotel_id] for hotel_id in hotel_ids]
 
 # ========================= Lambda handler =========================
+@traced_handler("get_hotel_offer_price")
 def lambda_handler(event, context):
     # CORS
     cors_headers = {
@@ -1,92 +1,27 @@
 import json
 import os
-import time
 from typing import Dict, List, Tuple
-import boto3
 import requests
-from botocore.exceptions import ClientError
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from triptailor import amadeus_auth
+from triptailor.amadeus_http import amadeus_session
+from triptailor.tracing import traced_handler
+
+# Pooled keep-alive session, reused across warm invocations (rate limited and retried: triptailor.amadeus_http)
+amadeus = amadeus_session()
 
 # ========================= Config =========================
 AMADEUS_BASE_URL = "https://test.api.amadeus.com"  # Sandbox
-OAUTH_TOKEN_URL = f"{AMADEUS_BASE_URL}/v1/security/oauth2/token"
 HOTEL_RATINGS_ENDPOINT = f"{AMADEUS_BASE_URL}/v2/e-reputation/hotel-sentiments"
 
-HTTP_TIMEOUT_SECONDS = int(os.getenv("HTTP_TIMEOUT", "20"))
 MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "3"))  # Limit for ratings API
 MAX_HOTELS_PER_CALL = 3  # Amadeus limit for hotel ratings API
 
-# Use the same credentials pattern as other lambdas
-CLIENT_ID = os.environ.get("AMADEUS_CLIENT_ID")
-CLIENT_SECRET = os.environ.get("AMADEUS_CLIENT_SECRET")
-TOKEN_KEY = 'access_token'
-
-# DynamoDB setup
-dynamodb = boto3.resource('dynamodb')
-service_tokens_table = dynamodb.Table('ServiceTokens')
-
-# ========================= Token helpers (using proven pattern) =========================
-def get_token_from_db():
-    """Get token from DynamoDB using the same pattern as other lambdas."""
-    try:
-        response = service_tokens_table.get_item(Key={
-            'serviceName': 'AmadeusAPI',
-            'tokenType': 'hotel-search'
-        })
-        item = response.get('Item')
-        if item and item.get('id') == 'access_token':
-            if time.time() < item['expires_at']:
-                return item['token']
-        return None
-    except ClientError as e:
-        print("DynamoDB error:", e)
-        return None
-
-def store_token_in_db(token, expires_in):
-    """Store token in DynamoDB using the same pattern as other lambdas."""
-    try:
-        expires_at = time.time() + expires_in - 300  # 5 min buffer
-        service_tokens_table.put_item(Item={
-            'serviceName': 'AmadeusAPI',
-            'tokenType': 'hotel-search',
-            'id': TOKEN_KEY,
-            'token': token,
-            'expires_at': expires_at
-        })
-        return True
-    except ClientError as e:
-        print("Error storing token:", e)
-        return False
-
+# ========================= Token =========================
 def get_amadeus_token():
-    """Get Amadeus token, refresh if needed."""
-    # Try to get from DB first
-    token = get_token_from_db()
-    if token:
-        return token
-    
-    # Get new token
+    """Shared Amadeus token (triptailor.amadeus_auth), or None if it cannot be obtained."""
     try:
-        response = requests.post(
-            OAUTH_TOKEN_URL,
-            headers={'Content-Type': 'application/x-www-form-urlencoded'},
-            data={
-                'grant_type': 'client_credentials',
-                'client_id': CLIENT_ID,
-                'client_secret': CLIENT_SECRET
-            },
-            timeout=HTTP_TIMEOUT_SECONDS
-        )
-        response.raise_for_status()
-        
-        token_data = response.json()
-        token = token_data['access_token']
-        expires_in = token_data.get('expires_in', 1799)
-        
-        # Store in DB
-        store_token_in_db(token, expires_in)
-        
-        return token
+        return amadeus_auth.get_amadeus_token()
     except Exception as e:
         print(f"Error getting Amadeus token: {e}")
         return None
@@ -116,10 +51,9 @@ def call_amadeus_hotel_ratings(hotel_ids: List[str], token: str) -> Dict:
         
         # Build the full URL with query parameters
         url = f"{HOTEL_RATINGS_ENDPOINT}?hotelIds={hotel_ids_param}"
-        response = requests.get(
+        response = amadeus.get(
             url,
-            headers=headers,
-            timeout=HTTP_TIMEOUT_SECONDS
+            headers=headers
         )
         
         response.raise_for_status()        
@@ -224,6 +158,7 @@ def process_hotel_ratings_batch(hotel_batch: List[Tuple[str, str]], token: str)
         } for hotel_id, hotelId in hotel_batch]
 
 # ========================= Lambda Handler =========================
+@traced_handler("get_hotels_rating")
 def lambda_handler(event, context):
     """
     AWS Lambda handler for getting hotel ratings.
@@ -1,14 +1,16 @@
 import json
-import boto3
 from boto3.dynamodb.conditions import Key
 import logging
+from triptailor.clients import dynamodb_resource
+from triptailor.tracing import traced_handler
+from triptailor.trip_card import TRIP_UPDATE_ATTEMPTS, TripChanged, drop_card_entry, put_trip
 
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize DynamoDB
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+dynamodb = dynamodb_resource('us-east-1')
 trips_table = dynamodb.Table('trip')
 
 def _cors_headers():
@@ -20,6 +22,7 @@ def _cors_headers():
         "Access-Control-Allow-Credentials": "false"
     }
 
+@traced_handler("remove_hotel")
 def lambda_handler(event, context):
     """
     Remove a hotel from trip's hotel_tuples by tripTailorHotelId
@@ -53,6 +56,62 @@ def lambda_handler(event, context):
             "body": json.dumps({"error": f"Critical lambda error: {str(e)}"})
         }
 
+def _remove_hotel_once(partition_key, trip_tailor_hotel_id, headers):
+    """
+    Read the trip and write it back without the hotel. Returns an error
+    response, or None once the hotel is removed; raises TripChanged if the
+    trip was written in between.
+    """
+    # Get the current trip item
+    trip_key = {"UserAndChatID": partition_key}
+    response = trips_table.get_item(Key=trip_key)
+    trip_item = response.get("Item")
+    
+    if not trip_item:
+        logger.warning(f"No trip found for {partition_key}")
+        return {
+            "statusCode": 404,
+            "headers": headers,
+            "body": json.dumps({"error": "Trip not found"})
+        }
+    current_hotel_tuples = trip_item.get('hotel_tuples', [])
+    
+    logger.info(f"Current hotel_tuples: {current_hotel_tuples}")
+    
+    # Find and remove the hotel tuple containing the specified hotel ID
+    updated_hotel_tuples = []
+    hotel_removed = False
+    
+    for hotel_tuple in current_hotel_tuples:
+        # Each hotel_tuple is a list like [hotel_id, status]
+        if isinstance(hotel_tuple, list) and len(hotel_tuple) >= 1:
+            if hotel_tuple[0] == trip_tailor_hotel_id:
+                # Skip this tuple (remove it)
+                hotel_removed = True
+                logger.info(f"Removing hotel tuple: {hotel_tuple}")
+            else:
+                # Keep this tuple
+                updated_hotel_tuples.append(hotel_tuple)
+        else:
+            # Keep malformed tuples as-is
+            updated_hotel_tuples.append(hotel_tuple)
+    
+    if not hotel_removed:
+        logger.warning(f"Hotel {trip_tailor_hotel_id} not found in hotel_tuples")
+        return {
+            "statusCode": 404,
+            "headers": headers,
+            "body": json.dumps({"error": "Hotel not found in trip"})
+        }
+    
+    # Update the trip item with the new hotel_tuples
+    trip_item['hotel_tuples'] = updated_hotel_tuples
+    drop_card_entry(trip_item, "hotel", trip_tailor_hotel_id)
+    # Fails if update_trip_card (or another removal) wrote the trip since we read it
+    put_trip(trips_table, trip_item, trip_item)
+    logger.info(f"Updated hotel_tuples: {updated_hotel_tuples}")
+    return None
+
 def _handle_remove_hotel(event, headers):
     """Handle the hotel removal logic"""
     try:
@@ -94,54 +153,24 @@ def _handle_remove_hotel(event, headers):
         # Construct partition key
         partition_key = f"{user_id}:{chat_id}"
         
-        # Get the current trip item
-        trip_key = {"UserAndChatID": partition_key}
-        response = trips_table.get_item(Key=trip_key)
-        trip_item = response.get("Item")
-        
-        if not trip_item:
-            logger.warning(f"No trip found for {partition_key}")
-            return {
-                "statusCode": 404,
-                "headers": headers,
-                "body": json.dumps({"error": "Trip not found"})
-            }
-        current_hotel_tuples = trip_item.get('hotel_tuples', [])
-        
-        logger.info(f"Current hotel_tuples: {current_hotel_tuples}")
-        
-        # Find and remove the hotel tuple containing the specified hotel ID
-        updated_hotel_tuples = []
-        hotel_removed = False
-        
-        for hotel_tuple in current_hotel_tuples:
-            # Each hotel_tuple is a list like [hotel_id, status]
-            if isinstance(hotel_tuple, list) and len(hotel_tuple) >= 1:
-                if hotel_tuple[0] == trip_tailor_hotel_id:
-                    # Skip this tuple (remove it)
-                    hotel_removed = True
-                    logger.info(f"Removing hotel tuple: {hotel_tuple}")
-                else:
-                    # Keep this tuple
-                    updated_hotel_tuples.append(hotel_tuple)
-            else:
-                # Keep malformed tuples as-is
-                updated_hotel_tuples.append(hotel_tuple)
-        
-        if not hotel_removed:
-            logger.warning(f"Hotel {trip_tailor_hotel_id} not found in hotel_tuples")
+        for attempt in range(TRIP_UPDATE_ATTEMPTS):
+            try:
+                error_response = _remove_hotel_once(partition_key, trip_tailor_hotel_id, headers)
+                break
+            except TripChanged:
+                # Usually a background trip card update; re-read and apply the removal again
+                logger.warning(f"Trip {partition_key} changed while removing hotel {trip_tailor_hotel_id} "
+                               f"(attempt {attempt + 1})")
+        else:
             return {
-                "statusCode": 404,
+                "statusCode": 409,
                 "headers": headers,
-                "body": json.dumps({"error": "Hotel not found in trip"})
+                "body": json.dumps({"error": "Trip was modified concurrently, please retry"})
             }
-        
-        # Update the trip item with the new hotel_tuples
-        trip_item['hotel_tuples'] = updated_hotel_tuples
-        trips_table.put_item(Item=trip_item)
-        
+        if error_response:
+            return error_response
+
         logger.info(f"Successfully removed hotel {trip_tailor_hotel_id} from trip {partition_key}")
-        logger.info(f"Updated hotel_tuples: {updated_hotel_tuples}")
         
         return {
             "statusCode": 200,
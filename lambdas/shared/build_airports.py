@@ -0,0 +1,66 @@
+"""
+Regenerate the bundled airport table (layers/python/triptailor/data/airports.csv)
+from an OurAirports ``airports.csv`` dump (https://ourairports.com/data/).
+
+Keeps airports with an IATA code and scheduled passenger service and maps the
+OurAirports type to the size class used by triptailor.airports:
+large_airport -> large, medium_airport -> medium, anything else -> small.
+
+    python build_airports.py path/to/ourairports/airports.csv
+"""
+import argparse
+import csv
+import os
+
+OUTPUT = os.path.join(os.path.dirname(__file__), "layers", "python", "triptailor", "data", "airports.csv")
+FIELDS = ["iata", "name", "city", "country", "latitude", "longitude", "size"]
+SIZE_BY_TYPE = {"large_airport": "large", "medium_airport": "medium"}
+SIZE_RANK = {"large": 0, "medium": 1, "small": 2}
+
+
+def convert(source_path, output_path=OUTPUT, include_small=True):
+    rows = {}
+    with open(source_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            iata = (row.get("iata_code") or "").strip().upper()
+            if len(iata) != 3 or row.get("scheduled_service") != "yes":
+                continue
+            if row.get("type") in ("closed", "heliport", "balloonport"):
+                continue
+            size = SIZE_BY_TYPE.get(row.get("type"), "small")
+            if size == "small" and not include_small:
+                continue
+            current = rows.get(iata)
+            # A few codes appear on more than one field; keep the bigger one
+            if current and SIZE_RANK[current["size"]] <= SIZE_RANK[size]:
+                continue
+            rows[iata] = {
+                "iata": iata,
+                "name": row["name"].strip(),
+                "city": (row.get("municipality") or "").strip(),
+                "country": row["iso_country"].strip(),
+                "latitude": f"{float(row['latitude_deg']):.4f}",
+                "longitude": f"{float(row['longitude_deg']):.4f}",
+                "size": size,
+            }
+
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for iata in sorted(rows):
+            writer.writerow(rows[iata])
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the bundled airport table from OurAirports data")
+    parser.add_argument("source", help="OurAirports airports.csv")
+    parser.add_argument("--output", default=OUTPUT)
+    parser.add_argument("--no-small", action="store_true", help="drop small airports")
+    args = parser.parse_args()
+    count = convert(args.source, args.output, include_small=not args.no_small)
+    print(f"Wrote {count} airports to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
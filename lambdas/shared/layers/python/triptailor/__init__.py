@@ -0,0 +1,5 @@
+"""Shared helpers for the TripTailor lambdas.
+
+This package is deployed as its own Lambda layer (``lambdas/shared/layers``)
+and attached to every function next to the per-group dependency layer.
+"""
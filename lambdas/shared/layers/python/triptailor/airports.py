@@ -0,0 +1,205 @@
+"""Nearest-airport lookup over the bundled airport table (data/airports.csv).
+
+The table is loaded and indexed once per container (on first use) into a
+k-d tree over unit vectors on the sphere. Straight-line (chord) distance
+between unit vectors grows with the great-circle distance, so nearest
+neighbours in the tree are the nearest airports on the globe, with no
+special cases near the poles or the antimeridian. Reported distances are
+haversine kilometres.
+
+The bundled CSV holds the commercially relevant airports (IATA code,
+scheduled service, size class ``large`` / ``medium`` / ``small``).
+Regenerate it from the OurAirports dump with ``lambdas/shared/build_airports.py``;
+the index is built in O(n log n) and answers k-nearest queries in
+O(log n), so the full ~10k-airport set works the same way.
+"""
+import csv
+import heapq
+import math
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+AIRPORTS_CSV = os.path.join(os.path.dirname(__file__), "data", "airports.csv")
+EARTH_RADIUS_KM = 6371.0088
+COMMERCIAL_SIZES = ("large", "medium")
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    phi, lmb = math.radians(lat), math.radians(lon)
+    cos_phi = math.cos(phi)
+    return (cos_phi * math.cos(lmb), cos_phi * math.sin(lmb), math.sin(phi))
+
+
+def _chord_for_km(km: float) -> float:
+    """Chord length between unit vectors that are ``km`` apart on the surface."""
+    return 2 * math.sin(min(math.pi, km / EARTH_RADIUS_KM) / 2)
+
+
+class AirportIndex:
+    """Static 3-d tree over airport unit vectors."""
+
+    def __init__(self, airports: Sequence[Dict[str, Any]]):
+        self.airports = list(airports)
+        self._points = [_unit_vector(a["latitude"], a["longitude"]) for a in self.airports]
+        # Flat node arrays: point index, split axis, left child, right child (-1 = none)
+        self._node_point: List[int] = []
+        self._node_axis: List[int] = []
+        self._left: List[int] = []
+        self._right: List[int] = []
+        self._root = self._build(list(range(len(self.airports))), 0)
+
+    def __len__(self):
+        return len(self.airports)
+
+    def _build(self, indices: List[int], depth: int) -> int:
+        if not indices:
+            return -1
+        axis = depth % 3
+        indices.sort(key=lambda i: self._points[i][axis])
+        mid = len(indices) // 2
+        node = len(self._node_point)
+        self._node_point.append(indices[mid])
+        self._node_axis.append(axis)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._left[node] = self._build(indices[:mid], depth + 1)
+        self._right[node] = self._build(indices[mid + 1:], depth + 1)
+        return node
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int = 1,
+        max_km: Optional[float] = None,
+        sizes: Optional[Sequence[str]] = COMMERCIAL_SIZES,
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Return up to ``k`` (airport, distance_km) pairs, nearest first.
+
+        ``sizes`` limits the result to those size classes (None = any) and
+        ``max_km`` drops airports farther than that.
+        """
+        if k <= 0 or self._root < 0:
+            return []
+        target = _unit_vector(latitude, longitude)
+        wanted = set(sizes) if sizes else None
+        bound_sq = _chord_for_km(max_km) ** 2 if max_km is not None else float("inf")
+        best: List[Tuple[float, int]] = []  # max-heap of (-dist_sq, point)
+
+        # Entries are (node, lower bound of dist_sq for its subtree)
+        stack = [(self._root, 0.0)]
+        while stack:
+            node, min_sq = stack.pop()
+            limit = -best[0][0] if len(best) == k else bound_sq
+            if node < 0 or min_sq > limit:
+                continue
+            point = self._node_point[node]
+            p = self._points[point]
+            dist_sq = (p[0] - target[0]) ** 2 + (p[1] - target[1]) ** 2 + (p[2] - target[2]) ** 2
+            if dist_sq <= limit and (wanted is None or self.airports[point]["size"] in wanted):
+                if len(best) == k:
+                    heapq.heapreplace(best, (-dist_sq, point))
+                else:
+                    heapq.heappush(best, (-dist_sq, point))
+
+            axis = self._node_axis[node]
+            diff = target[axis] - p[axis]
+            near, far = (self._left[node], self._right[node]) if diff < 0 else (self._right[node], self._left[node])
+            # Far side first so the near side is searched first (stack is LIFO)
+            stack.append((far, diff * diff))
+            stack.append((near, min_sq))
+
+        results = []
+        for _neg_dist, point in sorted(best, reverse=True):
+            airport = self.airports[point]
+            distance = haversine_km(latitude, longitude, airport["latitude"], airport["longitude"])
+            results.append((airport, distance))
+        return results
+
+
+def load_airports(path: str = AIRPORTS_CSV) -> List[Dict[str, Any]]:
+    airports = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            airports.append({
+                "code": row["iata"],
+                "name": row["name"],
+                "city": row["city"],
+                "country": row["country"],
+                "latitude": float(row["latitude"]),
+                "longitude": float(row["longitude"]),
+                "size": row["size"],
+            })
+    return airports
+
+
+_index: Optional[AirportIndex] = None
+_index_lock = threading.Lock()
+
+
+def airport_index() -> AirportIndex:
+    """The container-wide index, built from the bundled CSV on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = AirportIndex(load_airports())
+    return _index
+
+
+def nearest_airports(latitude: float, longitude: float, k: int = 1, max_km: Optional[float] = None,
+                     sizes: Optional[Sequence[str]] = COMMERCIAL_SIZES) -> List[Tuple[Dict[str, Any], float]]:
+    return airport_index().nearest(latitude, longitude, k=k, max_km=max_km, sizes=sizes)
+
+
+# Coarse travel regions, used in the chat's location prompt
+_COUNTRY_REGIONS = {
+    "Canada": ["CA"],
+    "Mexico": ["MX"],
+    "Central America": ["GT", "SV", "HN", "NI", "CR", "PA", "BZ"],
+    "Caribbean": ["PR", "CU", "BS", "JM", "DO", "HT", "AW", "CW", "SX", "BB", "TT", "GP", "MQ", "KY", "TC", "VI", "VG",
+                  "LC", "AG", "GD", "VC", "DM", "KN", "BQ", "BL", "MF", "AI", "MS", "BM"],
+    "South America": ["CO", "VE", "EC", "PE", "BO", "CL", "AR", "UY", "PY", "BR", "GY", "SR", "GF", "FK"],
+    "Europe": ["GB", "IE", "FR", "NL", "BE", "LU", "DE", "CH", "AT", "DK", "SE", "NO", "FI", "IS", "EE", "LV", "LT",
+               "PL", "CZ", "HU", "SK", "SI", "HR", "RS", "BA", "ME", "AL", "MK", "RO", "BG", "MD", "UA", "BY", "ES",
+               "PT", "IT", "MT", "GR", "CY", "TR", "RU", "MC", "AD", "SM", "LI", "XK", "FO", "GI", "IM", "JE", "GG"],
+    "Caucasus": ["GE", "AM", "AZ"],
+    "Middle East": ["IL", "PS", "JO", "LB", "SY", "EG", "AE", "QA", "BH", "KW", "OM", "SA", "YE", "IR", "IQ"],
+    "North Africa": ["MA", "DZ", "TN", "LY", "SD", "EH"],
+    "Africa": ["ET", "KE", "TZ", "UG", "RW", "BI", "NG", "GH", "SN", "CI", "ZA", "NA", "ZW", "ZM", "BW", "MZ", "MW",
+               "AO", "CM", "CD", "CG", "GA", "ML", "BF", "NE", "TD", "GM", "GN", "SL", "LR", "TG", "BJ", "MR", "DJ",
+               "ER", "SO", "SS", "LS", "SZ", "CV", "ST", "GQ", "CF", "MU", "SC", "MG", "RE", "YT", "KM"],
+    "Asia": ["IN", "LK", "MV", "NP", "BD", "PK", "BT", "AF", "UZ", "KZ", "KG", "TJ", "TM", "TH", "VN", "KH", "LA",
+             "MM", "MY", "SG", "ID", "PH", "BN", "TL", "HK", "MO", "TW", "CN", "MN", "KR", "KP", "JP"],
+    "Oceania": ["AU", "NZ", "FJ", "PF", "NC", "GU", "WS", "TO", "CK", "VU", "SB", "PG", "MP", "PW", "FM", "MH", "KI",
+                "TV", "NR", "AS", "WF", "NU"],
+}
+COUNTRY_REGION = {country: region for region, countries in _COUNTRY_REGIONS.items() for country in countries}
+
+
+def region_for(airport: Dict[str, Any]) -> str:
+    """Region label for an airport; US airports are split the way travellers talk about them."""
+    country = airport.get("country")
+    if country != "US":
+        return COUNTRY_REGION.get(country, "Unknown")
+    lat, lon = airport["latitude"], airport["longitude"]
+    if lon < -130:
+        return "US Alaska/Hawaii"
+    if lon <= -116:
+        return "US West Coast"
+    if lon <= -102:
+        return "US Mountain West"
+    if lon <= -82:
+        return "US Midwest" if lat >= 37 else "US South"
+    return "US East Coast"
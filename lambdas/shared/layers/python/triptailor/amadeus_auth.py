@@ -0,0 +1,202 @@
+"""
+Amadeus OAuth token manager shared by every lambda that calls Amadeus.
+
+All lambdas use the same client credentials, so they share one token record
+in ServiceTokens (serviceName "AmadeusAPI", tokenType AMADEUS_TOKEN_TYPE).
+
+  - The token is held in memory for the life of the container and handed out
+    without a DynamoDB read until TOKEN_REFRESH_MARGIN seconds before it
+    expires.
+  - Inside the margin it is refreshed proactively. Only the caller holding
+    the refresh lease (a conditional write of leaseOwner / leaseUntil on the
+    token record) calls the OAuth endpoint. Everyone else keeps using the
+    old token while it is still valid, or polls the record for up to
+    TOKEN_LEASE_WAIT seconds for the new one, and only then fetches a token
+    itself.
+  - Within a container, one thread refreshes while the others wait on a lock.
+
+token_stats() returns the container's counters (memory/table hits,
+refreshes, lease contention, waits); refreshes and lease contention are also
+recorded as tracing spans.
+"""
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+from triptailor.clients import dynamodb_resource, http_session
+from triptailor.tracing import record_span, span
+
+AMADEUS_TOKEN_URL = "https://test.api.amadeus.com/v1/security/oauth2/token"
+AMADEUS_TOKEN_TYPE = os.environ.get("AMADEUS_TOKEN_TYPE", "client-credentials")
+SERVICE_NAME = "AmadeusAPI"
+TOKEN_REFRESH_MARGIN = int(os.environ.get("TOKEN_REFRESH_MARGIN", "300"))
+TOKEN_LEASE_SECONDS = int(os.environ.get("TOKEN_LEASE_SECONDS", "15"))
+TOKEN_LEASE_WAIT = float(os.environ.get("TOKEN_LEASE_WAIT", "5"))
+TOKEN_POLL_INTERVAL = 0.25
+TOKEN_HTTP_TIMEOUT = 10
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+class AmadeusTokenManager:
+    def __init__(self, token_type: str = AMADEUS_TOKEN_TYPE, table_name: str = "ServiceTokens"):
+        self.token_type = token_type
+        self.table_name = table_name
+        self.owner = uuid.uuid4().hex
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0, "table_hits": 0, "refreshes": 0,
+            "lease_acquired": 0, "lease_contention": 0, "lease_waits": 0, "unleased_fetches": 0,
+        }
+
+    def get_token(self) -> str:
+        """A valid access token; raises requests.HTTPError if Amadeus refuses the credentials."""
+        token = self._fresh_in_memory()
+        if token:
+            return token
+        with self._lock:
+            token = self._fresh_in_memory()
+            if token:
+                return token
+            return self._refresh()
+
+    def invalidate(self) -> None:
+        """Drop the in-memory token (e.g. after Amadeus answers 401)."""
+        with self._lock:
+            self._token, self._expires_at = None, 0.0
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+    # ----- internals -----
+    def _count(self, name: str) -> None:
+        self._stats[name] += 1
+
+    def _fresh_in_memory(self) -> Optional[str]:
+        if self._token and time.time() < self._expires_at - TOKEN_REFRESH_MARGIN:
+            self._stats["memory_hits"] += 1
+            return self._token
+        return None
+
+    def _refresh(self) -> str:
+        item = self._load()
+        if self._adopt(item, fresh_only=True):
+            self._count("table_hits")
+            return self._token
+
+        if self._acquire_lease():
+            self._count("lease_acquired")
+            return self._fetch_and_store()
+
+        self._count("lease_contention")
+        record_span("amadeus.token.lease_contention", 0.0)
+        # Someone else is refreshing: keep using a token that has not expired yet
+        if self._adopt(item, fresh_only=False) or (self._token and time.time() < self._expires_at):
+            return self._token
+
+        self._count("lease_waits")
+        deadline = time.monotonic() + TOKEN_LEASE_WAIT
+        with span("amadeus.token.lease_wait"):
+            while time.monotonic() < deadline:
+                time.sleep(TOKEN_POLL_INTERVAL)
+                if self._adopt(self._load(), fresh_only=False):
+                    return self._token
+
+        print(f"[amadeus_auth] No token after waiting {TOKEN_LEASE_WAIT}s for the lease holder; fetching one")
+        self._count("unleased_fetches")
+        return self._fetch_and_store()
+
+    def _adopt(self, item: Optional[Dict[str, Any]], fresh_only: bool) -> bool:
+        """Take the token from a ServiceTokens item if it is usable."""
+        if not item or not item.get("token"):
+            return False
+        expires_at = float(item.get("expires_at", 0))
+        limit = expires_at - TOKEN_REFRESH_MARGIN if fresh_only else expires_at
+        if time.time() >= limit:
+            return False
+        self._token, self._expires_at = item["token"], expires_at
+        return True
+
+    def _table(self):
+        return dynamodb_resource().Table(self.table_name)
+
+    def _key(self) -> Dict[str, str]:
+        return {"serviceName": SERVICE_NAME, "tokenType": self.token_type}
+
+    def _load(self) -> Optional[Dict[str, Any]]:
+        try:
+            return self._table().get_item(Key=self._key(), ConsistentRead=True).get("Item")
+        except ClientError as e:
+            print(f"[amadeus_auth] Token read error: {str(e)}")
+            return None
+
+    def _acquire_lease(self) -> bool:
+        now = int(time.time())
+        try:
+            self._table().update_item(
+                Key=self._key(),
+                UpdateExpression="SET leaseOwner = :owner, leaseUntil = :until",
+                ConditionExpression="attribute_not_exists(leaseUntil) OR leaseUntil < :now OR leaseOwner = :owner",
+                ExpressionAttributeValues={":owner": self.owner, ":until": now + TOKEN_LEASE_SECONDS, ":now": now},
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            # Without the table we cannot coordinate; refresh on our own
+            print(f"[amadeus_auth] Lease write error: {str(e)}")
+            return True
+
+    def _fetch_and_store(self) -> str:
+        with span("amadeus.token.refresh"):
+            response = http_session("amadeus").post(
+                AMADEUS_TOKEN_URL,
+                headers={"Content-Type": "application/x-www-form-urlencoded"},
+                data={
+                    "grant_type": "client_credentials",
+                    "client_id": os.environ.get("AMADEUS_CLIENT_ID"),
+                    "client_secret": os.environ.get("AMADEUS_CLIENT_SECRET"),
+                },
+                timeout=TOKEN_HTTP_TIMEOUT,
+            )
+            response.raise_for_status()
+            result = response.json()
+        self._count("refreshes")
+
+        token = result["access_token"]
+        expires_at = int(time.time()) + int(result.get("expires_in", 1799))
+        try:
+            self._table().update_item(
+                Key=self._key(),
+                UpdateExpression="SET #id = :id, #token = :token, expires_at = :expires_at REMOVE leaseOwner, leaseUntil",
+                ExpressionAttributeNames={"#id": "id", "#token": "token"},
+                ExpressionAttributeValues={":id": "access_token", ":token": token, ":expires_at": expires_at},
+            )
+        except ClientError as e:
+            print(f"[amadeus_auth] Token write error: {str(e)}")
+        self._token, self._expires_at = token, float(expires_at)
+        return token
+
+
+def token_manager(token_type: str = AMADEUS_TOKEN_TYPE) -> AmadeusTokenManager:
+    manager = _managers.get(token_type)
+    if manager is None:
+        with _managers_lock:
+            manager = _managers.setdefault(token_type, AmadeusTokenManager(token_type))
+    return manager
+
+
+def get_amadeus_token() -> str:
+    """The shared Amadeus access token (cached in memory, refreshed under a lease)."""
+    return token_manager().get_token()
+
+
+def token_stats() -> Dict[str, int]:
+    return token_manager().stats()
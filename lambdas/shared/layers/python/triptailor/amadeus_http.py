@@ -0,0 +1,305 @@
+"""
+Resilient HTTP layer for every Amadeus call.
+
+amadeus_session() returns the session all Amadeus callers use. Its
+get() / post() go through the rate-limited pooled "amadeus" session
+(triptailor.amadeus_limits) and add:
+
+  - Timeouts per endpoint family: AMADEUS_CONNECT_TIMEOUT, plus the read
+    timeouts in AMADEUS_READ_TIMEOUTS. They apply when the caller passes
+    no ``timeout`` (or ``timeout=None``).
+  - Retries with jittered exponential backoff (AMADEUS_MAX_ATTEMPTS,
+    AMADEUS_BACKOFF_BASE / _MAX) on connection errors, timeouts, 429 and
+    5xx. A Retry-After header sets the minimum delay. The delays of one
+    call stay within AMADEUS_RETRY_BUDGET seconds.
+  - Retries only for idempotent calls: GET, plus the read-only POSTs of
+    the shopping / pricing families. Bookings are retried only when the
+    request cannot have been processed (connect timeout, 429). Callers
+    can pass ``idempotent=`` to decide for themselves.
+  - A circuit breaker per family. It opens after AMADEUS_BREAKER_FAILURES
+    consecutive failures (connection errors, timeouts, 5xx), rejects calls
+    for AMADEUS_BREAKER_COOLDOWN seconds, then lets one probe through.
+    While it is open, or when every attempt failed, a GET is answered from
+    the last successful response to the same request, if the container
+    still has one (AMADEUS_FALLBACK_CACHE_SIZE entries). Such responses
+    have ``served_from_cache = True``. Price checks (the "pricing" family)
+    are never answered this way, so a stale price cannot pass as confirmed
+    before a booking. Without a cached response, CircuitOpen is raised. It
+    is a requests.RequestException, like the callers' other upstream errors.
+
+Metrics: every retry is an ``amadeus.retry.<family>`` tracing span (its
+duration is the backoff delay). Breaker transitions are
+``amadeus.breaker.<family>.<state>``, rejected calls
+``amadeus.breaker.<family>.rejected`` and cached answers
+``amadeus.fallback.<family>``. amadeus_stats() returns the container's
+counters and breaker states.
+"""
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import requests
+
+from triptailor.amadeus_limits import RateLimitTimeout, endpoint_family, limit_session
+from triptailor.clients import http_session
+from triptailor.tracing import record_span
+
+AMADEUS_CONNECT_TIMEOUT = float(os.environ.get("AMADEUS_CONNECT_TIMEOUT", "3.05"))
+AMADEUS_READ_TIMEOUTS = os.environ.get("AMADEUS_READ_TIMEOUTS", "shopping=20,pricing=15,orders=30,sentiments=10")
+AMADEUS_DEFAULT_READ_TIMEOUT = 15.0
+AMADEUS_MAX_ATTEMPTS = int(os.environ.get("AMADEUS_MAX_ATTEMPTS", "3"))
+AMADEUS_BACKOFF_BASE = float(os.environ.get("AMADEUS_BACKOFF_BASE", "0.25"))
+AMADEUS_BACKOFF_MAX = float(os.environ.get("AMADEUS_BACKOFF_MAX", "4"))
+AMADEUS_RETRY_BUDGET = float(os.environ.get("AMADEUS_RETRY_BUDGET", "8"))
+AMADEUS_BREAKER_FAILURES = int(os.environ.get("AMADEUS_BREAKER_FAILURES", "5"))
+AMADEUS_BREAKER_COOLDOWN = float(os.environ.get("AMADEUS_BREAKER_COOLDOWN", "30"))
+AMADEUS_FALLBACK_CACHE_SIZE = int(os.environ.get("AMADEUS_FALLBACK_CACHE_SIZE", "128"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+READ_ONLY_POST_FAMILIES = {"shopping", "pricing"}  # searches and price checks create nothing
+NO_FALLBACK_FAMILIES = {"pricing"}  # a price check must be fresh or fail
+
+
+class CircuitOpen(requests.exceptions.RequestException):
+    """Amadeus calls of this family are failing; the call was not attempted."""
+
+
+def _read_timeouts(spec: str) -> Dict[str, float]:
+    timeouts = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            timeouts[name.strip()] = float(value)
+    return timeouts
+
+
+def retry_after_seconds(response) -> Optional[float]:
+    """The Retry-After header (seconds or an HTTP date) as seconds from now, if present."""
+    value = (response.headers.get("Retry-After") or "").strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff before retry number ``attempt`` (1-based)."""
+    return random.uniform(0, min(AMADEUS_BACKOFF_MAX, AMADEUS_BACKOFF_BASE * (2 ** attempt)))
+
+
+# ===== Circuit breaker =====
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, family: str, failure_threshold: int = AMADEUS_BREAKER_FAILURES,
+                 cooldown: float = AMADEUS_BREAKER_COOLDOWN):
+        self.family = family
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now (in half-open state, one probe at a time)."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() >= self._opened_at + self.cooldown:
+                self._transition(self.HALF_OPEN)
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def release(self) -> None:
+        """The allowed call was not sent; let another probe through."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._transition(self.OPEN)
+
+    def _transition(self, state: str) -> None:
+        print(f"[amadeus_http] {self.family} circuit {self.state} -> {state}")
+        self.state = state
+        record_span(f"amadeus.breaker.{self.family}.{state}", 0.0)
+
+
+# ===== Session =====
+class ResilientSession:
+    """get() / post() / request() with timeouts, retries, a circuit breaker and a fallback cache."""
+
+    def __init__(self, session):
+        self.session = session
+        self.read_timeouts = _read_timeouts(AMADEUS_READ_TIMEOUTS)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._fallback: "OrderedDict[Any, requests.Response]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "retries": 0, "retry_exhausted": 0, "rejected": 0, "fallback_served": 0}
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method: str, url: str, idempotent: Optional[bool] = None, **kwargs):
+        method = method.upper()
+        family = endpoint_family(url) or "other"
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = (AMADEUS_CONNECT_TIMEOUT, self.read_timeouts.get(family, AMADEUS_DEFAULT_READ_TIMEOUT))
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS or (method == "POST" and family in READ_ONLY_POST_FAMILIES)
+        cache_key = self._cache_key(method, family, url, kwargs)
+        breaker = self.breaker(family)
+        self._count("calls")
+
+        deadline = time.monotonic() + AMADEUS_RETRY_BUDGET
+        attempt = 0
+        while True:
+            attempt += 1
+            if not breaker.allow():
+                self._count("rejected")
+                record_span(f"amadeus.breaker.{family}.rejected", 0.0)
+                return self._fallback_or_raise(family, cache_key,
+                                               CircuitOpen(f"Amadeus {family} circuit is open; call not attempted"))
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except RateLimitTimeout:
+                breaker.release()  # never sent: it says nothing about Amadeus
+                raise
+            except (requests.ConnectionError, requests.Timeout) as e:
+                breaker.record_failure()
+                # A connect timeout never reached Amadeus; anything else may have
+                retryable = idempotent or isinstance(e, requests.ConnectTimeout)
+                delay = backoff_delay(attempt)
+                if not retryable or not self._can_retry(attempt, delay, deadline):
+                    return self._fallback_or_raise(family, cache_key, e)
+                reason = type(e).__name__
+            except BaseException:
+                breaker.release()  # e.g. a broken response body: do not leave a probe pending forever
+                raise
+            else:
+                status = response.status_code
+                if status >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                    if status < 400:
+                        self._remember(cache_key, response)
+                # 429 means the request was rejected before being processed
+                retryable = status in RETRY_STATUSES and (idempotent or status == 429)
+                if not retryable:
+                    return response
+                delay = max(backoff_delay(attempt), retry_after_seconds(response) or 0.0)
+                if not self._can_retry(attempt, delay, deadline):
+                    cached = self._cached(family, cache_key) if status >= 500 else None
+                    return cached or response
+                response.close()
+                reason = f"HTTP {status}"
+            self._count("retries")
+            record_span(f"amadeus.retry.{family}", delay * 1000.0, attempt=attempt, reason=reason)
+            print(f"[amadeus_http] Retrying {method} {family} call in {delay:.2f}s after {reason} (attempt {attempt})")
+            time.sleep(delay)
+
+    def breaker(self, family: str) -> CircuitBreaker:
+        with self._lock:
+            if family not in self._breakers:
+                self._breakers[family] = CircuitBreaker(family)
+            return self._breakers[family]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, breakers={family: b.state for family, b in self._breakers.items()},
+                        fallback_entries=len(self._fallback))
+
+    # ----- internals -----
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _can_retry(self, attempt: int, delay: float, deadline: float) -> bool:
+        if attempt < AMADEUS_MAX_ATTEMPTS and time.monotonic() + delay <= deadline:
+            return True
+        self._count("retry_exhausted")
+        return False
+
+    @staticmethod
+    def _cache_key(method: str, family: str, url: str, kwargs: Dict[str, Any]):
+        if method != "GET" or family in NO_FALLBACK_FAMILIES or AMADEUS_FALLBACK_CACHE_SIZE <= 0:
+            return None
+        params = kwargs.get("params") or {}
+        items = params.items() if isinstance(params, dict) else params
+        return url, tuple(sorted((str(k), str(v)) for k, v in items))
+
+    def _remember(self, cache_key, response) -> None:
+        if cache_key is None:
+            return
+        with self._lock:
+            self._fallback[cache_key] = response
+            self._fallback.move_to_end(cache_key)
+            while len(self._fallback) > AMADEUS_FALLBACK_CACHE_SIZE:
+                self._fallback.popitem(last=False)
+
+    def _cached(self, family: str, cache_key):
+        if cache_key is None:
+            return None
+        with self._lock:
+            response = self._fallback.get(cache_key)
+        if response is None:
+            return None
+        self._count("fallback_served")
+        record_span(f"amadeus.fallback.{family}", 0.0)
+        print(f"[amadeus_http] Serving the last good {family} response while Amadeus is failing")
+        response.served_from_cache = True
+        return response
+
+    def _fallback_or_raise(self, family: str, cache_key, error: Exception):
+        cached = self._cached(family, cache_key)
+        if cached is not None:
+            return cached
+        raise error
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def amadeus_session() -> ResilientSession:
+    """The container-wide Amadeus session (rate limited, retried, behind a circuit breaker)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = ResilientSession(limit_session(http_session("amadeus")))
+    return _session
+
+
+def amadeus_stats() -> Dict[str, Any]:
+    return amadeus_session().stats()
@@ -0,0 +1,267 @@
+"""
+Amadeus rate limiter shared by every lambda instance.
+
+Amadeus enforces a per-second quota for the API key, whichever container
+sends the request (and, in the test environment, at most one request per
+1/quota seconds). Requests are grouped into endpoint families (see
+FAMILY_RULES) with a quota each (AMADEUS_RATE_LIMITS, requests per second).
+
+  - Shared token bucket: each family is a GCRA bucket (a token bucket kept as
+    one timestamp) refilled at ``limit`` tokens per second and holding at
+    most AMADEUS_RATE_BURST tokens. The AMADEUS_RATE_TABLE item ``<family>``
+    stores ``tat``, the time the bucket is next full again, in microseconds;
+    ``expiresAt`` is its TTL attribute. Requests are therefore spaced
+    1/limit seconds apart, and no rolling second sees more than
+    ``limit + burst - 1`` of them.
+  - Reservations instead of polling: one conditional UpdateItem moves ``tat``
+    forward and returns the caller's send slot; the caller sleeps until then.
+    A full bucket costs no further DynamoDB calls, and waiting containers
+    wake at their own slots rather than all together at a window edge.
+  - Fast path: a container reserves up to AMADEUS_RATE_LEASE consecutive slots
+    per UpdateItem when callers are queued behind the first one, and hands
+    them out from memory (a slot not used within its interval is dropped).
+  - Fair queuing: callers of one family wait in FIFO order, so a burst of
+    threads cannot starve an earlier one. Only the head of the queue
+    reserves. A caller whose slot would fall after AMADEUS_RATE_WAIT seconds
+    gives up with RateLimitTimeout (without reserving it), a
+    requests.RequestException, so it reaches the callers' existing upstream
+    error handling.
+  - If the table cannot be reached, the limiter fails open: it allows the
+    call and logs the error, so it never blocks Amadeus traffic by itself.
+
+limit_session() installs the limiter on a pooled requests session;
+triptailor.amadeus_http.amadeus_session() is the limited "amadeus" session
+every caller uses, so each retry attempt waits for its own token.
+rate_limiter().stats() returns the container's counters, and waits are
+recorded as ``ratelimit.<family>`` tracing spans.
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+from botocore.exceptions import BotoCoreError, ClientError
+
+from triptailor.clients import dynamodb_resource
+from triptailor.tracing import record_span
+
+AMADEUS_RATE_TABLE = os.environ.get("AMADEUS_RATE_TABLE", "RateLimits")
+AMADEUS_RATE_LIMITS = os.environ.get("AMADEUS_RATE_LIMITS", "shopping=10,pricing=10,orders=5,sentiments=5")
+AMADEUS_RATE_BURST = int(os.environ.get("AMADEUS_RATE_BURST", "1"))
+AMADEUS_RATE_LEASE = int(os.environ.get("AMADEUS_RATE_LEASE", "2"))
+AMADEUS_RATE_WAIT = float(os.environ.get("AMADEUS_RATE_WAIT", "10"))
+MICROS = 1_000_000
+
+# (path pattern, family), first match wins; unmatched paths (e.g. the OAuth token) are not limited
+FAMILY_RULES = (
+    (re.compile(r"^/v\d+/shopping/flight-offers/pricing"), "pricing"),
+    (re.compile(r"^/v\d+/shopping/hotel-offers/[^/]+$"), "pricing"),  # one offer by ID
+    (re.compile(r"^/v\d+/(shopping|reference-data)/"), "shopping"),
+    (re.compile(r"^/v\d+/booking/"), "orders"),
+    (re.compile(r"^/v\d+/e-reputation/"), "sentiments"),
+)
+
+
+class RateLimitTimeout(requests.exceptions.RequestException):
+    """No Amadeus token became available before the caller's deadline."""
+
+
+def endpoint_family(url: str) -> Optional[str]:
+    path = urlsplit(url).path
+    for pattern, family in FAMILY_RULES:
+        if pattern.search(path):
+            return family
+    return None
+
+
+def parse_limits(spec: str) -> Dict[str, int]:
+    """"shopping=10,pricing=5" -> {"shopping": 10, "pricing": 5}."""
+    limits = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            limits[name.strip()] = int(value)
+    return limits
+
+
+class RateLimiter:
+    def __init__(self, limits: Dict[str, int], table_name: str = AMADEUS_RATE_TABLE,
+                 burst: int = AMADEUS_RATE_BURST, lease_size: int = AMADEUS_RATE_LEASE,
+                 max_wait: float = AMADEUS_RATE_WAIT,
+                 clock: Callable[[], float] = time.time, sleep: Callable[[float], None] = time.sleep):
+        self.limits = limits
+        self.table_name = table_name
+        self.burst = max(1, burst)
+        self.lease_size = max(1, lease_size)
+        self.max_wait = max_wait
+        self._clock = clock
+        self._sleep = sleep
+        self._cond = threading.Condition()
+        self._queues = {family: deque() for family in limits}
+        self._slots = {family: deque() for family in limits}  # reserved send times (seconds)
+        self._tat = {family: 0 for family in limits}  # newest tat seen (only ever moves forward)
+        self._stats = {"acquired": 0, "local_hits": 0, "reservations": 0, "conflicts": 0,
+                       "waits": 0, "timeouts": 0, "fail_open": 0}
+
+    def acquire(self, family: str, max_wait: Optional[float] = None) -> float:
+        """
+        Block until a request of ``family`` may be sent; returns the seconds
+        waited. Raises RateLimitTimeout if that would take longer than
+        ``max_wait`` (AMADEUS_RATE_WAIT).
+        """
+        if family not in self.limits:
+            return 0.0
+        start = self._clock()
+        deadline = start + (self.max_wait if max_wait is None else max_wait)
+        ticket = object()
+        queue = self._queues[family]
+        with self._cond:
+            queue.append(ticket)
+        try:
+            with self._cond:
+                while queue[0] is not ticket:
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        self._timeout(family)
+                    self._cond.wait(remaining)
+                waiting = len(queue)
+            # Head of the queue: the only thread of this family touching its slots
+            slot = self._next_slot(family, waiting, deadline)
+            if slot is None:
+                self._timeout(family)
+            delay = slot - self._clock()
+            if delay > 0:
+                self._sleep(delay)
+            waited = self._clock() - start
+            self._count("acquired")
+            if waited > 0.001:
+                self._count("waits")
+                record_span(f"ratelimit.{family}", waited * 1000.0)
+            return waited
+        finally:
+            with self._cond:
+                queue.remove(ticket)
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return dict(self._stats)
+
+    # ----- internals -----
+    def _count(self, name: str) -> None:
+        with self._cond:
+            self._stats[name] += 1
+
+    def _timeout(self, family: str):
+        self._count("timeouts")
+        raise RateLimitTimeout(f"Amadeus {family} rate limit: no capacity within the wait deadline")
+
+    def _next_slot(self, family: str, waiting: int, deadline: float) -> Optional[float]:
+        """The send time of this request: a leased slot, or a new reservation (None if none by ``deadline``)."""
+        now = self._clock()
+        interval = 1.0 / self.limits[family]
+        slots = self._slots[family]
+        while slots and slots[0] + interval < now:
+            slots.popleft()  # unused in time; sending it late could bunch up with later slots
+        if slots:
+            if slots[0] > deadline:
+                return None  # kept for a caller that can wait that long
+            self._count("local_hits")
+            return slots.popleft()
+        reserved = self._reserve(family, min(self.lease_size, waiting), now, deadline)
+        if not reserved:
+            return None
+        slots.extend(reserved[1:])
+        return reserved[0]
+
+    def _reserve(self, family: str, count: int, now: float, deadline: float) -> List[float]:
+        """
+        Take ``count`` tokens from the shared bucket; returns their send times
+        (1/limit apart), or [] if the first one would come after ``deadline``.
+        """
+        interval_us = MICROS // self.limits[family]
+        tolerance_us = (self.burst - 1) * interval_us
+        now_us = int(now * MICROS)
+        cost_us = count * interval_us
+        try:
+            table = dynamodb_resource().Table(self.table_name)
+        except BotoCoreError as e:
+            return self._fail_open(now, e)
+        key = {"bucketKey": family}
+        expires = int(deadline + self.max_wait) + 60
+        # Two shapes of the same GCRA step, as DynamoDB cannot take max(tat, now):
+        # an idle bucket restarts from now, a busy one extends its schedule.
+        # tat only moves forward, so a tat above now proves the bucket is busy.
+        busy = known_busy = self._tat[family] > now_us
+        for _ in range(2):
+            try:
+                if busy:
+                    response = table.update_item(
+                        Key=key,
+                        UpdateExpression="SET tat = tat + :cost, expiresAt = :expires",
+                        ConditionExpression="tat > :now AND tat <= :horizon",
+                        ExpressionAttributeValues={
+                            ":cost": cost_us, ":now": now_us, ":expires": expires,
+                            ":horizon": int(deadline * MICROS) + tolerance_us,
+                        },
+                        ReturnValues="UPDATED_NEW",
+                    )
+                    tat_us = int(response["Attributes"]["tat"])
+                    first_us = max(now_us, tat_us - cost_us - tolerance_us)
+                else:
+                    table.update_item(
+                        Key=key,
+                        UpdateExpression="SET tat = :tat, expiresAt = :expires",
+                        ConditionExpression="attribute_not_exists(tat) OR tat <= :now",
+                        ExpressionAttributeValues={":tat": now_us + cost_us, ":now": now_us, ":expires": expires},
+                    )
+                    tat_us, first_us = now_us + cost_us, now_us
+                self._tat[family] = max(self._tat[family], tat_us)
+                self._count("reservations")
+                return [(first_us + i * interval_us) / MICROS for i in range(count)]
+            except BotoCoreError as e:  # e.g. EndpointConnectionError, ReadTimeoutError
+                return self._fail_open(now, e)
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    return self._fail_open(now, e)
+                self._count("conflicts")
+                if busy and known_busy:
+                    return []  # the schedule already runs past the deadline
+                # The bucket was in the other state
+                known_busy, busy = True, not busy
+        return []
+
+    def _fail_open(self, now: float, error: Exception) -> List[float]:
+        print(f"[amadeus_limits] Rate table {self.table_name} unavailable, allowing the call: {str(error)}")
+        self._count("fail_open")
+        return [now]
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def rate_limiter() -> RateLimiter:
+    """The container-wide limiter configured from AMADEUS_RATE_LIMITS."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(parse_limits(AMADEUS_RATE_LIMITS))
+    return _limiter
+
+
+def _before_request(method: str, url: str) -> None:
+    family = endpoint_family(url)
+    if family:
+        rate_limiter().acquire(family)
+
+
+def limit_session(session):
+    """Install the limiter on a pooled session: every request first waits for a token."""
+    session.before_request = _before_request
+    return session
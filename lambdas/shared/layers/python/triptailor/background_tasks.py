@@ -0,0 +1,60 @@
+"""Work that a chat turn starts but does not wait for.
+
+Chat titles (triptailor.chat_titles) and summary folds
+(triptailor.chat_summary) run after the reply has been returned. A task is
+a small JSON event with a ``task`` name; the turn only dispatches it.
+TASK_DISPATCH_MODE (formerly TITLE_DISPATCH_MODE, still honored) picks how
+tasks run:
+
+  - ``lambda``: async (InvocationType=Event) self-invocation of the current
+    function with the task event; its handler recognizes the task and runs
+    it. Default when running on Lambda.
+  - ``local``: a background thread in this process. Default elsewhere, and
+    what local runs and tests use (see wait_for_background_tasks()).
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+TASK_DISPATCH_MODE = (
+    os.environ.get("TASK_DISPATCH_MODE")
+    or os.environ.get("TITLE_DISPATCH_MODE")
+    or ("lambda" if os.environ.get("AWS_LAMBDA_FUNCTION_NAME") else "local")
+).strip().lower()
+
+_local_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-task")
+_local_futures = []
+
+
+def dispatch_task(event: Dict[str, Any], local_runner: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                  function_name: Optional[str] = None) -> bool:
+    """
+    Start a task without waiting for it.
+
+    local_runner(event) runs the task in ``local`` mode; in ``lambda`` mode the
+    event goes to function_name (default: this function) as an async invoke.
+    """
+    if TASK_DISPATCH_MODE == "lambda":
+        from triptailor.clients import lambda_client
+
+        lambda_client().invoke(
+            FunctionName=function_name or os.environ["AWS_LAMBDA_FUNCTION_NAME"],
+            InvocationType="Event",
+            Payload=json.dumps(event).encode("utf-8"),
+        )
+        return True
+
+    if local_runner is None:
+        return False
+    _local_futures.append(_local_executor.submit(local_runner, event))
+    return True
+
+
+def wait_for_background_tasks(timeout: Optional[float] = None) -> None:
+    """Block until locally dispatched tasks are done (local runs and tests)."""
+    pending = list(_local_futures)
+    wait(pending, timeout=timeout)
+    for future in pending:
+        if future.done():
+            _local_futures.remove(future)
@@ -0,0 +1,141 @@
+"""
+Bulk persistence for search results (Flights / Hotels offers).
+
+persist_new_items() takes items that already carry their content-hash ID,
+checks which IDs are already stored, and writes only the new ones with
+BatchWriteItem: 25 items per request, chunks spread over a small thread pool
+(BATCH_WRITE_WORKERS), UnprocessedItems retried with jittered exponential
+backoff.
+
+Flights and Hotels have a composite key (ID + timestamp), so "already
+stored" cannot be answered by BatchGetItem; each ID is checked with a
+one-item keys-only Query, run on the same pool.
+
+With SEARCH_PERSIST_MODE=write_behind the check and the writes run on a
+background thread and the caller gets the IDs right away. Handlers that use
+it call wait_for_pending_writes() before returning, since a frozen Lambda
+container does not run background threads.
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, List, Optional
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from triptailor.clients import dynamodb_resource
+
+BATCH_WRITE_WORKERS = int(os.environ.get("BATCH_WRITE_WORKERS", "4"))
+BATCH_WRITE_MAX_ATTEMPTS = int(os.environ.get("BATCH_WRITE_MAX_ATTEMPTS", "6"))
+SEARCH_PERSIST_MODE = os.environ.get("SEARCH_PERSIST_MODE", "sync").strip().lower()
+BATCH_WRITE_SIZE = 25  # DynamoDB limit per BatchWriteItem
+
+_executor = ThreadPoolExecutor(max_workers=BATCH_WRITE_WORKERS, thread_name_prefix="batch-write")
+_behind_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="write-behind")
+_pending_lock = threading.Lock()
+_pending = []
+
+
+def chunked(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def existing_ids(table_name: str, key_name: str, ids: List[str]) -> set:
+    """The subset of ``ids`` that has at least one item in ``table_name``."""
+    table = dynamodb_resource().Table(table_name)
+
+    def exists(item_id):
+        try:
+            response = table.query(
+                KeyConditionExpression=Key(key_name).eq(item_id),
+                ProjectionExpression="#k",
+                ExpressionAttributeNames={"#k": key_name},
+                Limit=1,
+            )
+        except ClientError as e:
+            # Writing a duplicate is harmless; losing the offer is not
+            print(f"[batch_writes] Existence check on {table_name} failed: {str(e)}")
+            return None
+        return item_id if response.get("Items") else None
+
+    return {found for found in _executor.map(exists, ids) if found}
+
+
+def _write_chunk(table_name: str, items: List[Dict[str, Any]]) -> int:
+    """BatchWriteItem one chunk, retrying unprocessed items. Returns how many were left unwritten."""
+    resource = dynamodb_resource()
+    request = {table_name: [{"PutRequest": {"Item": item}} for item in items]}
+    for attempt in range(BATCH_WRITE_MAX_ATTEMPTS):
+        response = resource.batch_write_item(RequestItems=request)
+        request = response.get("UnprocessedItems") or {}
+        if not request:
+            return 0
+        time.sleep(min(2.0, 0.05 * (2 ** attempt)) * random.uniform(0.5, 1.0))
+    left = sum(len(requests) for requests in request.values())
+    print(f"[batch_writes] {left} items to {table_name} still unprocessed after {BATCH_WRITE_MAX_ATTEMPTS} attempts")
+    return left
+
+
+def batch_write_items(table_name: str, items: List[Dict[str, Any]]) -> int:
+    """Put ``items`` in 25-item BatchWriteItem chunks across the pool. Returns how many failed."""
+    futures = [_executor.submit(_write_chunk, table_name, chunk) for chunk in chunked(items, BATCH_WRITE_SIZE)]
+    failed = 0
+    for future, chunk in zip(futures, chunked(items, BATCH_WRITE_SIZE)):
+        try:
+            failed += future.result()
+        except Exception as e:
+            print(f"[batch_writes] Batch write to {table_name} failed: {str(e)}")
+            failed += len(chunk)
+    return failed
+
+
+def _persist(table_name: str, key_name: str, items: Dict[str, Dict[str, Any]],
+             latest_table: Optional[str]) -> None:
+    present = existing_ids(table_name, key_name, list(items))
+    new_items = [item for item_id, item in items.items() if item_id not in present]
+    if new_items:
+        batch_write_items(table_name, new_items)
+        if latest_table:
+            batch_write_items(latest_table, new_items)
+    print(f"[batch_writes] {table_name}: {len(new_items)} new, {len(present)} already stored")
+
+
+def persist_new_items(table_name: str, key_name: str, items: Dict[str, Dict[str, Any]],
+                      write_behind: Optional[bool] = None, latest_table: Optional[str] = None) -> None:
+    """
+    Store the items (keyed by their ID) that are not in the table yet, and
+    in ``latest_table`` (the ID-keyed projection, see triptailor.latest_offers).
+    With write_behind (default: SEARCH_PERSIST_MODE == "write_behind") this
+    returns immediately and the work runs in the background.
+    """
+    if not items:
+        return
+    if write_behind is None:
+        write_behind = SEARCH_PERSIST_MODE == "write_behind"
+    if not write_behind:
+        _persist(table_name, key_name, items, latest_table)
+        return
+
+    def run():
+        try:
+            _persist(table_name, key_name, items, latest_table)
+        except Exception as e:
+            print(f"[batch_writes] Write-behind to {table_name} failed: {str(e)}")
+
+    with _pending_lock:
+        _pending[:] = [future for future in _pending if not future.done()]
+        _pending.append(_behind_executor.submit(run))
+
+
+def wait_for_pending_writes(timeout: Optional[float] = None) -> bool:
+    """Block until queued write-behind work is done. Returns False on timeout."""
+    with _pending_lock:
+        futures = list(_pending)
+    if not futures:
+        return True
+    _, not_done = wait(futures, timeout=timeout)
+    return not not_done
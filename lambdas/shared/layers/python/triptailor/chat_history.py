@@ -0,0 +1,169 @@
+"""Access helpers for the ``chat-history`` table.
+
+The base table is keyed by ``user_id`` (partition) and ``timestamp`` (sort),
+so a query for one chat used to read every message the user ever sent and
+filter on ``chat_id`` afterwards. Every message now also carries a
+``user_chat_id`` attribute (``"<user_id>#<chat_id>"``) which is the partition
+key of the ``user_chat_id-timestamp-index`` GSI, so reads are scoped to a
+single chat.
+
+Rollout (no downtime):
+  1. Deploy the lambdas. Writers always set ``user_chat_id`` and readers stay
+     on the legacy layout (``CHAT_HISTORY_READ_MODE=legacy``, the default).
+  2. Create the GSI and backfill old messages with
+     ``chat_management/migrate_chat_history.py`` (resumable).
+  3. Switch readers to ``dual``: both layouts are read and merged, so chats
+     that are only partially backfilled stay complete.
+  4. Once the backfill reports nothing left to update, switch to ``chat``.
+"""
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from boto3.dynamodb.conditions import Attr, Key
+
+CHAT_HISTORY_TABLE = "chat-history"
+CHAT_KEY_ATTRIBUTE = "user_chat_id"
+CHAT_INDEX_NAME = os.environ.get("CHAT_HISTORY_INDEX", "user_chat_id-timestamp-index")
+
+READ_MODE_LEGACY = "legacy"
+READ_MODE_DUAL = "dual"
+READ_MODE_CHAT = "chat"
+READ_MODES = (READ_MODE_LEGACY, READ_MODE_DUAL, READ_MODE_CHAT)
+
+
+def chat_key(user_id: str, chat_id) -> str:
+    """Return the per-chat partition key value."""
+    return f"{user_id}#{chat_id}"
+
+
+def read_mode() -> str:
+    mode = (os.environ.get("CHAT_HISTORY_READ_MODE") or READ_MODE_LEGACY).strip().lower()
+    return mode if mode in READ_MODES else READ_MODE_LEGACY
+
+
+def new_message_item(user_id: str, chat_id, role: str, content: str, timestamp: Optional[int] = None) -> Dict[str, Any]:
+    """Build a chat-history item in the dual-key layout."""
+    return {
+        "user_id": user_id,
+        "timestamp": timestamp if timestamp is not None else int(time.time() * 1000),
+        "role": role,
+        "content": content,
+        "chat_id": str(chat_id),
+        CHAT_KEY_ATTRIBUTE: chat_key(user_id, chat_id),
+    }
+
+
+def _query_pages(table, limit: Optional[int] = None, **kwargs) -> Iterable[Dict[str, Any]]:
+    """Yield items across every page of a query, stopping after ``limit`` items."""
+    seen = 0
+    while True:
+        response = table.query(**kwargs)
+        for item in response.get("Items", []):
+            yield item
+            seen += 1
+            if limit is not None and seen >= limit:
+                return
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return
+        kwargs["ExclusiveStartKey"] = last_key
+
+
+def _projection_kwargs(attributes: Optional[List[str]]) -> Dict[str, Any]:
+    if not attributes:
+        return {}
+    # The sort key is always needed to order and de-duplicate merged reads
+    names = list(dict.fromkeys([*attributes, "timestamp"]))
+    placeholders = {f"#p{i}": name for i, name in enumerate(names)}
+    return {
+        "ProjectionExpression": ", ".join(placeholders.keys()),
+        "ExpressionAttributeNames": placeholders,
+    }
+
+
+def _key_condition(partition_key, value, after):
+    condition = Key(partition_key).eq(value)
+    if after is not None:
+        condition = condition & Key("timestamp").gt(after)
+    return condition
+
+
+def _query_chat_layout(table, user_id, chat_id, newest_first, limit, attributes, after=None):
+    kwargs = {
+        "IndexName": CHAT_INDEX_NAME,
+        "KeyConditionExpression": _key_condition(CHAT_KEY_ATTRIBUTE, chat_key(user_id, chat_id), after),
+        "ScanIndexForward": not newest_first,
+        **_projection_kwargs(attributes),
+    }
+    if limit is not None:
+        kwargs["Limit"] = limit
+    return list(_query_pages(table, limit=limit, **kwargs))
+
+
+def _query_legacy_layout(table, user_id, chat_id, newest_first, limit, attributes, after=None):
+    kwargs = {
+        "KeyConditionExpression": _key_condition("user_id", user_id, after),
+        "FilterExpression": Attr("chat_id").eq(str(chat_id)),
+        "ScanIndexForward": not newest_first,
+        **_projection_kwargs(attributes),
+    }
+    return list(_query_pages(table, limit=limit, **kwargs))
+
+
+def query_chat_messages(
+    table,
+    user_id: str,
+    chat_id,
+    newest_first: bool = False,
+    limit: Optional[int] = None,
+    attributes: Optional[List[str]] = None,
+    after: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Return the messages of one chat, following every result page.
+
+    Items come back in timestamp order (descending when ``newest_first``);
+    ``limit`` caps the number of messages returned, counted from that end.
+    ``after`` keeps only messages with a timestamp strictly greater than it.
+    """
+    mode = read_mode()
+    if mode == READ_MODE_CHAT:
+        return _query_chat_layout(table, user_id, chat_id, newest_first, limit, attributes, after)
+    if mode == READ_MODE_LEGACY:
+        return _query_legacy_layout(table, user_id, chat_id, newest_first, limit, attributes, after)
+
+    merged = {}
+    for item in _query_legacy_layout(table, user_id, chat_id, newest_first, limit, attributes, after):
+        merged[item["timestamp"]] = item
+    for item in _query_chat_layout(table, user_id, chat_id, newest_first, limit, attributes, after):
+        merged.setdefault(item["timestamp"], item)
+    items = sorted(merged.values(), key=lambda x: x["timestamp"], reverse=newest_first)
+    return items[:limit] if limit is not None else items
+
+
+def count_chat_messages(table, user_id: str, chat_id, role: Optional[str] = None) -> int:
+    """Count the messages of one chat (optionally of one role) without reading their content."""
+    if read_mode() == READ_MODE_CHAT:
+        kwargs = {
+            "IndexName": CHAT_INDEX_NAME,
+            "KeyConditionExpression": Key(CHAT_KEY_ATTRIBUTE).eq(chat_key(user_id, chat_id)),
+            "Select": "COUNT",
+        }
+        if role:
+            kwargs["FilterExpression"] = Attr("role").eq(role)
+        total = 0
+        while True:
+            response = table.query(**kwargs)
+            total += response.get("Count", 0)
+            last_key = response.get("LastEvaluatedKey")
+            if not last_key:
+                return total
+            kwargs["ExclusiveStartKey"] = last_key
+
+    items = query_chat_messages(table, user_id, chat_id, attributes=["role"])
+    return sum(1 for item in items if not role or item.get("role") == role)
+
+
+def message_keys(items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Return the base-table primary keys of the given messages."""
+    return [{"user_id": item["user_id"], "timestamp": item["timestamp"]} for item in items]
@@ -0,0 +1,226 @@
+"""Rolling per-chat conversation summary.
+
+Instead of sending a fixed number of raw messages, the LLM-calling lambdas
+send "summary + recent messages": the recent window is chosen newest-first
+until a token budget is used up, and everything older is represented by a
+summary kept in the ``chat-summary`` table (key ``user_chat_id``, same value
+as in chat-history).
+
+Each summary record remembers the timestamp of the last message folded into
+it (``covered_until``), so a turn only reads the messages after that point
+and the prompt stays the same size however long the chat runs.
+
+Messages that fall out of the window are not summarized one by one: they
+stay in the prompt until SUMMARY_FOLD_BATCH of them have piled up, and then
+fold_chat_summary() merges them into the summary with one small completion.
+When fold_is_due() after a turn, handle_chat dispatches a
+``{"task": "fold_chat_summary", ...}`` event (triptailor.background_tasks)
+and returns; run_summary_task() re-reads the chat and folds it, so the turn
+never waits for the summary completion.
+
+The same record carries the chat's atomic ``user_message_count``
+(see triptailor.chat_titles).
+"""
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+from triptailor.chat_history import CHAT_KEY_ATTRIBUTE, chat_key, query_chat_messages
+
+CHAT_SUMMARY_TABLE = os.environ.get("CHAT_SUMMARY_TABLE", "chat-summary")
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", "1500"))
+SUMMARY_FOLD_BATCH = int(os.environ.get("SUMMARY_FOLD_BATCH", "6"))
+SUMMARY_MODEL = os.environ.get("SUMMARY_MODEL", "gpt-4o-mini")
+SUMMARY_MAX_TOKENS = 300
+SUMMARY_TASK = "fold_chat_summary"
+
+# Rough chars-per-token ratio for English chat text plus per-message overhead;
+# good enough for budgeting without shipping a tokenizer in the layer.
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text or "") // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+def get_chat_summary(summary_table, user_id: str, chat_id) -> Dict[str, Any]:
+    """Return the stored summary record, or an empty one for chats without a summary."""
+    item = summary_table.get_item(Key={CHAT_KEY_ATTRIBUTE: chat_key(user_id, chat_id)}).get("Item") or {}
+    return {
+        "summary": item.get("summary", ""),
+        "covered_until": int(item["covered_until"]) if item.get("covered_until") is not None else None,
+        "covered_messages": int(item.get("covered_messages", 0)),
+    }
+
+
+def split_by_token_budget(messages: List[Dict[str, Any]], token_budget: int):
+    """
+    Split timestamp-ordered messages into (older, window), where window is the
+    longest newest-first run that fits token_budget (always at least one message).
+    """
+    used = 0
+    start = len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        cost = estimate_tokens(messages[i].get("content", ""))
+        if start < len(messages) and used + cost > token_budget:
+            break
+        used += cost
+        start = i
+    return messages[:start], messages[start:]
+
+
+def load_chat_context(
+    history_table,
+    summary_table,
+    user_id: str,
+    chat_id,
+    token_budget: int = HISTORY_TOKEN_BUDGET,
+) -> Dict[str, Any]:
+    """
+    Read the summary and the not-yet-summarized messages of one chat.
+
+    Returns {"summary", "covered_until", "covered_messages", "messages", "pending"}:
+    messages is what goes into the prompt (timestamp order), pending the part of
+    it that is outside the token budget and waiting to be folded.
+    """
+    try:
+        record = get_chat_summary(summary_table, user_id, chat_id)
+    except ClientError as e:
+        print(f"[chat_summary] Error reading summary: {e}")
+        record = {"summary": "", "covered_until": None, "covered_messages": 0}
+
+    messages = query_chat_messages(
+        history_table, user_id, chat_id,
+        attributes=["role", "content"], after=record["covered_until"],
+    )
+    pending, _window = split_by_token_budget(messages, token_budget)
+    return {**record, "messages": messages, "pending": pending}
+
+
+def summary_prompt_message(summary: str) -> Optional[Dict[str, str]]:
+    """The system message that stands in for the summarized part of the chat."""
+    if not summary:
+        return None
+    return {
+        "role": "system",
+        "content": f"Summary of the earlier part of this conversation:\n{summary}",
+    }
+
+
+def _summarize(client, previous_summary: str, messages: List[Dict[str, Any]]) -> str:
+    transcript = "\n".join(f"{m.get('role', 'assistant')}: {m.get('content', '')}" for m in messages)
+    completion = client.chat.completions.create(
+        model=SUMMARY_MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": (
+                    "You maintain a running summary of a conversation between a traveler and a travel agent.\n"
+                    "Update the summary with the new messages. Keep every detail needed to continue the trip "
+                    "planning: origin, destinations, dates, travelers, budget, preferences, flights and hotels "
+                    "that were shown, chosen or rejected, and open questions. Prefer the newest information "
+                    "when plans changed. At most 150 words, plain text, no preamble."
+                ),
+            },
+            {
+                "role": "user",
+                "content": f"Current summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}",
+            },
+        ],
+        max_tokens=SUMMARY_MAX_TOKENS,
+        temperature=0.2,
+    )
+    return (completion.choices[0].message.content or "").strip()
+
+
+def _fold_candidates(context: Dict[str, Any], new_messages, token_budget: int) -> List[Dict[str, Any]]:
+    messages = list(context.get("messages") or []) + list(new_messages or [])
+    pending, _window = split_by_token_budget(messages, token_budget)
+    return pending
+
+
+def fold_is_due(
+    context: Dict[str, Any],
+    new_messages: Optional[List[Dict[str, Any]]] = None,
+    token_budget: int = HISTORY_TOKEN_BUDGET,
+) -> bool:
+    """Whether fold_chat_summary() would fold now (SUMMARY_FOLD_BATCH messages left the window)."""
+    return len(_fold_candidates(context, new_messages, token_budget)) >= SUMMARY_FOLD_BATCH
+
+
+def fold_chat_summary(
+    client,
+    summary_table,
+    user_id: str,
+    chat_id,
+    context: Dict[str, Any],
+    new_messages: Optional[List[Dict[str, Any]]] = None,
+    token_budget: int = HISTORY_TOKEN_BUDGET,
+) -> bool:
+    """
+    Fold messages that fell out of the token window into the summary.
+
+    context is the result of load_chat_context() for this turn and new_messages
+    the items saved since (e.g. the user prompt and the reply). Nothing happens
+    until SUMMARY_FOLD_BATCH messages are waiting. Returns True if the summary
+    was updated. A concurrent fold of the same chat wins; this one is dropped.
+    """
+    pending = _fold_candidates(context, new_messages, token_budget)
+    if len(pending) < SUMMARY_FOLD_BATCH:
+        return False
+
+    summary = _summarize(client, context.get("summary", ""), pending)
+    if not summary:
+        return False
+
+    previous_covered_until = context.get("covered_until")
+    # update_item rather than put_item: the record also holds the chat's
+    # user_message_count (triptailor.chat_titles), which must survive a fold
+    kwargs = {
+        "Key": {CHAT_KEY_ATTRIBUTE: chat_key(user_id, chat_id)},
+        "UpdateExpression": (
+            "SET #summary = :summary, covered_until = :covered_until, "
+            "covered_messages = :covered_messages, updated_at = :updated_at"
+        ),
+        "ExpressionAttributeNames": {"#summary": "summary"},
+        "ExpressionAttributeValues": {
+            ":summary": summary,
+            ":covered_until": int(pending[-1]["timestamp"]),
+            ":covered_messages": int(context.get("covered_messages", 0)) + len(pending),
+            ":updated_at": int(time.time() * 1000),
+        },
+    }
+    if previous_covered_until is None:
+        kwargs["ConditionExpression"] = "attribute_not_exists(covered_until)"
+    else:
+        kwargs["ConditionExpression"] = "covered_until = :prev"
+        kwargs["ExpressionAttributeValues"][":prev"] = previous_covered_until
+    try:
+        summary_table.update_item(**kwargs)
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+    return True
+
+
+def delete_chat_summary(summary_table, user_id: str, chat_id) -> None:
+    summary_table.delete_item(Key={CHAT_KEY_ATTRIBUTE: chat_key(user_id, chat_id)})
+
+
+def summary_task_event(user_id: str, chat_id) -> Dict[str, Any]:
+    return {"task": SUMMARY_TASK, "user_id": user_id, "chat_id": str(chat_id)}
+
+
+def is_summary_task(event) -> bool:
+    return isinstance(event, dict) and event.get("task") == SUMMARY_TASK
+
+
+def run_summary_task(event, client, history_table, summary_table) -> bool:
+    """Fold the chat in a summary task event, reading it afresh. Returns True if the summary was updated."""
+    user_id, chat_id = event["user_id"], event["chat_id"]
+    context = load_chat_context(history_table, summary_table, user_id, chat_id)
+    return fold_chat_summary(client, summary_table, user_id, chat_id, context)
@@ -0,0 +1,182 @@
+"""Chat titles, generated off the request path.
+
+A chat gets a (new) title when its number of user messages reaches a power
+of four (1, 4, 16, ...). The count is an atomic counter on the chat's record
+in the ``chat-summary`` table (``user_message_count``), bumped once per saved
+user message, so a turn no longer re-reads the chat to count it.
+
+When the count calls for a title, the turn only dispatches a
+``{"task": "generate_chat_title", ...}`` event (triptailor.background_tasks)
+and returns; run_title_task() writes the title to ``user.chat_titles`` and
+the client picks it up from get_user_chats.
+"""
+import os
+from typing import Any, Dict, List
+
+from botocore.exceptions import ClientError
+
+from triptailor.chat_history import CHAT_KEY_ATTRIBUTE, chat_key, count_chat_messages, query_chat_messages
+from triptailor.chat_summary import get_chat_summary
+
+TITLE_TASK = "generate_chat_title"
+TITLE_MODEL = os.environ.get("TITLE_MODEL", "gpt-4o")
+TITLE_TRANSCRIPT_MESSAGES = 10
+
+def is_power_of_four(n: int) -> bool:
+    if n <= 0:
+        return False
+    while n % 4 == 0:
+        n //= 4
+    return n == 1
+
+
+def increment_user_message_count(counter_table, history_table, user_id: str, chat_id) -> int:
+    """
+    Atomically add one user message to the chat's counter and return the new count.
+
+    Chats that predate the counter are seeded once from chat-history (the
+    message just saved included).
+    """
+    key = {CHAT_KEY_ATTRIBUTE: chat_key(user_id, chat_id)}
+    try:
+        response = counter_table.update_item(
+            Key=key,
+            UpdateExpression="ADD user_message_count :one",
+            ConditionExpression="attribute_exists(user_message_count)",
+            ExpressionAttributeValues={":one": 1},
+            ReturnValues="UPDATED_NEW",
+        )
+        return int(response["Attributes"]["user_message_count"])
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+
+    count = count_chat_messages(history_table, user_id, chat_id, role="user")
+    try:
+        counter_table.update_item(
+            Key=key,
+            UpdateExpression="SET user_message_count = :count",
+            ConditionExpression="attribute_not_exists(user_message_count)",
+            ExpressionAttributeValues={":count": count},
+        )
+        return count
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+    # A concurrent turn seeded it first; count this message on top of that
+    return increment_user_message_count(counter_table, history_table, user_id, chat_id)
+
+
+def generate_chat_title(client, conversation_history: List[Dict[str, Any]]) -> str:
+    """Ask the LLM to generate a concise title based on the conversation.
+
+    Returns a string title (no prefixes/suffixes), or empty string on failure.
+    """
+    try:
+        transcript = "\n".join(
+            f"{m.get('role', 'assistant')}: {(m.get('content') or '')[:2000]}"
+            for m in conversation_history
+        )
+        title_completion = client.chat.completions.create(
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "You generate concise, human-readable chat titles. "
+                        "Return ONLY the title text. No prefixes, no quotes, no extra words."
+                    ),
+                },
+                {
+                    "role": "user",
+                    "content": (
+                        "Write a short 2-4 word title for this conversation. "
+                        "Use plain text only.\n\nConversation:\n" + transcript
+                    ),
+                },
+            ],
+            model=TITLE_MODEL,
+            max_tokens=24,
+        )
+        raw = title_completion.choices[0].message.content or ""
+        # Normalize by stripping whitespace and any accidental quotes/newlines
+        return raw.strip().strip('"').strip()[:120]
+    except Exception as e:
+        print(f"[chat_titles] Error generating title: {e}")
+        return ""
+
+
+def _chat_index(chat_id) -> int:
+    try:
+        return max(int(str(chat_id)) - 1, 0)
+    except ValueError:
+        return 0
+
+
+def upsert_chat_title(user_table, user_id: str, chat_id, title: str) -> bool:
+    """Persist title in user.chat_titles at index chat_id - 1."""
+    if not title:
+        return False
+    index = _chat_index(chat_id)
+    try:
+        # Usual case: the slot exists, so only that element is written
+        user_table.update_item(
+            Key={"user_id": user_id},
+            UpdateExpression=f"SET chat_titles[{index}] = :title",
+            ConditionExpression="size(chat_titles) > :index",
+            ExpressionAttributeValues={":title": title, ":index": index},
+        )
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            print(f"[chat_titles] Error saving title: {e}")
+            return False
+
+    # The list is missing or too short: pad it (rare, first titles only)
+    try:
+        titles = (user_table.get_item(Key={"user_id": user_id}).get("Item") or {}).get("chat_titles", []) or []
+        while len(titles) <= index:
+            titles.append("")
+        titles[index] = title
+        user_table.update_item(
+            Key={"user_id": user_id},
+            UpdateExpression="SET chat_titles = :titles",
+            ExpressionAttributeValues={":titles": titles},
+        )
+        return True
+    except ClientError as e:
+        print(f"[chat_titles] Error saving title: {e}")
+        return False
+
+
+def title_task_event(user_id: str, chat_id, user_message_count: int) -> Dict[str, Any]:
+    return {
+        "task": TITLE_TASK,
+        "user_id": user_id,
+        "chat_id": str(chat_id),
+        "user_message_count": user_message_count,
+    }
+
+
+def is_title_task(event) -> bool:
+    return isinstance(event, dict) and event.get("task") == TITLE_TASK
+
+
+def run_title_task(event, client, history_table, summary_table, user_table) -> str:
+    """Generate and store the title for the chat in a title task event. Returns the title or ''."""
+    user_id, chat_id = event["user_id"], event["chat_id"]
+    conversation = []
+    summary = get_chat_summary(summary_table, user_id, chat_id).get("summary")
+    if summary:
+        conversation.append({"role": "system", "content": f"Summary of earlier messages: {summary}"})
+    recent = query_chat_messages(
+        history_table, user_id, chat_id,
+        newest_first=True, limit=TITLE_TRANSCRIPT_MESSAGES, attributes=["role", "content"],
+    )
+    conversation.extend(reversed(recent))
+
+    title = generate_chat_title(client, conversation)
+    if title and upsert_chat_title(user_table, user_id, chat_id, title):
+        print(f"[chat_titles] Title for chat {chat_id} after {event.get('user_message_count')} messages: {title}")
+        return title
+    return ""
+
@@ -0,0 +1,180 @@
+"""
+Module-scope clients shared across invocations of a warm Lambda container.
+
+Everything here is created once per container and reused, so warm
+invocations skip the TCP + TLS handshake to Amadeus, OpenAI and DynamoDB:
+
+  - http_session(name): a requests.Session with a keep-alive connection pool.
+    Every response gets a ``connection_reused`` attribute, and
+    connection_stats() returns per-host request / new-connection counters.
+    Its optional ``before_request(method, url)`` hook runs before each
+    request (amadeus_limits uses it for rate limiting).
+  - openai_client(): one OpenAI client (and its httpx pool) per API key.
+  - dynamodb_resource(): boto3 resource with BOTO_CONFIG (bigger pool,
+    adaptive retries, TCP keep-alive).
+  - lambda_client(): boto3 Lambda client, for async self-invocations.
+
+requests is imported on the first http_session() call: the DynamoDB-only
+lambdas (chat_management, user_management) ship layers without it.
+
+Set HTTP_LOG_CONNECTIONS=true to print one line per outgoing request with
+its reuse status.
+
+All of these clients are instrumented by triptailor.tracing, so every call
+they make shows up as a span in the invocation's metrics record.
+"""
+import os
+import threading
+from urllib.parse import urlsplit
+
+import boto3
+from botocore.config import Config
+
+from triptailor.tracing import instrument_boto_client, instrument_openai_client, span
+
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "16"))
+HTTP_LOG_CONNECTIONS = os.environ.get("HTTP_LOG_CONNECTIONS", "false").lower() == "true"
+
+BOTO_CONFIG = Config(
+    max_pool_connections=int(os.environ.get("BOTO_POOL_SIZE", "25")),
+    retries={"mode": "adaptive", "max_attempts": int(os.environ.get("BOTO_MAX_ATTEMPTS", "4"))},
+    connect_timeout=3,
+    read_timeout=10,
+    tcp_keepalive=True,
+)
+
+_lock = threading.Lock()
+_sessions = {}
+_openai_clients = {}
+_resources = {}
+_boto_clients = {}
+_stats = {}
+_session_class = None
+
+
+def _pooled_session_class():
+    """Define PooledSession on first use, so importing this module does not need requests."""
+    global _session_class
+    if _session_class is not None:
+        return _session_class
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    class _ReuseTrackingAdapter(HTTPAdapter):
+        """HTTPAdapter that marks each response with whether its connection was reused."""
+
+        def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+            try:
+                pool = self.get_connection_with_tls_context(request, verify, proxies=proxies, cert=cert)
+                opened_before = pool.num_connections
+            except Exception:
+                pool, opened_before = None, None
+            response = super().send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+            # Under concurrency another thread may open a connection in between,
+            # so this can under-report reuse; it never over-reports it.
+            response.connection_reused = pool is not None and pool.num_connections == opened_before
+            return response
+
+    class PooledSession(requests.Session):
+        """requests.Session with a keep-alive pool that records connection reuse per host."""
+
+        def __init__(self, name, pool_size=HTTP_POOL_SIZE):
+            super().__init__()
+            self.name = name
+            self.before_request = None
+            adapter = _ReuseTrackingAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self.mount("https://", adapter)
+            self.mount("http://", adapter)
+
+        def request(self, method, url, *args, **kwargs):
+            if self.before_request is not None:
+                self.before_request(method, url)
+            host = urlsplit(url).netloc
+            with span(f"http.{self.name}", host=host, method=method.upper()) as current:
+                response = super().request(method, url, *args, **kwargs)
+                reused = getattr(response, "connection_reused", False)
+                size = response.headers.get("Content-Length") if kwargs.get("stream") else len(response.content or b"")
+                current.set(status=response.status_code, bytes=int(size or 0), reused=reused)
+            _record(self.name, host, reused)
+            if HTTP_LOG_CONNECTIONS:
+                print(f"[http:{self.name}] {method.upper()} {host} status={response.status_code} reused={reused}")
+            return response
+
+    _session_class = PooledSession
+    return _session_class
+
+
+def _record(name, host, reused):
+    with _lock:
+        entry = _stats.setdefault((name, host), {"requests": 0, "reused": 0, "new_connections": 0})
+        entry["requests"] += 1
+        entry["reused" if reused else "new_connections"] += 1
+
+
+def http_session(name="default"):
+    """Return the container-wide pooled session for ``name`` (e.g. "amadeus")."""
+    session = _sessions.get(name)
+    if session is None:
+        with _lock:
+            session = _sessions.get(name)
+            if session is None:
+                session = _sessions[name] = _pooled_session_class()(name)
+    return session
+
+
+def connection_stats():
+    """Per (session, host) request counters since the container started."""
+    with _lock:
+        return {f"{name}:{host}": dict(entry) for (name, host), entry in _stats.items()}
+
+
+def openai_client(api_key=None):
+    """Return the container-wide OpenAI client for ``api_key`` (defaults to OPENAI_API_KEY)."""
+    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    client = _openai_clients.get(api_key)
+    if client is None:
+        from openai import OpenAI
+
+        with _lock:
+            client = _openai_clients.get(api_key)
+            if client is None:
+                client = OpenAI(
+                    api_key=api_key,
+                    timeout=float(os.environ.get("OPENAI_TIMEOUT", "60")),
+                    max_retries=int(os.environ.get("OPENAI_MAX_RETRIES", "2")),
+                )
+                instrument_openai_client(client)
+                _openai_clients[api_key] = client
+    return client
+
+
+def dynamodb_resource(region_name=None):
+    """Return the container-wide DynamoDB resource (tuned with BOTO_CONFIG)."""
+    resource = _resources.get(region_name)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(region_name)
+            if resource is None:
+                kwargs = {"config": BOTO_CONFIG}
+                if region_name:
+                    kwargs["region_name"] = region_name
+                resource = boto3.resource("dynamodb", **kwargs)
+                instrument_boto_client(resource.meta.client)
+                _resources[region_name] = resource
+    return resource
+
+
+def lambda_client(region_name=None):
+    """Return the container-wide Lambda client (tuned with BOTO_CONFIG)."""
+    client = _boto_clients.get(("lambda", region_name))
+    if client is None:
+        with _lock:
+            client = _boto_clients.get(("lambda", region_name))
+            if client is None:
+                kwargs = {"config": BOTO_CONFIG}
+                if region_name:
+                    kwargs["region_name"] = region_name
+                client = boto3.client("lambda", **kwargs)
+                instrument_boto_client(client)
+                _boto_clients[("lambda", region_name)] = client
+    return client
@@ -0,0 +1,322 @@
+"""Rule-based resolution of the dates a user writes in a chat message.
+
+handle_chat runs resolve_dates() over the user prompt before the first
+completion and puts the results in the prompt, so "in two weeks", "mid-March",
+"the 15th", "Dec 7-10" or "next long weekend" reach the model as ISO dates
+and don't cost a parse_relative_date round trip.
+
+The grammar is the _RULES table: one precompiled pattern per phrase family
+and the function that turns a match into a date or date range. Every rule is
+run over the text; where matches overlap, the one that starts first wins, and
+between matches that start together the longer one ("15th of March" over
+"15th"). Dates without a year resolve to their next occurrence.
+
+Long weekends come from the US federal holidays (observed dates) that make a
+three- or four-day weekend; see _long_weekends().
+"""
+import calendar
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+_WEEKDAYS = {
+    "monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3,
+    "friday": 4, "saturday": 5, "sunday": 6,
+}
+_NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "couple": 2, "couple of": 2, "few": 3,
+}
+
+
+def _month(name: str) -> str:
+    return (rf"(?P<{name}>jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+            rf"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?")
+
+
+_DAY = r"(?P<{}>[0-3]?\d)(?:st|nd|rd|th)?"
+_YEAR = r"(?:,?\s+(?P<year>20\d\d))?"
+_NUMBER = r"(?P<n>\d{1,3}|an?|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|couple(?: of)?|few)"
+_RANGE_SEP = r"\s*(?:-|–|—|to|until|till|through|thru)\s*"
+_WEEKDAY = r"(?P<weekday>monday|tuesday|wednesday|thursday|friday|saturday|sunday)"
+
+Resolved = Tuple[Optional[date], Optional[date], Optional[str]]  # (start, end, note)
+
+
+# ===== Date helpers =====
+def _month_number(token: str) -> int:
+    return _MONTHS[token[:3].lower()]
+
+
+def _number(token: str) -> int:
+    token = token.lower()
+    return int(token) if token.isdigit() else _NUMBER_WORDS[token]
+
+
+def _last_day(year: int, month: int) -> int:
+    return calendar.monthrange(year, month)[1]
+
+
+def _add_months(day: date, months: int) -> date:
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(day.day, _last_day(year, month)))
+
+
+def _upcoming(month: int, day: int, today: date, year: Optional[str] = None) -> date:
+    """month/day in the given year, or its next occurrence from today."""
+    if year:
+        return date(int(year), month, day)
+    candidate = date(today.year, month, day) if day <= _last_day(today.year, month) else None
+    if candidate is None or candidate < today:
+        candidate = date(today.year + 1, month, day)
+    return candidate
+
+
+def _upcoming_weekday(weekday: int, today: date, include_today: bool = False) -> date:
+    days_ahead = (weekday - today.weekday()) % 7
+    if days_ahead == 0 and not include_today:
+        days_ahead = 7
+    return today + timedelta(days=days_ahead)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """n-th (1-based; -1 = last) given weekday of a month."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year, month, _last_day(year, month))
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(day: date) -> date:
+    """Fixed-date holidays on a weekend are observed on the Friday / Monday."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def _long_weekends(year: int) -> List[Tuple[date, date]]:
+    holidays = [
+        _observed(date(year, 1, 1)),            # New Year's Day
+        _nth_weekday(year, 1, 0, 3),            # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),            # Presidents' Day
+        _nth_weekday(year, 5, 0, -1),           # Memorial Day
+        _observed(date(year, 6, 19)),           # Juneteenth
+        _observed(date(year, 7, 4)),            # Independence Day
+        _nth_weekday(year, 9, 0, 1),            # Labor Day
+        _nth_weekday(year, 10, 0, 2),           # Columbus Day
+        _observed(date(year, 11, 11)),          # Veterans Day
+        _observed(date(year, 12, 25)),          # Christmas Day
+    ]
+    weekends = []
+    for holiday in holidays:
+        if holiday.weekday() == 0:
+            weekends.append((holiday - timedelta(days=2), holiday))
+        elif holiday.weekday() == 4:
+            weekends.append((holiday, holiday + timedelta(days=2)))
+    thanksgiving = _nth_weekday(year, 11, 3, 4)
+    weekends.append((thanksgiving, thanksgiving + timedelta(days=3)))
+    return sorted(weekends)
+
+
+# ===== Rule handlers: (match, today) -> (start, end, note) =====
+def _month_day_range(m, today) -> Resolved:
+    start_month = _month_number(m["m1"])
+    start = _upcoming(start_month, int(m["d1"]), today, m["year"])
+    end_month = _month_number(m["m2"]) if m["m2"] else start_month
+    end = date(start.year, end_month, int(m["d2"]))
+    if end < start:
+        end = _add_months(end, 12) if m["m2"] else _add_months(end, 1)
+    return start, end, None
+
+
+def _day_range_month(m, today) -> Resolved:
+    month = _month_number(m["m1"])
+    start = _upcoming(month, int(m["d1"]), today, m["year"])
+    return start, date(start.year, month, int(m["d2"])), None
+
+
+def _month_day(m, today) -> Resolved:
+    return _upcoming(_month_number(m["m1"]), int(m["d1"]), today, m["year"]), None, None
+
+
+_MONTH_PARTS = {"early": (1, 10), "beginning": (1, 10), "start": (1, 10), "mid": (11, 20), "middle": (11, 20),
+                "late": (21, 31), "end": (21, 31)}
+
+
+def _month_part(m, today) -> Resolved:
+    month = _month_number(m["m1"])
+    first, last = _MONTH_PARTS[m["part"].lower()]
+    year = int(m["year"]) if m["year"] else today.year
+    end = date(year, month, min(last, _last_day(year, month)))
+    if not m["year"] and end < today:
+        year += 1
+        end = date(year, month, min(last, _last_day(year, month)))
+    return date(year, month, first), end, "approximate"
+
+
+def _whole_month(m, today) -> Resolved:
+    month = _month_number(m["m1"])
+    year = int(m["year"]) if m["year"] else (today.year if month >= today.month else today.year + 1)
+    return date(year, month, 1), date(year, month, _last_day(year, month)), None
+
+
+def _day_of_month(m, today) -> Resolved:
+    day = int(m["d1"])
+    if not 1 <= day <= 31:
+        return None, None, None
+    candidate = date(today.year, today.month, 1)
+    for _ in range(12):
+        if day <= _last_day(candidate.year, candidate.month):
+            target = candidate.replace(day=day)
+            if target >= today:
+                return target, None, None
+        candidate = _add_months(candidate, 1)
+    return None, None, None
+
+
+_UNIT_DAYS = {"day": 1, "week": 7, "fortnight": 14}
+
+
+def _offset(m, today) -> Resolved:
+    count, unit = _number(m["n"]), m["unit"].lower()
+    if unit == "month":
+        return _add_months(today, count), None, None
+    return today + timedelta(days=count * _UNIT_DAYS[unit]), None, None
+
+
+def _named_day(m, today) -> Resolved:
+    word = m["word"].lower()
+    if word == "day after tomorrow":
+        return today + timedelta(days=2), None, None
+    return today + timedelta(days=1 if word == "tomorrow" else 0), None, None
+
+
+def _weekday(m, today) -> Resolved:
+    weekday = _WEEKDAYS[m["weekday"].lower()]
+    if (m["which"] or "").lower() == "this":
+        days_ahead = weekday - today.weekday()
+        if days_ahead < 0:
+            name = m["weekday"].capitalize()
+            return None, None, f"This {name} has already passed. Did you mean next {name}?"
+        return today + timedelta(days=days_ahead), None, None
+    return _upcoming_weekday(weekday, today), None, None
+
+
+def _weekend(m, today) -> Resolved:
+    which = (m["which"] or "").lower()
+    if today.weekday() >= 5 and which != "next":
+        return today, today + timedelta(days=6 - today.weekday()), None
+    saturday = _upcoming_weekday(5, today)
+    return saturday, saturday + timedelta(days=1), None
+
+
+def _long_weekend(m, today) -> Resolved:
+    for start, end in _long_weekends(today.year) + _long_weekends(today.year + 1):
+        if start > today:
+            return start, end, None
+    return None, None, None
+
+
+def _relative_period(m, today) -> Resolved:
+    which, period = m["which"].lower(), m["period"].lower()
+    if period == "week":
+        monday = today - timedelta(days=today.weekday())
+        if which == "next":
+            monday += timedelta(days=7)
+        return (max(monday, today) if which == "this" else monday), monday + timedelta(days=6), None
+    first = date(today.year, today.month, 1)
+    if which == "next":
+        first = _add_months(first, 1)
+    last = date(first.year, first.month, _last_day(first.year, first.month))
+    return (today if which == "this" else first), last, None
+
+
+_RULES: List[Tuple[str, Callable[[Any, date], Resolved]]] = [
+    (rf"{_month('m1')}\s+{_DAY.format('d1')}{_RANGE_SEP}(?:{_month('m2')}\s+)?{_DAY.format('d2')}{_YEAR}",
+     _month_day_range),
+    # "on the" as in the day-of-month rule below, which would otherwise start first and win
+    (rf"(?:(?:on\s+)?the\s+)?{_DAY.format('d1')}{_RANGE_SEP}(?:the\s+)?{_DAY.format('d2')}\s+(?:of\s+)?{_month('m1')}{_YEAR}",
+     _day_range_month),
+    (rf"{_month('m1')}\s+(?:the\s+)?{_DAY.format('d1')}{_YEAR}", _month_day),
+    (rf"(?:(?:on\s+)?the\s+)?{_DAY.format('d1')}\s+(?:of\s+)?{_month('m1')}{_YEAR}", _month_day),
+    (rf"(?P<part>early|mid|middle|late|beginning|start|end)(?:\s*-\s*|\s+of\s+|\s+)(?:the\s+month\s+of\s+)?"
+     rf"{_month('m1')}{_YEAR}", _month_part),
+    (rf"(?:in|during|throughout)\s+{_month('m1')}{_YEAR}", _whole_month),
+    (r"(?:on\s+)?the\s+(?P<d1>[0-3]?\d)(?:st|nd|rd|th)", _day_of_month),
+    (rf"(?:in|within)\s+(?:a\s+)?{_NUMBER}\s+(?P<unit>day|week|fortnight|month)s?", _offset),
+    (rf"{_NUMBER}\s+(?P<unit>day|week|fortnight|month)s?\s+from\s+(?:now|today)", _offset),
+    (r"(?P<word>day after tomorrow|today|tonight|tomorrow)", _named_day),
+    (r"(?:(?P<which>next|this|the)\s+)?long\s+weekend", _long_weekend),
+    (r"(?:(?P<which>next|this|the|coming)\s+)?weekend", _weekend),
+    (r"(?P<which>next|this)\s+(?P<period>week|month)", _relative_period),
+    (rf"(?:(?P<which>next|this|coming|on)\s+)?{_WEEKDAY}", _weekday),
+]
+_COMPILED_RULES = [(re.compile(rf"\b{pattern}\b", re.IGNORECASE), handler) for pattern, handler in _RULES]
+
+
+def resolve_dates(text: str, today: Optional[date] = None) -> List[Dict[str, Any]]:
+    """
+    Find and resolve the date expressions in text.
+
+    Returns one dict per expression, in text order: {"text", "start", "end",
+    "note"} with ISO dates; end is set for ranges, note for approximate or
+    unresolvable expressions (start None).
+    """
+    if not text:
+        return []
+    today = today or datetime.now(timezone.utc).date()
+
+    candidates = []
+    for order, (pattern, handler) in enumerate(_COMPILED_RULES):
+        for match in pattern.finditer(text):
+            candidates.append((match.start(), -(match.end() - match.start()), order, match, handler))
+    candidates.sort(key=lambda c: c[:3])
+
+    mentions = []
+    covered_until = 0
+    for start, _neg_length, _order, match, handler in candidates:
+        if start < covered_until:
+            continue
+        try:
+            first, last, note = handler(match, today)
+        except (ValueError, KeyError):
+            continue  # e.g. "Feb 30"
+        if first is None and note is None:
+            continue
+        covered_until = match.end()
+        mentions.append({
+            "text": match.group(0).strip(),
+            "start": first.isoformat() if first else None,
+            "end": last.isoformat() if last and last != first else None,
+            "note": note,
+        })
+    return mentions
+
+
+def resolve_date_expression(expression: str, today: Optional[date] = None) -> Optional[Dict[str, Any]]:
+    """Resolve a single expression (the first one found in it), or None."""
+    mentions = resolve_dates(expression, today)
+    return mentions[0] if mentions else None
+
+
+def describe_mention(mention: Dict[str, Any]) -> str:
+    """One prompt line for a resolved mention."""
+    if not mention["start"]:
+        return f"'{mention['text']}': {mention['note']}"
+    start = date.fromisoformat(mention["start"])
+    line = f"'{mention['text']}' = {mention['start']} ({start.strftime('%A')})"
+    if mention["end"]:
+        end = date.fromisoformat(mention["end"])
+        line = f"'{mention['text']}' = {mention['start']} ({start.strftime('%A')}) to {mention['end']} ({end.strftime('%A')})"
+    if mention["note"]:
+        line += f" [{mention['note']}]"
+    return line
@@ -0,0 +1,169 @@
+"""
+Flight search against the Amadeus flight-offers API.
+
+Used as a library by handle_chat (in-process tool dispatch) and by the
+search_flights lambda, which is a thin HTTP wrapper around search_flights().
+
+Results are cached by normalized query (triptailor.search_cache): fresh for
+FLIGHT_CACHE_TTL seconds, then served stale for up to FLIGHT_CACHE_STALE_TTL
+more seconds while a background refresh runs.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+import os
+from triptailor.amadeus_auth import get_amadeus_token
+from triptailor.batch_writes import persist_new_items
+from triptailor.amadeus_http import amadeus_session
+from triptailor.json_codec import response_json
+from triptailor.latest_offers import FLIGHTS_LATEST_TABLE
+from triptailor.search_cache import SearchCache, normalize_flight_params
+
+# Pooled keep-alive session, reused across warm invocations (rate limited and retried: triptailor.amadeus_http)
+amadeus = amadeus_session()
+
+FLIGHT_OFFERS_URL = "https://test.api.amadeus.com/v2/shopping/flight-offers"
+
+flight_search_cache = SearchCache(
+    "flight_search",
+    ttl=int(os.environ.get("FLIGHT_CACHE_TTL", "300")),
+    stale_ttl=int(os.environ.get("FLIGHT_CACHE_STALE_TTL", "900")),
+)
+
+
+def generate_flight_id(flight_offer):
+    """
+    Generate a unique flight ID that considers all itineraries and key differentiating factors.
+    """
+    # Include the Amadeus flight offer ID as a base identifier
+    amadeus_id = flight_offer.get("id", "")
+    
+    # Build signature from all itineraries (outbound + return)
+    itinerary_signatures = []
+    
+    for i, itinerary in enumerate(flight_offer.get("itineraries", [])):
+        itinerary_segments = []
+        for seg in itinerary.get("segments", []):
+            # Include more detailed segment information
+            segment_sig = (
+                f"{seg.get('departure', {}).get('iataCode', '')}-"
+                f"{seg.get('arrival', {}).get('iataCode', '')}-"
+                f"{seg.get('departure', {}).get('at', '')}-"
+                f"{seg.get('arrival', {}).get('at', '')}-"
+                f"{seg.get('carrierCode', '')}-"
+                f"{seg.get('number', '')}-"
+                f"{seg.get('id', '')}-"
+                f"{seg.get('duration', '')}"
+            )
+            itinerary_segments.append(segment_sig)
+        
+        # Add itinerary duration and segment count
+        itinerary_sig = f"ITIN_{i}:{itinerary.get('duration', '')}:{len(itinerary_segments)}:{'|'.join(itinerary_segments)}"
+        itinerary_signatures.append(itinerary_sig)
+    
+    # Include pricing information for additional uniqueness
+    price_info = ""
+    if "price" in flight_offer:
+        price = flight_offer["price"]
+        price_info = f"PRICE:{price.get('total', '')}:{price.get('currency', '')}:{price.get('base', '')}"
+    
+    # Include fare class information from travelerPricings
+    fare_classes = []
+    for traveler in flight_offer.get("travelerPricings", []):
+        for fare_detail in traveler.get("fareDetailsBySegment", []):
+            fare_classes.append(f"{fare_detail.get('class', '')}:{fare_detail.get('fareBasis', '')}")
+    
+    fare_info = f"FARES:{'|'.join(fare_classes)}" if fare_classes else ""
+    
+    # Combine all elements for final signature
+    signature_parts = [
+        f"AMADEUS_ID:{amadeus_id}",
+        f"ITINERARIES:{len(itinerary_signatures)}",
+        *itinerary_signatures,
+        price_info,
+        fare_info
+    ]
+    
+    final_signature = "||".join(filter(None, signature_parts))
+    
+    return hashlib.sha256(final_signature.encode()).hexdigest()
+
+
+def flight_item(flight_id, flight_details, now_ms):
+    return {
+        'flightId': flight_id,
+        'timestamp': now_ms,
+        'flightDetails': flight_details,
+        'departureTime': convert_date_from_str_to_epoch(flight_details["itineraries"][0]["segments"][0]["departure"]["at"]),
+    }
+
+
+def save_flight_offers(flight_offers):
+    """
+    Compute the IDs of all offers and store the ones not in Flights yet (and in its latest-version
+    projection; batched, see triptailor.batch_writes). Returns the IDs in offer order.
+    """
+    now_ms = int(time.time() * 1000)
+    out_ids, items = [], {}
+    for i, flight in enumerate(flight_offers):
+        try:
+            flight_id = generate_flight_id(flight)
+            item = flight_item(flight_id, flight, now_ms)
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            print(f"Flight {i+1}: Failed to save ({str(e)})")
+            continue
+        if flight_id not in items:
+            out_ids.append(flight_id)
+            items[flight_id] = item
+    persist_new_items('Flights', 'flightId', items, latest_table=FLIGHTS_LATEST_TABLE)
+    return out_ids
+
+
+def convert_date_from_str_to_epoch(date_str):
+    departure_dt = datetime.fromisoformat(date_str)
+
+    # Ensure it's in UTC. If it's not timezone-aware, assume it's UTC:
+    if departure_dt.tzinfo is None:
+        departure_dt = departure_dt.replace(tzinfo=timezone.utc)
+
+    # Convert to Unix timestamp (seconds) and add 1 day (24 hours)
+    return int(departure_dt.timestamp()) + 86400
+
+
+def search_flights(params):
+    """
+    Search flight offers for the given search_flights tool parameters.
+
+    Saves every offer to the Flights table and returns the Amadeus response
+    with the saved TripTailor IDs under 'flightIds'. Repeated searches for the
+    same normalized query are served from flight_search_cache. Raises
+    requests.HTTPError when Amadeus rejects the search.
+    """
+    return flight_search_cache.get_or_fetch(normalize_flight_params(params), fetch_flight_offers)
+
+
+def fetch_flight_offers(amadeus_params):
+    """Call the Amadeus flight-offers API with already-normalized params and save the offers."""
+    token = get_amadeus_token()
+
+    amadeus_headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json"
+    }
+
+    # Make request to Amadeus API
+    response = amadeus.get(
+        FLIGHT_OFFERS_URL,
+        headers=amadeus_headers,
+        params=amadeus_params
+    )
+
+    if response.status_code != 200:
+        print(f"Amadeus error: {response.text}")
+        
+    response.raise_for_status()
+    amadeus_data = response_json(response)  # floats as Decimal, ready for DynamoDB
+    
+    # Save flight details to DynamoDB and collect IDs
+    amadeus_data['flightIds'] = save_flight_offers(amadeus_data.get('data', []))
+    return amadeus_data
@@ -0,0 +1,175 @@
+"""
+Hotel search against the Amadeus hotel list + hotel-offers APIs.
+
+Used as a library by handle_chat (in-process tool dispatch) and by the
+search_hotels lambda, which is a thin HTTP wrapper around search_hotels().
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from triptailor.amadeus_auth import get_amadeus_token
+from triptailor.batch_writes import persist_new_items
+from triptailor.amadeus_http import amadeus_session
+from triptailor.json_codec import response_json
+from triptailor.latest_offers import HOTELS_LATEST_TABLE
+
+# Pooled keep-alive session, reused across warm invocations (rate limited and retried: triptailor.amadeus_http)
+amadeus = amadeus_session()
+
+# ===== Amadeus =====
+HOTELS_BY_CITY_URL = "https://test.api.amadeus.com/v1/reference-data/locations/hotels/by-city"
+HOTEL_OFFERS_URL   = "https://test.api.amadeus.com/v3/shopping/hotel-offers"
+
+# ===== Utilities =====
+def http_get(url, headers=None, params=None, timeout=None):
+    r = amadeus.get(url, headers=headers, params=params, timeout=timeout)
+    r.raise_for_status()
+    return r
+
+def http_post(url, headers=None, data=None, json_body=None, timeout=None):
+    r = amadeus.post(url, headers=headers, data=data, json=json_body, timeout=timeout)
+    r.raise_for_status()
+    return r
+
+def generate_hotel_offers_id(hotel_item):
+    hotel_id = hotel_item.get("hotel", {}).get("hotelId", "")
+    offer_ids = [o.get("id", "") for o in hotel_item.get("offers", []) if o.get("id")]
+    if offer_ids:
+        signature = hotel_id + "|" + "|".join(offer_ids)
+    else:
+        parts = [hotel_id]
+        for o in hotel_item.get("offers", []):
+            parts.append(f"{o.get('checkInDate','')}-{o.get('checkOutDate','')}-{o.get('price',{}).get('total','')}")
+        signature = "|".join(parts)
+    return hashlib.sha256(signature.encode()).hexdigest()
+
+def convert_date_yyyy_mm_dd_to_epoch(date_str):
+    """Convert date string to epoch timestamp with 24-hour buffer for TTL"""
+    dt = datetime.fromisoformat(date_str)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    # Add 24 hours (86400 seconds) buffer like flights
+    return int(dt.timestamp()) + 86400
+
+def get_checkout_ttl_from_hotel_offers(hotel_item):
+    """Extract the latest checkout date from hotel offers and convert to TTL timestamp"""
+    try:
+        latest_checkout = None
+        
+        # Check offers for checkout dates
+        for offer in hotel_item.get("offers", []):
+            checkout_date = offer.get('checkOutDate')
+            if checkout_date:
+                if latest_checkout is None or checkout_date > latest_checkout:
+                    latest_checkout = checkout_date
+        
+        # If we found a checkout date, convert it to TTL timestamp
+        if latest_checkout:
+            return convert_date_yyyy_mm_dd_to_epoch(latest_checkout)
+        
+        # Fallback: if no checkout date found, set TTL to 30 days from now
+        return int(time.time()) + (30 * 24 * 60 * 60)  # 30 days
+        
+    except Exception as e:
+        print(f"Error calculating checkout TTL: {e}")
+        # Fallback: 30 days from now
+        return int(time.time()) + (30 * 24 * 60 * 60)
+
+# ===== Persistence =====
+def hotel_item(hotel_offer_id, hotel, now_ms):
+    return {
+        'hotelOfferId': hotel_offer_id,
+        'timestamp': now_ms,
+        'hotelOffersDetails': hotel,  # parsed with Decimal numbers, stored as-is
+        'checkoutTTL': get_checkout_ttl_from_hotel_offers(hotel),  # TTL attribute
+    }
+
+def save_hotel_offers(hotel_items):
+    """
+    Compute the IDs of all hotels and store the ones not in Hotels yet (and in its latest-version
+    projection; batched, see triptailor.batch_writes). Returns the IDs in response order.
+    """
+    now_ms = int(time.time() * 1000)
+    out_ids, items = [], {}
+    for hotel in hotel_items:
+        hotel_offer_id = generate_hotel_offers_id(hotel)
+        if hotel_offer_id not in items:
+            out_ids.append(hotel_offer_id)
+            items[hotel_offer_id] = hotel_item(hotel_offer_id, hotel, now_ms)
+    persist_new_items('Hotels', 'hotelOfferId', items, latest_table=HOTELS_LATEST_TABLE)
+    return out_ids
+
+# Removed add_hotel_to_user_if_not_seen as UserHotelViews table is not used elsewhere
+
+# ===== Search =====
+def search_hotels(params):
+    """
+    Search hotel offers for the given search_hotels tool parameters.
+
+    Saves every hotel to the Hotels table and returns the Amadeus offers
+    response with the saved TripTailor IDs under 'hotelOfferIds'. Raises
+    ValueError for missing cityCode and requests exceptions for upstream errors.
+    """
+    token = get_amadeus_token()
+    amadeus_headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json"
+    }
+
+    # -------- 1) List hotels by city --------
+    city_code = params.get("cityCode")
+    if not city_code:
+        raise ValueError("cityCode is required")
+
+    # הפרמטרים רשות בשלב זה (אפשר להרחיב שימוש בהם בהמשך)
+    max_results = int(params.get("max", 6))
+    hotel_list_query = {"cityCode": city_code}
+    r1 = http_get(HOTELS_BY_CITY_URL, headers=amadeus_headers, params=hotel_list_query)
+    hotels_list = r1.json().get("data", [])
+    hotel_ids = [h.get("hotelId") for h in hotels_list if h.get("hotelId")]
+    if not hotel_ids:
+        return {"data": []}
+
+    hotel_ids = hotel_ids[:max_results]
+
+    # -------- 2) Get offers for those hotels --------
+    check_in   = params.get("checkInDate")
+    check_out  = params.get("checkOutDate")
+    adults     = int(params.get("adults", 1))
+    room_qty   = int(params.get("roomQuantity", 1))
+    currency   = params.get("currencyCode")  # אם ה-API שלך מקבל currencyCode או currency – השאר כפי שעבד לך
+
+    hotels_offers_query = {
+        "hotelIds": ",".join(hotel_ids),
+        "checkInDate": check_in,
+        "checkOutDate": check_out,
+        "adults": adults,
+        "roomQuantity": room_qty
+    }
+    if currency:
+        # אם כבר עבד לך עם 'currency' שמור; אם צריך 'currencyCode' – החלף כאן.
+        hotels_offers_query["currency"] = currency
+
+    r2 = http_get(HOTEL_OFFERS_URL, headers=amadeus_headers, params=hotels_offers_query)
+    offers = response_json(r2)  # floats as Decimal, ready for DynamoDB
+
+    # -------- Optional local filter by maxPrice --------
+    max_price = params.get("maxPrice")
+    if max_price is not None:
+        try:
+            max_price_val = float(max_price)
+            data = offers.get("data", [])
+            filtered = []
+            for item in data:
+                first_offer = (item.get("offers") or [{}])[0]
+                total_str = first_offer.get("price", {}).get("total")
+                total_val = float(total_str) if total_str is not None else None
+                if total_val is None or total_val <= max_price_val:
+                    filtered.append(item)
+            offers["data"] = filtered
+        except Exception as e:
+            print("maxPrice filter failed:", e)
+
+    # -------- Persist --------
+    offers['hotelOfferIds'] = save_hotel_offers(offers.get('data', []))
+    return offers
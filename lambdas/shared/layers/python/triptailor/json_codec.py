@@ -0,0 +1,41 @@
+"""
+JSON codec that goes straight between JSON text and DynamoDB-ready values.
+
+  - loads() / response_json() parse floats as Decimal, so an Amadeus response
+    can be written to DynamoDB as-is (no float -> Decimal walk, no copy).
+  - dumps() serializes DynamoDB items (Decimal numbers, sets) directly; the
+    encoder converts each Decimal as it is written instead of building a
+    converted copy of the whole tree first.
+
+Whole Decimals are written as ints, others as floats, which is what the old
+decimal_to_native / convert_decimals helpers produced.
+"""
+import json
+from decimal import Decimal
+from typing import Any
+
+
+class DecimalEncoder(json.JSONEncoder):
+    """json.JSONEncoder that also accepts Decimal and set values."""
+
+    def default(self, o):
+        if isinstance(o, Decimal):
+            return int(o) if o == o.to_integral_value() else float(o)
+        if isinstance(o, (set, frozenset)):
+            return sorted(o) if all(isinstance(v, str) for v in o) else list(o)
+        return super().default(o)
+
+
+def dumps(value: Any, **kwargs) -> str:
+    """json.dumps() for values that may contain Decimals (e.g. DynamoDB items)."""
+    return json.dumps(value, cls=DecimalEncoder, **kwargs)
+
+
+def loads(text) -> Any:
+    """json.loads() with floats parsed as Decimal, ready to be written to DynamoDB."""
+    return json.loads(text, parse_float=Decimal)
+
+
+def response_json(response) -> Any:
+    """Body of a requests.Response parsed with loads() (instead of response.json())."""
+    return loads(response.content)
@@ -0,0 +1,189 @@
+"""
+"Latest version" projection of the Flights / Hotels offer tables.
+
+Flights and Hotels are keyed by ID + timestamp, so reading the newest
+version of an offer takes a Query per ID. The projection tables
+(FLIGHTS_LATEST_TABLE / HOTELS_LATEST_TABLE) hold a copy of the newest item
+keyed by the ID alone, so a set of offers (flights and hotels together) can
+be read with BatchGetItem (100 keys per request).
+
+  - Writers: batch_writes.persist_new_items(..., latest_table=...) for search
+    results, put_latest() after a booking changes an offer.
+  - Readers: batch_get_latest_many() / batch_get_latest() / get_latest(). IDs the projection does not
+    have yet (offers stored before it existed, or a failed projection write)
+    are read with the old Query and written back to the projection.
+  - OfferLoader: a request-scoped identity map over batch_get_latest_many(),
+    for handlers that need the same offers in several places.
+
+The items are copied as-is, so enable TTL on the same attributes as the
+source tables (departureTime / checkoutTTL).
+"""
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from triptailor.batch_writes import BATCH_WRITE_WORKERS, batch_write_items, chunked
+from triptailor.clients import dynamodb_resource
+
+FLIGHTS_LATEST_TABLE = os.environ.get("FLIGHTS_LATEST_TABLE", "FlightsLatest")
+HOTELS_LATEST_TABLE = os.environ.get("HOTELS_LATEST_TABLE", "HotelsLatest")
+BATCH_GET_SIZE = 100  # DynamoDB limit per BatchGetItem
+BATCH_GET_MAX_ATTEMPTS = 5
+
+_fallback_executor = ThreadPoolExecutor(max_workers=BATCH_WRITE_WORKERS, thread_name_prefix="latest-fallback")
+
+# kind -> (source table, ID attribute, projection table)
+OFFER_TABLES = {
+    "flight": ("Flights", "flightId", FLIGHTS_LATEST_TABLE),
+    "hotel": ("Hotels", "hotelOfferId", HOTELS_LATEST_TABLE),
+}
+
+
+def put_latest(kind: str, item: Dict[str, Any]) -> None:
+    """Write ``item`` (a full Flights/Hotels item) as the latest version of its offer."""
+    _, _, latest = OFFER_TABLES[kind]
+    try:
+        dynamodb_resource().Table(latest).put_item(Item=item)
+    except ClientError as e:
+        # Readers fall back to the source table, so this only costs a Query later
+        print(f"[latest_offers] Write to {latest} failed: {str(e)}")
+
+
+def _batch_get(keys: List[Tuple[str, str, str]]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """BatchGetItem (table, key attribute, ID) triples, any mix of tables. Returns {table: {id: item}}."""
+    resource = dynamodb_resource()
+    found = {table_name: {} for table_name, _, _ in keys}
+    key_names = {table_name: key_name for table_name, key_name, _ in keys}
+    for chunk in chunked(keys, BATCH_GET_SIZE):
+        request = {}
+        for table_name, key_name, item_id in chunk:
+            request.setdefault(table_name, {"Keys": []})["Keys"].append({key_name: item_id})
+        for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+            try:
+                response = resource.batch_get_item(RequestItems=request)
+            except ClientError as e:
+                print(f"[latest_offers] BatchGetItem on {', '.join(request)} failed: {str(e)}")
+                break
+            for table_name, items in response.get("Responses", {}).items():
+                for item in items:
+                    found[table_name][item[key_names[table_name]]] = item
+            request = response.get("UnprocessedKeys") or {}
+            if not request:
+                break
+            time.sleep(min(1.0, 0.05 * (2 ** attempt)) * random.uniform(0.5, 1.0))
+    return found
+
+
+def _query_newest(source_table: str, key_name: str, item_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        response = dynamodb_resource().Table(source_table).query(
+            KeyConditionExpression=Key(key_name).eq(item_id),
+            ScanIndexForward=False,  # Get most recent
+            Limit=1,
+        )
+    except ClientError as e:
+        print(f"[latest_offers] Query on {source_table} for {item_id} failed: {str(e)}")
+        return None
+    items = response.get("Items", [])
+    return items[0] if items else None
+
+
+def batch_get_latest_many(ids_by_kind: Dict[str, Iterable[str]]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """
+    Newest stored item for each ID, as {kind: {id: item}} (e.g. kinds
+    "flight" and "hotel"); IDs that are stored nowhere are left out. All
+    kinds share one BatchGetItem per 100 IDs, plus a Query for each ID
+    missing from the projection (which is then backfilled).
+    """
+    wanted = {kind: list(dict.fromkeys(str(item_id) for item_id in ids if item_id))
+              for kind, ids in ids_by_kind.items()}
+    keys = [(OFFER_TABLES[kind][2], OFFER_TABLES[kind][1], item_id) for kind, ids in wanted.items() for item_id in ids]
+    by_table = _batch_get(keys) if keys else {}
+
+    result = {}
+    for kind, ids in wanted.items():
+        source, key_name, latest = OFFER_TABLES[kind]
+        found = dict(by_table.get(latest, {}))
+        missing = [item_id for item_id in ids if item_id not in found]
+        if missing:
+            backfill = [item for item in _fallback_executor.map(lambda i: _query_newest(source, key_name, i), missing)
+                        if item]
+            for item in backfill:
+                found[item[key_name]] = item
+            if backfill:
+                print(f"[latest_offers] Backfilling {len(backfill)} of {len(missing)} missing IDs into {latest}")
+                batch_write_items(latest, backfill)
+        result[kind] = found
+    return result
+
+
+def batch_get_latest(kind: str, ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """batch_get_latest_many() for a single kind: {id: item}."""
+    return batch_get_latest_many({kind: ids})[kind]
+
+
+def get_latest(kind: str, item_id: str) -> Optional[Dict[str, Any]]:
+    """Newest stored item for one ID, or None."""
+    return batch_get_latest(kind, [item_id]).get(str(item_id))
+
+
+class OfferLoader:
+    """
+    Per-invocation identity map of Flights / Hotels items. load() fetches the
+    IDs not seen yet in one batch_get_latest_many() call; flight() / hotel()
+    serve from memory (loading on a miss). IDs that are not stored, or whose
+    read failed, are remembered as None. stats() counts the reads so a
+    caller can check that no offer was fetched twice.
+    """
+
+    def __init__(self):
+        self._items = {kind: {} for kind in OFFER_TABLES}
+        self._reads = Counter()
+        self._stats = {"requested": 0, "memory_hits": 0, "loaded": 0, "not_found": 0, "batches": 0}
+
+    def load(self, flight_ids: Iterable[str] = (), hotel_ids: Iterable[str] = ()) -> None:
+        wanted = {}
+        for kind, ids in (("flight", flight_ids), ("hotel", hotel_ids)):
+            seen = self._items[kind]
+            fresh = [i for i in dict.fromkeys(str(i) for i in ids if i) if i not in seen]
+            if fresh:
+                wanted[kind] = fresh
+        if not wanted:
+            return
+        self._stats["batches"] += 1
+        try:
+            found = batch_get_latest_many(wanted)
+        except Exception as e:
+            # Remembered as not found, so a failing read is not retried within the request
+            print(f"[latest_offers] Loading offers failed: {str(e)}")
+            found = {kind: {} for kind in wanted}
+        for kind, ids in wanted.items():
+            for item_id in ids:
+                item = found[kind].get(item_id)
+                self._items[kind][item_id] = item
+                self._reads[(kind, item_id)] += 1
+                self._stats["loaded" if item else "not_found"] += 1
+
+    def get(self, kind: str, item_id: str) -> Optional[Dict[str, Any]]:
+        item_id = str(item_id)
+        self._stats["requested"] += 1
+        if item_id in self._items[kind]:
+            self._stats["memory_hits"] += 1
+        else:
+            self.load(**{f"{kind}_ids": [item_id]})
+        return self._items[kind].get(item_id)
+
+    def flight(self, flight_id: str) -> Optional[Dict[str, Any]]:
+        return self.get("flight", flight_id)
+
+    def hotel(self, hotel_id: str) -> Optional[Dict[str, Any]]:
+        return self.get("hotel", hotel_id)
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats, max_reads_per_id=max(self._reads.values(), default=0))
@@ -0,0 +1,174 @@
+"""
+Compact, ranked views of Amadeus search results for the LLM.
+
+A raw flight offer carries travelerPricings, fareDetailsBySegment and the
+rest of the booking data; a raw hotel offer carries room, policy and rate
+details. The chat only needs the fields its summary prompt asks for, so the
+tool results are projected to those fields, ranked and cut to the top K
+before they go into the prompt.
+"""
+import re
+from typing import Any, Dict, Optional
+
+from triptailor.json_codec import dumps
+
+DEFAULT_TOP_K = 5
+
+_ISO_DURATION = re.compile(r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?)?")
+
+
+def duration_minutes(iso_duration: Optional[str]) -> Optional[int]:
+    """Minutes in an ISO-8601 duration such as 'PT14H30M' or 'P1DT2H'."""
+    match = _ISO_DURATION.fullmatch(iso_duration or "")
+    if not match or not any(match.groups()):
+        return None
+    days, hours, minutes = (int(x) if x else 0 for x in match.groups())
+    return days * 1440 + hours * 60 + minutes
+
+
+def format_minutes(minutes: Optional[int]) -> str:
+    if minutes is None:
+        return ""
+    hours, mins = divmod(minutes, 60)
+    if not hours:
+        return f"{mins}m"
+    return f"{hours}h {mins}m" if mins else f"{hours}h"
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _price(price: Dict[str, Any]) -> Dict[str, Any]:
+    total = price.get("grandTotal") or price.get("total")
+    return {"total": total, "currency": price.get("currency")}
+
+
+def _carrier_name(code: Optional[str], carriers: Dict[str, str]) -> str:
+    if not code:
+        return ""
+    name = carriers.get(code)
+    return f"{name.title()} ({code})" if name else code
+
+
+# ===== Flights =====
+def _project_itinerary(itinerary: Dict[str, Any], carriers: Dict[str, str]) -> Dict[str, Any]:
+    segments = itinerary.get("segments") or []
+    if not segments:
+        return {}
+    first, last = segments[0], segments[-1]
+    airlines = []
+    for segment in segments:
+        name = _carrier_name(segment.get("carrierCode"), carriers)
+        if name and name not in airlines:
+            airlines.append(name)
+    minutes = duration_minutes(itinerary.get("duration"))
+    return {
+        "from": first.get("departure", {}).get("iataCode"),
+        "to": last.get("arrival", {}).get("iataCode"),
+        "departure": first.get("departure", {}).get("at"),
+        "arrival": last.get("arrival", {}).get("at"),
+        "duration": format_minutes(minutes),
+        "stops": len(segments) - 1,
+        "via": [segment.get("arrival", {}).get("iataCode") for segment in segments[:-1]],
+        "airlines": airlines,
+        "_minutes": minutes,
+    }
+
+
+def project_flight_offers(response: Dict[str, Any], top_k: int = DEFAULT_TOP_K) -> Dict[str, Any]:
+    """
+    Reduce a flight-offers response to airline, times, duration, stops and price,
+    ranked by price, then total travel time, then stops.
+    """
+    carriers = (response.get("dictionaries") or {}).get("carriers") or {}
+    offers = []
+    for offer in response.get("data") or []:
+        itineraries = [_project_itinerary(it, carriers) for it in offer.get("itineraries") or []]
+        itineraries = [it for it in itineraries if it]
+        if not itineraries:
+            continue
+        price = _price(offer.get("price") or {})
+        rank = (
+            _to_float(price["total"]) if _to_float(price["total"]) is not None else float("inf"),
+            sum(it["_minutes"] or 0 for it in itineraries),
+            sum(it["stops"] for it in itineraries),
+        )
+        for it in itineraries:
+            del it["_minutes"]
+        validating = (offer.get("validatingAirlineCodes") or [None])[0]
+        offers.append((rank, {
+            "airline": _carrier_name(validating, carriers) or (itineraries[0]["airlines"] or [""])[0],
+            "price": price,
+            "seats_left": offer.get("numberOfBookableSeats"),
+            "outbound": itineraries[0],
+            **({"return": itineraries[1]} if len(itineraries) > 1 else {}),
+        }))
+    offers.sort(key=lambda pair: pair[0])
+    return {
+        "found": len(offers),
+        "shown": min(top_k, len(offers)),
+        "offers": [offer for _rank, offer in offers[:top_k]],
+    }
+
+
+# ===== Hotels =====
+def _refundability(offer: Dict[str, Any]) -> Dict[str, Any]:
+    policies = offer.get("policies") or {}
+    refundable = (policies.get("refundable") or {}).get("cancellationRefund")
+    cancellations = policies.get("cancellations") or []
+    deadline = next((c.get("deadline") for c in cancellations if c.get("deadline")), None)
+    if refundable == "NON_REFUNDABLE" or any(c.get("type") == "FULL_STAY" for c in cancellations):
+        return {"refundable": False}
+    if refundable or deadline:
+        return {"refundable": True, **({"free_cancellation_until": deadline} if deadline else {})}
+    return {"refundable": None}
+
+
+def project_hotel_offers(response: Dict[str, Any], top_k: int = DEFAULT_TOP_K) -> Dict[str, Any]:
+    """
+    Reduce a hotel-offers response to name, location, rating, dates, board type,
+    refundability and total price, ranked by price (available hotels first).
+    """
+    hotels = []
+    for item in response.get("data") or []:
+        hotel = item.get("hotel") or {}
+        offer = (item.get("offers") or [{}])[0]
+        price = _price(offer.get("price") or {})
+        total = _to_float(price["total"])
+        rank = (
+            item.get("available") is False,
+            total if total is not None else float("inf"),
+        )
+        room = (offer.get("room") or {}).get("typeEstimated") or {}
+        hotels.append((rank, {
+            "name": hotel.get("name"),
+            "city": hotel.get("cityCode"),
+            "rating": hotel.get("rating"),
+            "check_in": offer.get("checkInDate"),
+            "check_out": offer.get("checkOutDate"),
+            "room": room.get("category"),
+            "board": offer.get("boardType"),
+            **_refundability(offer),
+            "price": price,
+        }))
+    hotels.sort(key=lambda pair: pair[0])
+    return {
+        "found": len(hotels),
+        "shown": min(top_k, len(hotels)),
+        "hotels": [hotel for _rank, hotel in hotels[:top_k]],
+    }
+
+
+def to_prompt_json(projection: Dict[str, Any]) -> str:
+    """Compact JSON for the prompt, with empty fields dropped."""
+    def prune(value):
+        if isinstance(value, dict):
+            return {k: prune(v) for k, v in value.items() if v not in (None, "", [], {})}
+        if isinstance(value, list):
+            return [prune(v) for v in value]
+        return value
+    return dumps(prune(projection), ensure_ascii=False, separators=(",", ":"))
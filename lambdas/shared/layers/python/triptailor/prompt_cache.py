@@ -0,0 +1,38 @@
+"""
+Helpers for keeping the cacheable part of a prompt byte-stable.
+
+OpenAI caches prompts by exact prefix (tools, then messages, as serialized).
+A prefix only hits if it is byte-for-byte the same as in an earlier request,
+so the static part of a prompt (tool schemas, persona, rules) has to come
+first and serialize the same way every time. prefix_hash() gives a short
+fingerprint of such a prefix, to log it and to check that it does not change
+between requests.
+"""
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+
+def canonical_json(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+def canonical(value: Any) -> Any:
+    """The same structure with every dict's keys in sorted order (how it will be serialized)."""
+    return json.loads(canonical_json(value))
+
+
+def prefix_hash(messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Short SHA-256 fingerprint of a prompt prefix (tools + leading messages)."""
+    payload = canonical_json({"tools": tools or [], "messages": messages})
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def cached_prompt_tokens(usage) -> Optional[int]:
+    """Prompt tokens served from the provider cache, if the response reports it."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    if details is None:
+        return None
+    if isinstance(details, dict):
+        return details.get("cached_tokens")
+    return getattr(details, "cached_tokens", None)
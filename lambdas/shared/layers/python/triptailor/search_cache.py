@@ -0,0 +1,226 @@
+"""
+Cache for upstream search results, keyed by a hash of the normalized query.
+
+Lookups go through two levels:
+
+  1. an in-process LRU (per warm container, SEARCH_CACHE_LRU_SIZE entries)
+  2. the SEARCH_CACHE_TABLE DynamoDB table (shared by every container),
+     whose ``expiresAt`` attribute is the table's TTL attribute
+
+An entry is fresh for ``ttl`` seconds and may then be served stale for
+another ``stale_ttl`` seconds while a background thread refreshes it (one
+refresh per key at a time). After that it is a miss and the caller waits for
+the upstream call. On Lambda the refresh thread only runs while the
+container is thawed, so a refresh started at the end of an invocation may
+finish on the next one; the stale entry is served until then.
+
+Payloads are stored as zlib-compressed JSON (Binary) to stay well under the
+400 KB item limit; anything larger is kept in the LRU only.
+
+Every lookup is recorded as a ``cache.<name>.<outcome>`` tracing span
+(hit / dynamo_hit / stale / miss), and SearchCache.stats() returns the
+container's counters.
+"""
+import hashlib
+import threading
+import time
+import zlib
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+from triptailor.clients import dynamodb_resource
+from triptailor.json_codec import dumps, loads
+from triptailor.prompt_cache import canonical_json
+from triptailor.tracing import record_span
+
+SEARCH_CACHE_ENABLED = os.environ.get("SEARCH_CACHE_ENABLED", "true").lower() != "false"
+SEARCH_CACHE_TABLE = os.environ.get("SEARCH_CACHE_TABLE", "SearchCache")
+SEARCH_CACHE_LRU_SIZE = int(os.environ.get("SEARCH_CACHE_LRU_SIZE", "64"))
+MAX_STORED_BYTES = 350 * 1024
+
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="search-cache-refresh")
+
+
+# ===== Query normalization =====
+def _normalize_number(value):
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value.strip())
+    return value
+
+
+def _normalize_codes(value):
+    if isinstance(value, str):
+        value = value.split(",")
+    return ",".join(sorted({str(code).strip().upper() for code in value if str(code).strip()}))
+
+
+def normalize_flight_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The flight-offers query in the form Amadeus expects and the cache keys on:
+    upper-cased IATA and currency codes, a default returnDate (departure + 7
+    days), airline lists as sorted comma-separated codes, whole numbers as
+    ints, booleans as "true"/"false", and no empty values.
+    """
+    normalized = {}
+    for name, value in params.items():
+        if value is None or value == "" or value == []:
+            continue
+        if name in ("originLocationCode", "destinationLocationCode", "currencyCode", "travelClass"):
+            value = str(value).strip().upper()
+        elif name in ("includedAirlineCodes", "excludedAirlineCodes"):
+            value = _normalize_codes(value)
+        elif isinstance(value, bool):
+            value = "true" if value else "false"
+        else:
+            value = _normalize_number(value)
+        normalized[name] = value
+
+    if not normalized.get("returnDate") and normalized.get("departureDate"):
+        try:
+            departure = datetime.strptime(normalized["departureDate"], "%Y-%m-%d")
+            normalized["returnDate"] = (departure + timedelta(days=7)).strftime("%Y-%m-%d")
+        except (TypeError, ValueError):
+            print("[search_cache] Could not add default returnDate")
+    return normalized
+
+
+def query_key(namespace: str, params: Dict[str, Any]) -> str:
+    """SHA-256 of the canonical JSON of an already-normalized query."""
+    return hashlib.sha256(f"{namespace}:{canonical_json(params)}".encode("utf-8")).hexdigest()
+
+
+# ===== Cache =====
+class SearchCache:
+    def __init__(self, name: str, ttl: int, stale_ttl: int,
+                 lru_size: int = SEARCH_CACHE_LRU_SIZE, table_name: str = SEARCH_CACHE_TABLE):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.lru_size = lru_size
+        self.table_name = table_name
+        self._lru: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._stats = {"hit": 0, "dynamo_hit": 0, "stale": 0, "miss": 0, "refreshed": 0, "refresh_failed": 0}
+
+    def get_or_fetch(self, params: Dict[str, Any], fetch: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+        """Return the cached result for ``params`` or call ``fetch(params)`` and cache it."""
+        if not SEARCH_CACHE_ENABLED:
+            return fetch(params)
+
+        start = time.perf_counter()
+        key = query_key(self.name, params)
+        now = time.time()
+
+        entry = self._lru_get(key)
+        outcome = "hit"
+        if entry is None or now >= entry["fetched_at"] + self.ttl:
+            stored = self._load(key)
+            if stored is not None and (entry is None or stored["fetched_at"] > entry["fetched_at"]):
+                entry = stored
+                self._lru_put(key, entry)
+                outcome = "dynamo_hit"
+
+        age = now - entry["fetched_at"] if entry else None
+        if entry is not None and age < self.ttl:
+            self._count(outcome, start)
+            return entry["value"]
+        if entry is not None and age < self.ttl + self.stale_ttl:
+            self._count("stale", start)
+            self._refresh_in_background(key, params, fetch)
+            return entry["value"]
+
+        self._count("miss", start)
+        return self._fetch_and_store(key, params, fetch)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, lru_entries=len(self._lru))
+
+    # ----- internals -----
+    def _count(self, outcome: str, start: float) -> None:
+        with self._lock:
+            self._stats[outcome] += 1
+        record_span(f"cache.{self.name}.{outcome}", (time.perf_counter() - start) * 1000.0)
+
+    def _lru_get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                self._lru.move_to_end(key)
+            return entry
+
+    def _lru_put(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._lru[key] = entry
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def _fetch_and_store(self, key, params, fetch):
+        value = fetch(params)
+        entry = {"value": value, "fetched_at": time.time()}
+        self._lru_put(key, entry)
+        self._store(key, entry)
+        return value
+
+    def _refresh_in_background(self, key, params, fetch):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._fetch_and_store(key, params, fetch)
+                outcome = "refreshed"
+            except Exception as e:
+                print(f"[search_cache] Refresh of {self.name} entry failed: {str(e)}")
+                outcome = "refresh_failed"
+            with self._lock:
+                self._refreshing.discard(key)
+                self._stats[outcome] += 1
+
+        _refresh_executor.submit(refresh)
+
+    def _table(self):
+        return dynamodb_resource().Table(self.table_name)
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            item = self._table().get_item(Key={"cacheKey": key}).get("Item")
+        except ClientError as e:
+            print(f"[search_cache] Read from {self.table_name} failed: {str(e)}")
+            return None
+        if not item or time.time() >= int(item.get("expiresAt", 0)):
+            return None
+        try:
+            value = loads(zlib.decompress(bytes(item["payload"])))
+        except (KeyError, ValueError, zlib.error) as e:
+            print(f"[search_cache] Discarding unreadable entry {key}: {str(e)}")
+            return None
+        return {"value": value, "fetched_at": float(item["fetchedAt"])}
+
+    def _store(self, key: str, entry: Dict[str, Any]) -> None:
+        payload = zlib.compress(dumps(entry["value"], separators=(",", ":")).encode("utf-8"))
+        if len(payload) > MAX_STORED_BYTES:
+            print(f"[search_cache] {self.name} result is {len(payload)} bytes compressed; keeping it in memory only")
+            return
+        fetched_at = entry["fetched_at"]
+        try:
+            self._table().put_item(Item={
+                "cacheKey": key,
+                "cache": self.name,
+                "payload": payload,
+                "fetchedAt": int(fetched_at),
+                "expiresAt": int(fetched_at + self.ttl + self.stale_ttl),
+            })
+        except ClientError as e:
+            print(f"[search_cache] Write to {self.table_name} failed: {str(e)}")
@@ -0,0 +1,65 @@
+"""
+Dispatch for the search tools the chat model can call.
+
+By default the searches run in-process (triptailor.flight_search /
+triptailor.hotel_search), which saves handle_chat a network hop and a
+second Lambda invocation per tool call. Set TOOL_DISPATCH_MODE=http to go
+through the search lambdas' Function URLs instead, e.g. while the Amadeus
+credentials are not configured on the chat function.
+"""
+import json
+import os
+
+from triptailor.clients import http_session
+
+TOOL_DISPATCH_MODE = os.environ.get("TOOL_DISPATCH_MODE", "inprocess").strip().lower()
+TOOL_HTTP_TIMEOUT = float(os.environ.get("TOOL_HTTP_TIMEOUT", "30"))
+
+SEARCH_FLIGHTS_URL = os.environ.get(
+    "SEARCH_FLIGHTS_URL", "https://hg7skevcilgzhpzan4rwsnggyy0mleap.lambda-url.us-east-1.on.aws/")
+SEARCH_HOTELS_URL = os.environ.get(
+    "SEARCH_HOTELS_URL", "https://hwwsigfrywgdxn57ceh5c7t6my0uwzfa.lambda-url.us-east-1.on.aws/")
+
+
+def _in_process():
+    if TOOL_DISPATCH_MODE != "inprocess":
+        return False
+    # The search modules read the Amadeus credentials from the environment
+    return bool(os.environ.get("AMADEUS_CLIENT_ID") and os.environ.get("AMADEUS_CLIENT_SECRET"))
+
+
+def invoke_lambda_http(url, args):
+    """POST to a search lambda's Function URL and return the decoded body as a dict."""
+    response = http_session("lambda-urls").post(url, json=args, timeout=TOOL_HTTP_TIMEOUT)
+    response.raise_for_status()
+    data = response.json()
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except json.JSONDecodeError:
+            return {}
+    return data if isinstance(data, dict) else {}
+
+
+def run_search_flights(user_id, chat_id, params):
+    """Run the search_flights tool. Returns {"data": [...], "dictionaries": {...}, "flightIds": [...]}."""
+    if _in_process():
+        from triptailor.flight_search import search_flights
+        result = search_flights(params)
+    else:
+        result = invoke_lambda_http(SEARCH_FLIGHTS_URL, {'user_id': user_id, 'chat_id': chat_id, 'params': params})
+    return {
+        "data": result.get("data", []),
+        "dictionaries": result.get("dictionaries", {}),
+        "flightIds": result.get("flightIds", []),
+    }
+
+
+def run_search_hotels(user_id, chat_id, params):
+    """Run the search_hotels tool. Returns {"data": [...], "hotelOfferIds": [...]}."""
+    if _in_process():
+        from triptailor.hotel_search import search_hotels
+        result = search_hotels(params)
+    else:
+        result = invoke_lambda_http(SEARCH_HOTELS_URL, {'user_id': user_id, 'chat_id': chat_id, 'params': params})
+    return {"data": result.get("data", []), "hotelOfferIds": result.get("hotelOfferIds", [])}
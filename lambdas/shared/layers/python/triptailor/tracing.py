@@ -0,0 +1,316 @@
+"""
+Per-invocation tracing, emitted as CloudWatch Embedded Metric Format (EMF).
+
+Every outgoing call made through triptailor.clients is recorded as a span:
+
+  - dynamodb.<Operation>  (boto3 event hooks; table, items, bytes, status)
+  - lambda.<Operation>    (async self-invocations and other Lambda API calls)
+  - http.<session>        (Amadeus, search Function URLs; host, status, bytes)
+  - openai.chat           (model, prompt/completion tokens; for streams the
+                           span ends when the stream opens)
+
+Code can add its own stages with ``with span("name"):`` or ``@traced("name")``.
+
+A handler wrapped in ``@traced_handler("handle_chat")`` collects the spans of
+one invocation and prints a single EMF JSON line when it returns. CloudWatch
+turns that line into metrics: per span name ``<name>.ms`` (total duration),
+``<name>.count`` and, where known, ``<name>.items`` / ``.bytes`` /
+``.prompt_tokens`` / ``.completion_tokens``, plus ``invocation.ms`` and
+``ColdStart``, all with the ``Function`` dimension. The individual spans go in
+the ``Spans`` property for Logs Insights.
+
+Tests and local runs can capture records instead of printing them:
+
+    with LocalCollector() as collector:
+        handler(event, None)
+    collector.metric("dynamodb.Query.count")
+
+Set TRACING_ENABLED=false to turn emission off.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "true").lower() != "false"
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "TripTailor")
+MAX_SPANS_PER_RECORD = 100
+EMF_MAX_METRICS = 100  # CloudWatch limit per metric directive
+
+_SUMMED_ATTRIBUTES = {
+    "items": "Count",
+    "bytes": "Bytes",
+    "prompt_tokens": "Count",
+    "completion_tokens": "Count",
+}
+
+_lock = threading.Lock()
+_current = None
+_cold_start = True
+_sinks: List[Callable[[Dict[str, Any]], None]] = []
+
+
+class Span:
+    __slots__ = ("name", "attributes", "duration_ms")
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.duration_ms = 0.0
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "ms": round(self.duration_ms, 2), **self.attributes}
+
+
+class _Invocation:
+    def __init__(self, function: str, request_id: Optional[str], cold: bool):
+        self.function = function
+        self.request_id = request_id
+        self.cold = cold
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+        self.lock = threading.Lock()
+
+    def add(self, finished: Span) -> None:
+        with self.lock:
+            self.spans.append(finished)
+
+
+def record_span(name: str, duration_ms: float, **attributes) -> None:
+    """Record an already-measured span on the current invocation (no-op outside one)."""
+    invocation = _current
+    if invocation is None:
+        return
+    finished = Span(name, attributes)
+    finished.duration_ms = duration_ms
+    invocation.add(finished)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a block as one span. Use the yielded Span's set() to attach counts."""
+    current = Span(name, attributes)
+    start = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        current.duration_ms = (time.perf_counter() - start) * 1000.0
+        invocation = _current
+        if invocation is not None:
+            invocation.add(current)
+
+
+def traced(name: Optional[str] = None):
+    """Decorator form of span()."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ===== Invocations =====
+def start_invocation(function: str, request_id: Optional[str] = None) -> _Invocation:
+    global _current, _cold_start
+    with _lock:
+        invocation = _Invocation(function, request_id, _cold_start)
+        _cold_start = False
+        _current = invocation
+    return invocation
+
+
+def finish_invocation(invocation: _Invocation, **properties) -> Dict[str, Any]:
+    global _current
+    with _lock:
+        if _current is invocation:
+            _current = None
+    total_ms = (time.perf_counter() - invocation.started) * 1000.0
+    with invocation.lock:
+        spans = list(invocation.spans)
+    record = emf_record(invocation.function, spans, total_ms, invocation.cold, invocation.request_id, properties)
+    if TRACING_ENABLED:
+        emit(record)
+    return record
+
+
+def traced_handler(function: str):
+    """
+    Wrap a Lambda entry point so each invocation emits one EMF record.
+    Works for handler(event, context) and handler(event, response_stream, context).
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            context = args[-1] if args else kwargs.get("context")
+            invocation = start_invocation(function, getattr(context, "aws_request_id", None))
+            status = None
+            try:
+                result = handler(*args, **kwargs)
+                if isinstance(result, dict):
+                    status = result.get("statusCode")
+                return result
+            except Exception as e:
+                status = type(e).__name__
+                raise
+            finally:
+                finish_invocation(invocation, StatusCode=status)
+        return wrapper
+    return decorator
+
+
+def emf_record(function: str, spans: List[Span], total_ms: float, cold: bool,
+               request_id: Optional[str] = None, properties: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    metrics: Dict[str, float] = {}
+    units: Dict[str, str] = {}
+
+    def add(name, value, unit):
+        metrics[name] = metrics.get(name, 0) + value
+        units[name] = unit
+
+    add("invocation.ms", round(total_ms, 2), "Milliseconds")
+    add("ColdStart", 1 if cold else 0, "Count")
+    for finished in spans:
+        add(f"{finished.name}.ms", finished.duration_ms, "Milliseconds")
+        add(f"{finished.name}.count", 1, "Count")
+        for attribute, unit in _SUMMED_ATTRIBUTES.items():
+            value = finished.attributes.get(attribute)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                add(f"{finished.name}.{attribute}", value, unit)
+
+    names = list(metrics)
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [["Function"]],
+                "Metrics": [{"Name": name, "Unit": units[name]} for name in names[:EMF_MAX_METRICS]],
+            }],
+        },
+        "Function": function,
+        "RequestId": request_id,
+        "Cold": cold,
+        "Spans": [finished.to_dict() for finished in spans[:MAX_SPANS_PER_RECORD]],
+        **{name: round(value, 2) for name, value in metrics.items()},
+    }
+    if properties:
+        record.update({k: v for k, v in properties.items() if v is not None})
+    return record
+
+
+def emit(record: Dict[str, Any]) -> None:
+    if _sinks:
+        for sink in list(_sinks):
+            sink(record)
+        return
+    print(json.dumps(record, default=str, separators=(",", ":")))
+
+
+class LocalCollector:
+    """Captures EMF records in memory (instead of printing them) while active."""
+
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+
+    def __call__(self, record: Dict[str, Any]) -> None:
+        self.records.append(record)
+
+    def __enter__(self):
+        _sinks.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _sinks.remove(self)
+
+    def metric(self, name: str, record_index: int = -1) -> float:
+        """A metric value from one record (the last by default), 0 if absent."""
+        if not self.records:
+            return 0
+        return self.records[record_index].get(name, 0)
+
+    def spans(self, prefix: str = "") -> List[Dict[str, Any]]:
+        return [s for record in self.records for s in record["Spans"] if s["name"].startswith(prefix)]
+
+
+# ===== Client instrumentation =====
+def _payload_items(parsed: Dict[str, Any]) -> Optional[int]:
+    if "Count" in parsed:
+        return parsed["Count"]
+    if "Items" in parsed:
+        return len(parsed["Items"])
+    if "Item" in parsed:
+        return 1
+    if "Responses" in parsed:
+        return sum(len(items) for items in parsed["Responses"].values())
+    return None
+
+
+def instrument_boto_client(client) -> None:
+    """Record every API call of a boto3 client as a ``<service>.<Operation>`` span."""
+    service = client.meta.service_model.service_id.hyphenize()
+    events = client.meta.events
+
+    def before_parameter_build(params, model, context, **kwargs):
+        tables = params.get("TableName") or ",".join(sorted(params.get("RequestItems") or {})) or None
+        context["trace"] = {"start": time.perf_counter(), "table": tables}
+
+    def before_call(params, context, **kwargs):
+        trace = context.get("trace")
+        if trace is not None:
+            body = params.get("body") or b""
+            trace["request_bytes"] = len(body) if isinstance(body, (bytes, str)) else None
+
+    def after_call(http_response, parsed, model, context, **kwargs):
+        trace = context.pop("trace", None)
+        if trace is None:
+            return
+        attributes = {"status": getattr(http_response, "status_code", None)}
+        if trace.get("table"):
+            attributes["table"] = trace["table"]
+        items = _payload_items(parsed or {})
+        if items is not None:
+            attributes["items"] = items
+        content = getattr(http_response, "content", None)
+        attributes["bytes"] = (trace.get("request_bytes") or 0) + (len(content) if content else 0)
+        record_span(f"{service}.{model.name}", (time.perf_counter() - trace["start"]) * 1000.0, **attributes)
+
+    def after_call_error(model, context, exception=None, **kwargs):
+        trace = context.pop("trace", None)
+        if trace is not None:
+            record_span(f"{service}.{model.name}", (time.perf_counter() - trace["start"]) * 1000.0,
+                        table=trace.get("table"), error=type(exception).__name__ if exception else "error")
+
+    events.register(f"before-parameter-build.{service}", before_parameter_build)
+    events.register(f"before-call.{service}", before_call)
+    events.register(f"after-call.{service}", after_call)
+    events.register(f"after-call-error.{service}", after_call_error)
+
+
+def instrument_openai_client(client) -> None:
+    """Record chat.completions.create() calls as ``openai.chat`` spans with token usage."""
+    completions = client.chat.completions
+    original = completions.create
+
+    @functools.wraps(original)
+    def create(*args, **kwargs):
+        with span("openai.chat", model=kwargs.get("model"), stream=bool(kwargs.get("stream"))) as current:
+            result = original(*args, **kwargs)
+            usage = getattr(result, "usage", None)
+            if usage is not None:
+                current.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+            return result
+
+    completions.create = create
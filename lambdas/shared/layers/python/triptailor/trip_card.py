@@ -0,0 +1,343 @@
+"""
+Trip card document: compact flight / hotel summaries stored on the trip item.
+
+Next to flight_tuples / hotel_tuples ([id, status] pairs) the trip item
+carries the summaries the trip card shows, so fetch_trip_card_data is a
+single GetItem:
+
+    card_flights: {flightId: compact_flight(...)}
+    card_hotels:  {hotelOfferId: compact_hotel(...)}
+    card_version: TRIP_CARD_VERSION
+
+Statuses stay in the tuples. The maps may hold entries the tuples no longer
+reference (ignored on read, dropped on the next full write).
+
+  - update_trip_card writes the whole card (build_card()).
+  - remove_flight / remove_hotel drop the removed entry (drop_card_entry()).
+  - book_hotel / create_flight_order add the booked offer's entry
+    (add_card_entry()) before the trip card is remapped to the new ID.
+  - read_card() serves the card and builds the entries it is missing (trip
+    items written before the card existed, or with an older card_version)
+    from the offers tables, writing them back: a lazy backfill.
+
+Bump TRIP_CARD_VERSION when the compact shape changes; older cards are then
+rebuilt on their next read.
+
+Writers that replace the trip's items (update_trip_card, remove_flight,
+remove_hotel) use optimistic concurrency on the item's ``version``
+attribute: put_trip() / version_condition() bump it and fail with
+TripChanged if it moved since the item was read. Items written before the
+attribute existed are matched on ``last modified`` instead.
+"""
+import os
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from triptailor.latest_offers import batch_get_latest_many
+
+TRIP_CARD_VERSION = 1
+TRIP_VERSION_ATTR = "version"
+# Attempts (each from a fresh read) before a conflicting trip write gives up
+TRIP_UPDATE_ATTEMPTS = int(os.environ.get("TRIP_UPDATE_ATTEMPTS", "3"))
+
+# kind -> (tuples attribute, card attribute)
+CARD_FIELDS = {
+    "flight": ("flight_tuples", "card_flights"),
+    "hotel": ("hotel_tuples", "card_hotels"),
+}
+
+
+# ===== Compaction =====
+def _empty_flight(f_id: str) -> Dict[str, Any]:
+    return {"id": f_id, "airline": "", "flight_number": "", "route": "", "departure": "", "arrival": "", "duration": "", "price": ""}
+
+
+def _empty_hotel(h_id: str) -> Dict[str, Any]:
+    return {"id": h_id, "hotelId": "", "name": "", "location": "", "check_in": "", "check_out": "", "nights": "", "price_per_night": "", "overall_price": ""}
+
+
+def compact_flight(f_id: str, root: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Trip card summary of a Flights item (empty fields if the item is missing)."""
+    try:
+        item = (root or {}).get("flightDetails", {})
+        if not item:
+            return _empty_flight(f_id)
+
+        itinerary = (item.get("itineraries") or [{}])[0]
+        segments = itinerary.get("segments", [])
+        price_info = item.get("price", {})
+        total_price = price_info.get("total", "")
+        currency = price_info.get("currency", "")
+
+        airline = (item.get("validatingAirlineCodes") or [None])
+        airline_code = airline[0] if airline else None
+        if not airline_code and segments:
+            airline_code = segments[0].get("carrierCode")
+
+        # Flight number from first segment
+        flight_number = ""
+        if segments:
+            first_seg = segments[0]
+            flight_number = f"{first_seg.get('carrierCode','')}{first_seg.get('number','')}".strip()
+
+        # Route string: origin -> layovers -> destination
+        route_points = []
+        if segments:
+            route_points.append(segments[0].get("departure", {}).get("iataCode", ""))
+            for seg in segments:
+                arr = seg.get("arrival", {}).get("iataCode", "")
+                if arr:
+                    route_points.append(arr)
+        route = " -> ".join([p for p in route_points if p])
+
+        # Departure/arrival timestamps
+        departure_iso = segments[0].get("departure", {}).get("at", "") if segments else ""
+        arrival_iso = segments[-1].get("arrival", {}).get("at", "") if segments else ""
+
+        # Duration humanized
+        dur = itinerary.get("duration", "")
+        if dur:
+            dur = dur.replace("PT", "").replace("H", "h ").replace("M", "m").strip()
+
+        price = f"{total_price} {currency}".strip()
+
+        return {
+            "id": f_id,
+            "airline": airline_code or "",
+            "flight_number": flight_number,
+            "route": route,
+            "departure": departure_iso,
+            "arrival": arrival_iso,
+            "duration": dur,
+            "price": price,
+        }
+    except Exception as e:
+        print(f"[trip_card] Exception compacting flight {f_id}: {e}")
+        return _empty_flight(f_id)
+
+
+def compact_hotel(h_id: str, root: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Trip card summary of a Hotels item, booked or not (empty fields if the item is missing)."""
+    try:
+        # Check if this is a booked hotel (has hotelOffersDetails.booked = true) or regular hotel
+        hotel_offers_details = (root or {}).get("hotelOffersDetails", {})
+        if hotel_offers_details.get("booked", False):
+            # For booked hotels, data is stored in hotelOffersDetails.hotelPricingData.data
+            item = (hotel_offers_details.get("hotelPricingData") or {}).get("data", {})
+        else:
+            item = hotel_offers_details
+        if not item:
+            return _empty_hotel(h_id)
+
+        hotel_info = item.get("hotel", {})
+        offers = item.get("offers", [])
+        hotel_offer = offers[0] if offers else {}
+
+        price_info = hotel_offer.get("price", {})
+        total_price = price_info.get("total", "")
+        currency = price_info.get("currency", "")
+        check_in = hotel_offer.get("checkInDate", "")
+        check_out = hotel_offer.get("checkOutDate", "")
+
+        name = hotel_info.get("name", "")
+        address = hotel_info.get("address", {}) or {}
+        city = address.get("cityName") or hotel_info.get("cityCode", "")
+        country = address.get("countryCode", "")
+        location = ", ".join([p for p in [city, country] if p])
+
+        # Nights and per-night price
+        nights = ""
+        price_per_night = ""
+        try:
+            if check_in and check_out:
+                d_in = date.fromisoformat(check_in)
+                d_out = date.fromisoformat(check_out)
+                delta = (d_out - d_in).days
+                if delta > 0:
+                    nights = str(delta)
+                    try:
+                        total_float = float(total_price)
+                        price_per_night = f"{round(total_float / delta, 2)} {currency}".strip()
+                    except Exception:
+                        price_per_night = ""
+        except Exception:
+            nights = ""
+
+        overall_price = f"{total_price} {currency}".strip()
+
+        return {
+            "id": h_id,
+            "hotelId": hotel_info.get("hotelId", ""),  # Amadeus hotelId for the ratings API
+            "name": name,
+            "location": location,
+            "check_in": check_in,
+            "check_out": check_out,
+            "nights": nights,
+            "price_per_night": price_per_night,
+            "overall_price": overall_price,
+        }
+    except Exception as e:
+        print(f"[trip_card] Exception compacting hotel {h_id}: {e}")
+        return _empty_hotel(h_id)
+
+
+COMPACTORS = {"flight": compact_flight, "hotel": compact_hotel}
+
+
+# ===== Card document =====
+def tuple_entries(tuples: Any) -> List[Tuple[str, str]]:
+    """(id, status) pairs of stored [id, status] tuples, skipping malformed ones."""
+    out = []
+    for entry in tuples if isinstance(tuples, list) else []:
+        if isinstance(entry, (list, tuple)) and len(entry) >= 1:
+            out.append((str(entry[0]), str(entry[1]) if len(entry) > 1 else "available"))
+    return out
+
+
+def card_maps(trip_item: Dict[str, Any]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """The stored summaries as {kind: {id: compact}}; empty for cards of another version."""
+    if int(trip_item.get("card_version", 0) or 0) != TRIP_CARD_VERSION:
+        return {kind: {} for kind in CARD_FIELDS}
+    return {kind: dict(trip_item.get(card_attr) or {}) for kind, (_, card_attr) in CARD_FIELDS.items()}
+
+
+def build_card(ids_by_kind: Dict[str, List[str]],
+               get_item: Callable[[str, str], Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Card attributes for the trip item, from the offers' Flights/Hotels items;
+    ``get_item(kind, id)`` returns the item (e.g. OfferLoader.get).
+    """
+    fields = {"card_version": TRIP_CARD_VERSION}
+    for kind, (_, card_attr) in CARD_FIELDS.items():
+        fields[card_attr] = {item_id: COMPACTORS[kind](item_id, get_item(kind, item_id))
+                             for item_id in ids_by_kind.get(kind, [])}
+    return fields
+
+
+def read_card(trips_table, trip_item: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    The trip card's compact flights and hotels (with their tuple status), in
+    tuple order. Entries the stored card lacks are built from the offers
+    tables in one batch and written back to the trip item.
+    """
+    entries = {kind: tuple_entries(trip_item.get(tuples_attr)) for kind, (tuples_attr, _) in CARD_FIELDS.items()}
+    maps = card_maps(trip_item)
+    missing = {kind: [item_id for item_id, _ in entries[kind] if item_id not in maps[kind]] for kind in CARD_FIELDS}
+
+    if any(missing.values()):
+        found = batch_get_latest_many(missing)
+        for kind, ids in missing.items():
+            for item_id in ids:
+                maps[kind][item_id] = COMPACTORS[kind](item_id, found[kind].get(item_id))
+        _store_card(trips_table, trip_item, maps)
+
+    cards = []
+    for kind in ("flight", "hotel"):
+        cards.append([dict(maps[kind][item_id], status=status) for item_id, status in entries[kind]])
+    return cards[0], cards[1]
+
+
+def _store_card(trips_table, trip_item: Dict[str, Any], maps: Dict[str, Dict[str, Dict[str, Any]]]) -> None:
+    """Backfill write; skipped if the trip item changed since it was read."""
+    values = {":v": TRIP_CARD_VERSION}
+    names = {}
+    updates = ["card_version = :v"]
+    for kind, (_, card_attr) in CARD_FIELDS.items():
+        updates.append(f"{card_attr} = :{kind}")
+        values[f":{kind}"] = maps[kind]
+    condition = "attribute_exists(UserAndChatID)"
+    if "last modified" in trip_item:
+        condition += " AND #lm = :lm"
+        names["#lm"] = "last modified"
+        values[":lm"] = trip_item["last modified"]
+    kwargs = {"ExpressionAttributeNames": names} if names else {}
+    try:
+        trips_table.update_item(
+            Key={"UserAndChatID": trip_item["UserAndChatID"]},
+            UpdateExpression="SET " + ", ".join(updates),
+            ConditionExpression=condition,
+            ExpressionAttributeValues=values,
+            **kwargs,
+        )
+        print(f"[trip_card] Backfilled card of {trip_item['UserAndChatID']}")
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            print(f"[trip_card] Card backfill for {trip_item['UserAndChatID']} failed: {str(e)}")
+
+
+def drop_card_entry(trip_item: Dict[str, Any], kind: str, item_id: str) -> None:
+    """Remove an offer's summary from a trip item that is about to be put back."""
+    _, card_attr = CARD_FIELDS[kind]
+    # update_trip_card's hash of the items no longer describes the item
+    trip_item.pop("items_hash", None)
+    if isinstance(trip_item.get(card_attr), dict):
+        trip_item[card_attr].pop(str(item_id), None)
+
+
+def add_card_entry(trips_table, user_and_chat_id: str, kind: str, item_id: str, offer_item: Dict[str, Any]) -> None:
+    """
+    Store the summary of ``offer_item`` on an existing, current-version card,
+    so the card already has it when update_trip_card maps the trip to
+    ``item_id``. Cards that do not qualify are filled by read_card() instead.
+    """
+    _, card_attr = CARD_FIELDS[kind]
+    try:
+        trips_table.update_item(
+            Key={"UserAndChatID": user_and_chat_id},
+            UpdateExpression=f"SET {card_attr}.#id = :card",
+            ConditionExpression=f"attribute_exists({card_attr}) AND card_version = :v",
+            ExpressionAttributeNames={"#id": str(item_id)},
+            ExpressionAttributeValues={":card": COMPACTORS[kind](str(item_id), offer_item), ":v": TRIP_CARD_VERSION},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            print(f"[trip_card] Adding {kind} {item_id} to the card of {user_and_chat_id} failed: {str(e)}")
+
+
+# ===== Optimistic concurrency =====
+class TripChanged(Exception):
+    """The trip item was written by someone else since it was read."""
+
+
+def next_version(current_item: Dict[str, Any]) -> int:
+    return int(current_item.get(TRIP_VERSION_ATTR, 0) or 0) + 1
+
+
+def version_condition(current_item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    ConditionExpression kwargs for a write that must only succeed if the trip
+    item is still ``current_item`` ({} when it did not exist).
+    """
+    names = {"#ver": TRIP_VERSION_ATTR}
+    if TRIP_VERSION_ATTR in current_item:
+        return {"ConditionExpression": "#ver = :ver", "ExpressionAttributeNames": names,
+                "ExpressionAttributeValues": {":ver": current_item[TRIP_VERSION_ATTR]}}
+    if "UserAndChatID" not in current_item:
+        return {"ConditionExpression": "attribute_not_exists(UserAndChatID)"}
+    if "last modified" not in current_item:
+        return {"ConditionExpression": "attribute_not_exists(#ver)", "ExpressionAttributeNames": names}
+    names["#lm"] = "last modified"
+    return {"ConditionExpression": "attribute_not_exists(#ver) AND #lm = :lm", "ExpressionAttributeNames": names,
+            "ExpressionAttributeValues": {":lm": current_item["last modified"]}}
+
+
+def conditional_write(write: Callable[..., Any], **kwargs) -> Any:
+    """Call ``write(**kwargs)`` (put_item / update_item), raising TripChanged on a failed condition."""
+    try:
+        return write(**kwargs)
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            raise TripChanged() from e
+        raise
+
+
+def put_trip(trips_table, item: Dict[str, Any], current_item: Dict[str, Any]) -> None:
+    """
+    put_item ``item`` with the next version, if the stored trip is still
+    ``current_item`` (which may be ``item`` itself, edited in place).
+    """
+    condition = version_condition(current_item)
+    item[TRIP_VERSION_ATTR] = next_version(current_item)
+    conditional_write(trips_table.put_item, Item=item, **condition)
@@ -0,0 +1,150 @@
+"""
+Chat-history insert events for the stream-driven trip card updater.
+
+update_trip_card.stream_handler is subscribed to the ``chat-history``
+DynamoDB Stream (NEW_IMAGE, filtered to INSERT events), either directly or
+through an SQS queue whose messages carry the stream records as JSON. A
+batch is coalesced per trip (``UserAndChatID``) with coalesce(), so a burst
+of turns costs one analysis per chat instead of one per message; messages
+that arrive after the analysis read the history are picked up by the next
+batch through the trip item's ``analyzed_until`` watermark.
+
+LocalQueue is the in-memory stand-in for the stream / queue: tests and the
+benchmarks publish inserts to it and drain() delivers them to the handler
+in Lambda's batch format, redelivering the records it reports as failed.
+"""
+import json
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+_deserializer = TypeDeserializer()
+_serializer = TypeSerializer()
+
+
+# ===== Records =====
+def stream_record(item: Dict[str, Any], sequence_number: str, event_name: str = "INSERT") -> Dict[str, Any]:
+    """A DynamoDB Streams record (NEW_IMAGE) for ``item``."""
+    return {
+        "eventName": event_name,
+        "eventSource": "aws:dynamodb",
+        "dynamodb": {
+            "NewImage": {name: _serializer.serialize(value) for name, value in item.items()},
+            "SequenceNumber": sequence_number,
+            "StreamViewType": "NEW_IMAGE",
+        },
+    }
+
+
+def _unwrap(record: Dict[str, Any]) -> Dict[str, Any]:
+    """The stream record inside an SQS message, or the record itself."""
+    if record.get("eventSource") == "aws:sqs":
+        return json.loads(record.get("body") or "{}")
+    return record
+
+
+def record_id(record: Dict[str, Any]) -> str:
+    """The identifier Lambda expects in batchItemFailures for this record."""
+    if record.get("eventSource") == "aws:sqs":
+        return record["messageId"]
+    return record["dynamodb"]["SequenceNumber"]
+
+
+def new_message(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The chat-history item a record inserted, or None for other events."""
+    record = _unwrap(record)
+    if record.get("eventName") != "INSERT":
+        return None
+    image = (record.get("dynamodb") or {}).get("NewImage") or {}
+    return {name: _deserializer.deserialize(value) for name, value in image.items()}
+
+
+def coalesce(records: Iterable[Dict[str, Any]]) -> "OrderedDict[str, Dict[str, Any]]":
+    """
+    Group a batch by trip: {UserAndChatID: {"user_id", "chat_id", "until",
+    "record_ids"}}, in order of first appearance. ``until`` is the newest
+    message timestamp; ``record_ids`` are every record of that chat (to be
+    reported together if its update fails). Records that are not message
+    inserts are dropped.
+    """
+    chats = OrderedDict()
+    for record in records:
+        try:
+            message = new_message(record)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"[trip_card_events] Skipping unreadable record: {str(e)}")
+            continue
+        if not message or not message.get("user_id") or message.get("chat_id") in (None, ""):
+            continue
+        user_id, chat_id = str(message["user_id"]), str(message["chat_id"])
+        chat = chats.setdefault(f"{user_id}:{chat_id}", {
+            "user_id": user_id, "chat_id": chat_id, "until": None, "record_ids": [],
+        })
+        timestamp = int(message.get("timestamp", 0))
+        chat["until"] = timestamp if chat["until"] is None else max(chat["until"], timestamp)
+        chat["record_ids"].append(record_id(record))
+    return chats
+
+
+# ===== Local stand-in =====
+class LocalQueue:
+    """
+    In-memory stream of chat-history inserts. publish_insert() is called for
+    every new message; drain() invokes ``handler({"Records": [...]}, None)``
+    with up to ``batch_size`` records at a time until the queue is empty,
+    putting back the records the handler reports in batchItemFailures
+    (at most ``max_receives`` deliveries each).
+    """
+
+    def __init__(self, batch_size: int = 100, max_receives: int = 3):
+        self.batch_size = batch_size
+        self.max_receives = max_receives
+        self._records = deque()
+        self._receives = {}
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._stats = {"published": 0, "batches": 0, "failed": 0, "dropped": 0}
+
+    def publish_insert(self, item: Dict[str, Any]) -> None:
+        with self._lock:
+            self._sequence += 1
+            self._records.append(stream_record(item, f"{self._sequence:021d}"))
+            self._stats["published"] += 1
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._records)
+
+    def _receive(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            batch = [self._records.popleft() for _ in range(min(self.batch_size, len(self._records)))]
+            for record in batch:
+                self._receives[record_id(record)] = self._receives.get(record_id(record), 0) + 1
+            return batch
+
+    def drain(self, handler: Callable[[Dict[str, Any], Any], Optional[Dict[str, Any]]]) -> int:
+        """Deliver every pending record; returns the number of handler invocations."""
+        invocations = 0
+        while True:
+            batch = self._receive()
+            if not batch:
+                return invocations
+            invocations += 1
+            self._stats["batches"] += 1
+            response = handler({"Records": batch}, None) or {}
+            failed = {f["itemIdentifier"] for f in response.get("batchItemFailures", [])}
+            with self._lock:
+                for record in batch:
+                    if record_id(record) not in failed:
+                        continue
+                    self._stats["failed"] += 1
+                    if self._receives[record_id(record)] < self.max_receives:
+                        self._records.append(record)
+                    else:
+                        self._stats["dropped"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, pending=len(self._records))
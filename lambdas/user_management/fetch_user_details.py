@@ -1,31 +1,14 @@
 import json
-import boto3
 from boto3.dynamodb.conditions import Key
-from decimal import Decimal
+from triptailor.clients import dynamodb_resource
+from triptailor.json_codec import dumps
+from triptailor.tracing import traced_handler
 
 # Initialize the DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+dynamodb = dynamodb_resource()
 user_table = dynamodb.Table('user')
 
 
-def convert_decimals(obj):
-    """
-    Recursively convert DynamoDB Decimal objects to int/float for JSON serialization.
-    """
-    if isinstance(obj, list):
-        return [convert_decimals(item) for item in obj]
-    elif isinstance(obj, dict):
-        return {key: convert_decimals(value) for key, value in obj.items()}
-    elif isinstance(obj, Decimal):
-        # Convert to int if it's a whole number, otherwise float
-        if obj % 1 == 0:
-            return int(obj)
-        else:
-            return float(obj)
-    else:
-        return obj
-
-
 def fetch_user_details(user_id, headers):
     """
     Fetch user details from the user table.
@@ -55,14 +38,12 @@ def fetch_user_details(user_id, headers):
         # Get the user data (should be the first item)
         user_data = user_info[0]
         
-        # Convert any Decimal objects to regular numbers for JSON serialization
-        user_data = convert_decimals(user_data)
-        
         # Return all user data
         return {
             "statusCode": 200,
             "headers": headers,
-            "body": json.dumps({
+            # Decimal-aware encoder: DynamoDB numbers are written as JSON numbers
+            "body": dumps({
                 "message": "User details retrieved successfully",
                 "user_id": user_id,
                 "user_data": user_data
@@ -77,6 +58,7 @@ def fetch_user_details(user_id, headers):
         }
 
 
+@traced_handler("fetch_user_details")
 def lambda_handler(event, context):
     """
     Lambda handler for fetching user details.
@@ -1,9 +1,10 @@
 import json
-import boto3
 from boto3.dynamodb.conditions import Key
+from triptailor.clients import dynamodb_resource
+from triptailor.tracing import traced_handler
 
 # Initialize the DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+dynamodb = dynamodb_resource()
 user_table = dynamodb.Table('user')
 
 
@@ -100,6 +101,7 @@ def update_user_details(user_id, update_data, headers):
         }
 
 
+@traced_handler("update_user_details")
 def lambda_handler(event, context):
     """
     Lambda handler for updating user details.